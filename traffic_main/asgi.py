@@ -3,6 +3,10 @@ ASGI config for traffic_main project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+HTTP 請求交給 Django 處理；websocket 連線交給 traffic_signal.websocket 推播預測結果。
+即時推播（/api/traffic/stream/ 與 /api/traffic/ws/）需以 ASGI 伺服器執行，例如：
+    uvicorn traffic_main.asgi:application
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +17,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "traffic_main.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from traffic_signal.websocket import websocket_application  # noqa: E402  需在 Django 初始化後匯入
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -14,6 +14,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import environ
 import os
+from django.core.exceptions import ImproperlyConfigured
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # 隱藏非錯誤日誌
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,9 +48,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",  # 必須放在最上面
+    "traffic_signal.profiling.ProfilingMiddleware",  # 線上請求取樣分析（未啟用時自動移除）
+    "traffic_signal.middleware.CompressionMiddleware",  # 依 Accept-Encoding 以 zstd/gzip 壓縮回應
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
+    "traffic_signal.db_router.ReadReplicaMiddleware",  # 唯讀 API 讀副本資料庫
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
@@ -78,6 +82,24 @@ WSGI_APPLICATION = "traffic_main.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite 效能設定：每個連線建立時套用
+# - journal_mode=WAL：讀取不會阻塞寫入（查詢 API 與預測寫入可同時進行）
+# - synchronous=NORMAL：WAL 模式下只在 checkpoint 時 fsync，斷電最多遺失最後幾筆交易，不會損毀資料庫
+# - cache_size / mmap_size / temp_store：加大快取並以記憶體映射讀取
+# - transaction_mode=IMMEDIATE：交易開始時即取得寫入鎖，避免讀鎖升級寫鎖時直接回報 database is locked
+# - timeout：等待其他連線釋放寫入鎖的秒數（busy timeout）
+SQLITE_OPTIONS = {
+    "init_command": (
+        f"PRAGMA journal_mode={env('DB_SQLITE_JOURNAL_MODE', default = 'WAL')};"
+        f"PRAGMA synchronous={env('DB_SQLITE_SYNCHRONOUS', default = 'NORMAL')};"
+        f"PRAGMA cache_size=-{env.int('DB_SQLITE_CACHE_KB', default = 65536)};"
+        f"PRAGMA mmap_size={env.int('DB_SQLITE_MMAP_BYTES', default = 268435456)};"
+        "PRAGMA temp_store=MEMORY;"
+    ),
+    "transaction_mode": "IMMEDIATE",
+    "timeout": env.float('DB_BUSY_TIMEOUT', default = 20),
+}
+
 DATABASES = {
     "default": {
         # MySQL 設定（已註解）
@@ -90,12 +112,50 @@ DATABASES = {
         # 'OPTIONS': {
         #     'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
         #     'charset': 'utf8mb4',
+        #     'isolation_level': 'read committed',
         # },
         # 改用 SQLite 設定
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": SQLITE_OPTIONS,
     }
 }
+DB_IS_SQLITE = 'sqlite3' in DATABASES["default"]["ENGINE"]
+
+# 持續連線：每個 worker 執行緒重複使用連線（秒），重複使用前先檢查連線是否仍有效；
+# 不論使用上方哪一種資料庫設定都會套用。SQLite 開啟連線的成本很低，預設每個請求結束即關閉，MySQL 預設 60 秒
+DATABASES["default"].update({
+    "CONN_MAX_AGE": env.int('DB_CONN_MAX_AGE', default = 0 if DB_IS_SQLITE else 60),
+    "CONN_HEALTH_CHECKS": True,
+})
+
+# 唯讀副本（選填）：查詢 / 分析 API 改讀副本，寫入一律到 default
+# - MySQL：設定 DB_REPLICA_HOST（與 DB_REPLICA_PORT）指向 replica，其餘連線設定與 default 相同
+# - SQLite：設定 DB_REPLICA_NAME 為副本檔路徑，以 sync_replica 指令定期從 default 複製
+if env('DB_REPLICA_HOST', default = ''):
+    if DB_IS_SQLITE:
+        # SQLite 沒有 HOST，副本會指向同一個資料庫檔
+        raise ImproperlyConfigured("DB_REPLICA_HOST 只適用於 MySQL；SQLite 請改設定 DB_REPLICA_NAME 並執行 sync_replica")
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        'HOST': env('DB_REPLICA_HOST'),
+        'PORT': env('DB_REPLICA_PORT', default = DATABASES["default"].get('PORT', '')),
+        'TEST': {'MIRROR': 'default'},
+    }
+elif env('DB_REPLICA_NAME', default = ''):
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": env('DB_REPLICA_NAME'),
+        "OPTIONS": SQLITE_OPTIONS,
+        "CONN_MAX_AGE": DATABASES["default"]["CONN_MAX_AGE"],
+        "CONN_HEALTH_CHECKS": True,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['traffic_signal.db_router.ReadReplicaRouter']
+TRAFFIC_READ_REPLICA_ALIAS = "replica"
+# 寫入後此秒數內同一個客戶端改讀主資料庫（read-your-writes）
+TRAFFIC_READ_YOUR_WRITES_SECONDS = env.int("TRAFFIC_READ_YOUR_WRITES_SECONDS", default = 5)
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -143,4 +203,68 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # CORS 設定
 CORS_ALLOW_ALL_ORIGINS = True
-CORS_ALLOW_CREDENTIALS = True
\ No newline at end of file
+CORS_ALLOW_CREDENTIALS = True
+
+# 執行期間產生的資料（模型狀態檔等）存放目錄，不納入版本控制
+TRAFFIC_DATA_DIR = env("TRAFFIC_DATA_DIR", default = os.path.join(BASE_DIR, 'var'))
+
+# 模型版本設定（可透過 /api/traffic/models/ 或 activate_model 指令熱切換，不需重啟）；
+# 切換後的版本記錄在 TRAFFIC_MODEL_STATE_FILE，狀態檔存在時重啟後仍以狀態檔為準，設定值只用於第一次啟動
+TRAFFIC_MODEL_VERSION = env("TRAFFIC_MODEL_VERSION", default = "current")
+TRAFFIC_SHADOW_MODEL_VERSION = env("TRAFFIC_SHADOW_MODEL_VERSION", default = "") or None
+# 模型變體：keras（原始 float32）、float16、int8（需先執行 quantize_model 產生量化模型）
+TRAFFIC_MODEL_VARIANT = env("TRAFFIC_MODEL_VARIANT", default = "keras")
+# 多個 worker 之間同步模型切換的狀態檔（刪除後重啟即改用 TRAFFIC_MODEL_VERSION）
+TRAFFIC_MODEL_STATE_FILE = env("TRAFFIC_MODEL_STATE_FILE", default = os.path.join(TRAFFIC_DATA_DIR, 'model_state.json'))
+TRAFFIC_MODEL_REFRESH_SECONDS = env.float("TRAFFIC_MODEL_REFRESH_SECONDS", default = 5.0)
+TRAFFIC_SHADOW_MAX_PENDING = env.int("TRAFFIC_SHADOW_MAX_PENDING", default = 100)
+
+# 敏感度分析 API（/api/traffic/sweep/）單次最多情境數與每次前向傳播筆數
+TRAFFIC_SWEEP_MAX_SCENARIOS = env.int("TRAFFIC_SWEEP_MAX_SCENARIOS", default = 100000)
+TRAFFIC_SWEEP_BATCH_SIZE = env.int("TRAFFIC_SWEEP_BATCH_SIZE", default = 16384)
+
+# SHAP 模型解釋：背景摘要快取目錄、k-means 樣本數、取樣的歷史 Group 數與 KernelExplainer 取樣數
+TRAFFIC_SHAP_CACHE_DIR = env("TRAFFIC_SHAP_CACHE_DIR", default = os.path.join(TRAFFIC_DATA_DIR, 'shap_cache'))
+TRAFFIC_SHAP_BACKGROUND_K = env.int("TRAFFIC_SHAP_BACKGROUND_K", default = 20)
+TRAFFIC_SHAP_BACKGROUND_GROUPS = env.int("TRAFFIC_SHAP_BACKGROUND_GROUPS", default = 1000)
+TRAFFIC_SHAP_NSAMPLES = env.int("TRAFFIC_SHAP_NSAMPLES", default = 1024)
+# 計算中斷（例如 worker 重啟）或失敗後，超過此秒數再次查詢會重新排入計算
+TRAFFIC_SHAP_STALE_SECONDS = env.int("TRAFFIC_SHAP_STALE_SECONDS", default = 300)
+
+# 背景工作（run_jobs 指令）：同時執行數、心跳逾時秒數（逾時視為 worker 中斷並重新排隊）、最大執行次數
+TRAFFIC_JOB_CONCURRENCY = env.int("TRAFFIC_JOB_CONCURRENCY", default = 1)
+TRAFFIC_JOB_STALE_SECONDS = env.int("TRAFFIC_JOB_STALE_SECONDS", default = 600)
+TRAFFIC_JOB_MAX_ATTEMPTS = env.int("TRAFFIC_JOB_MAX_ATTEMPTS", default = 3)
+
+# 即時推播（/api/traffic/stream/ 與 websocket /api/traffic/ws/）：心跳秒數、每個連線最多暫存事件數、重連時最多補送筆數
+TRAFFIC_STREAM_HEARTBEAT_SECONDS = env.int("TRAFFIC_STREAM_HEARTBEAT_SECONDS", default = 15)
+TRAFFIC_STREAM_QUEUE_SIZE = env.int("TRAFFIC_STREAM_QUEUE_SIZE", default = 100)
+TRAFFIC_STREAM_BACKFILL_LIMIT = env.int("TRAFFIC_STREAM_BACKFILL_LIMIT", default = 100)
+
+# 偵測器滑動視窗狀態（/api/traffic/rolling/）：視窗秒數（逗號分隔）與每個偵測器車道保留的讀數筆數
+TRAFFIC_WINDOW_SECONDS = env.list("TRAFFIC_WINDOW_SECONDS", cast = int, default = [300, 900])
+TRAFFIC_WINDOW_CAPACITY = env.int("TRAFFIC_WINDOW_CAPACITY", default = 256)
+
+# 預測 API 重送判定時間窗（秒），時間窗內相同 Idempotency-Key 或相同資料直接回傳先前結果；0 表示停用
+TRAFFIC_IDEMPOTENCY_WINDOW_SECONDS = env.int("TRAFFIC_IDEMPOTENCY_WINDOW_SECONDS", default = 600)
+
+# 推論准入控制：同時推論數、排隊上限、期限秒數（預估無法在期限內完成即拒絕）；
+# 忙碌時預設回傳 503 + Retry-After，TRAFFIC_OVERLOAD_DEGRADE=True 時改回傳最近一次的綠燈秒數
+TRAFFIC_INFERENCE_CONCURRENCY = env.int("TRAFFIC_INFERENCE_CONCURRENCY", default = 2)
+TRAFFIC_INFERENCE_QUEUE_SIZE = env.int("TRAFFIC_INFERENCE_QUEUE_SIZE", default = 8)
+TRAFFIC_INFERENCE_DEADLINE_SECONDS = env.float("TRAFFIC_INFERENCE_DEADLINE_SECONDS", default = 2.0)
+TRAFFIC_OVERLOAD_DEGRADE = env.bool("TRAFFIC_OVERLOAD_DEGRADE", default = False)
+
+# 線上請求取樣分析（/api/traffic/profiles/）：取樣比例（0 表示不隨機取樣）、X-Traffic-Profile 標頭的密鑰（空字串表示停用），
+# 兩者皆未設定時不啟用；擷取堆疊的間隔毫秒數、保留筆數與取樣的路徑前綴
+TRAFFIC_PROFILE_SAMPLE_RATE = env.float("TRAFFIC_PROFILE_SAMPLE_RATE", default = 0.0)
+TRAFFIC_PROFILE_TOKEN = env("TRAFFIC_PROFILE_TOKEN", default = "")
+TRAFFIC_PROFILE_INTERVAL_MS = env.float("TRAFFIC_PROFILE_INTERVAL_MS", default = 5.0)
+TRAFFIC_PROFILE_KEEP = env.int("TRAFFIC_PROFILE_KEEP", default = 50)
+TRAFFIC_PROFILE_PATHS = env.list("TRAFFIC_PROFILE_PATHS", default = ["/api/traffic/predict/", "/api/traffic/query/"])
+
+# 路口設定（Junction）在每個行程內的快取秒數，admin 修改後最晚於此時間後生效；
+# 推論微批次：每批最多筆數、第一個請求等待其他同時到達請求的毫秒數（0 表示不等待）
+TRAFFIC_JUNCTION_CACHE_SECONDS = env.int("TRAFFIC_JUNCTION_CACHE_SECONDS", default = 30)
+TRAFFIC_BATCH_MAX_ROWS = env.int("TRAFFIC_BATCH_MAX_ROWS", default = 256)
+TRAFFIC_BATCH_MAX_WAIT_MS = env.float("TRAFFIC_BATCH_MAX_WAIT_MS", default = 2.0)
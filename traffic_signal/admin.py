@@ -1,5 +1,29 @@
 from django.contrib import admin
-from .models import Group, Intersection
+from .models import Group, Intersection, ModelPrediction, Explanation, Job, Junction, JunctionDetector
+
+
+class JunctionDetectorInline(admin.TabularInline):
+    """路口偵測器的內嵌編輯"""
+    model = JunctionDetector
+    extra = 0
+    fields = ['position', 'VD_ID', 'model_vd_id', 'direction', 'description']
+    ordering = ['position']
+
+
+@admin.register(Junction)
+class JunctionAdmin(admin.ModelAdmin):
+    """路口設定的管理介面"""
+    list_display = [
+        'code',
+        'name',
+        'model_version',
+        'is_active',
+        'updated_at'
+    ]
+    list_filter = ['is_active', 'model_version']
+    search_fields = ['code', 'name']
+    readonly_fields = ['created_at', 'updated_at']
+    inlines = [JunctionDetectorInline]
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -8,11 +32,12 @@ class GroupAdmin(admin.ModelAdmin):
         'id',
         'group_id',
         'timestamp',
+        'junction',
         'east_west_seconds',
         'south_north_seconds',
         'get_intersection_count'
     ]
-    list_filter = ['timestamp']
+    list_filter = ['timestamp', 'junction']
     search_fields = ['group_id']
     readonly_fields = ['group_id', 'timestamp']
     ordering = ['-timestamp']
@@ -29,7 +54,7 @@ class IntersectionInline(admin.TabularInline):
     extra = 0
     readonly_fields = ['created_at']
     fields = [
-        'VD_ID', 'LaneID', 'DayOfWeek', 'Hour', 'Minute', 'Second',
+        'VD_ID', 'model_vd_id', 'LaneID', 'DayOfWeek', 'Hour', 'Minute', 'Second',
         'IsPeakHour', 'Speed', 'Occupancy',
         'Volume_M', 'Speed_M', 'Volume_S', 'Speed_S',
         'Volume_L', 'Speed_L', 'Volume_T', 'Speed_T'
@@ -66,7 +91,7 @@ class IntersectionAdmin(admin.ModelAdmin):
 
     fieldsets = (
         ('基本資訊', {
-            'fields': ('group', 'VD_ID', 'LaneID', 'LaneType')
+            'fields': ('group', 'VD_ID', 'model_vd_id', 'LaneID', 'LaneType')
         }),
         ('時間資訊', {
             'fields': ('DayOfWeek', 'Hour', 'Minute', 'Second', 'IsPeakHour')
@@ -103,5 +128,58 @@ class IntersectionAdmin(admin.ModelAdmin):
     get_direction_display.short_description = '方向'
 
 
+@admin.register(ModelPrediction)
+class ModelPredictionAdmin(admin.ModelAdmin):
+    """模型版本預測表的管理介面"""
+    list_display = [
+        'id',
+        'group',
+        'model_version',
+        'east_west_seconds',
+        'south_north_seconds',
+        'created_at'
+    ]
+    list_filter = ['model_version']
+    search_fields = ['group__group_id']
+    readonly_fields = ['created_at']
+    ordering = ['-group', 'model_version']
+
+
+@admin.register(Explanation)
+class ExplanationAdmin(admin.ModelAdmin):
+    """SHAP 模型解釋表的管理介面"""
+    list_display = [
+        'id',
+        'group',
+        'model_version',
+        'status',
+        'base_value',
+        'updated_at'
+    ]
+    list_filter = ['model_version', 'status']
+    search_fields = ['group__group_id']
+    readonly_fields = ['created_at', 'updated_at']
+    ordering = ['-created_at']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """背景工作表的管理介面"""
+    list_display = [
+        'id',
+        'kind',
+        'status',
+        'progress_done',
+        'progress_total',
+        'attempts',
+        'worker',
+        'created_at',
+        'finished_at'
+    ]
+    list_filter = ['kind', 'status']
+    readonly_fields = ['created_at', 'started_at', 'finished_at', 'heartbeat_at']
+    ordering = ['-id']
+
+
 # 將 Intersection 作為 Group 的內嵌編輯
 GroupAdmin.inlines = [IntersectionInline]
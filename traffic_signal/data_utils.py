@@ -3,19 +3,44 @@
 """
 from django.db import transaction
 from .models import Group, Intersection
-from typing import List, Dict, Any, Optional
+from .ml.predictor import RAW_FEATURE_NAMES
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+import numpy as np
+
+# 每組固定四筆路口資料：第 0、1 筆為東西向，第 2、3 筆為南北向
+ROWS_PER_GROUP = 4
+
+# 綠燈秒數上限
+MAX_SECONDS = 99
+
+
+def direction_seconds(preds) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    由每筆路口的預測秒數計算各組東西向、南北向的最大綠燈秒數
+
+    Args:
+        preds: 依路口順序排列的預測秒數，長度為 4 的倍數
+
+    Returns:
+        (east_west_seconds, south_north_seconds)，形狀皆為 (組數,)
+    """
+    preds = np.asarray(preds).reshape(-1, ROWS_PER_GROUP)
+    east_west = np.minimum(preds[:, :2].max(axis=1), MAX_SECONDS)
+    south_north = np.minimum(preds[:, 2:].max(axis=1), MAX_SECONDS)
+    return east_west, south_north
 
 
 class TrafficDataValidator:
     """交通資料驗證器"""
 
     @staticmethod
-    def validate_intersection_data(data: Dict[str, Any]) -> List[str]:
+    def validate_intersection_data(data: Dict[str, Any], valid_vd_ids: Optional[List[str]] = None) -> List[str]:
         """
         驗證單筆路口資料
 
         Args:
             data: 路口資料字典
+            valid_vd_ids: 允許的 VD_ID，預設為所有路口設定中的偵測器
 
         Returns:
             錯誤訊息列表，如果沒有錯誤則為空列表
@@ -35,7 +60,9 @@ class TrafficDataValidator:
                 errors.append(f"缺少必要欄位: {field}")
 
         # 檢查 VD_ID 是否有效
-        valid_vd_ids = [choice[0] for choice in Intersection.VD_ID_CHOICES]
+        if valid_vd_ids is None:
+            from .junctions import detector_labels
+            valid_vd_ids = list(detector_labels())
         if data.get('VD_ID') not in valid_vd_ids:
             errors.append(f"無效的 VD_ID: {data.get('VD_ID')}")
 
@@ -68,12 +95,13 @@ class TrafficDataValidator:
         return errors
 
     @staticmethod
-    def validate_batch_data(traffic_data: List[Dict[str, Any]]) -> List[str]:
+    def validate_batch_data(traffic_data: List[Dict[str, Any]], valid_vd_ids: Optional[List[str]] = None) -> List[str]:
         """
         驗證整批交通資料
 
         Args:
             traffic_data: 包含四個路口資料的列表
+            valid_vd_ids: 允許的 VD_ID，預設為所有路口設定中的偵測器
 
         Returns:
             錯誤訊息列表
@@ -89,8 +117,66 @@ class TrafficDataValidator:
             return errors
 
         for i, data in enumerate(traffic_data):
-            data_errors = TrafficDataValidator.validate_intersection_data(data)
+            if not isinstance(data, dict):
+                errors.append(f"第 {i+1} 筆資料: 必須是物件格式")
+                continue
+            data_errors = TrafficDataValidator.validate_intersection_data(data, valid_vd_ids)
             for error in data_errors:
                 errors.append(f"第 {i+1} 筆資料: {error}")
 
         return errors
+
+
+def iter_group_chunks(
+    groups=None,
+    chunk_size: int = 5000,
+    after_id: int = 0,
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    以 Group.id 遞增的 keyset 分頁方式，分批串流讀取 Group 與其四筆路口資料
+
+    每批只保留剛好四筆路口資料的 Group，路口依寫入順序（id）排列，
+    與 TrafficPrediction 收到的資料順序一致。記憶體用量只與 chunk_size 有關。
+
+    Args:
+        groups: Group 查詢集（可先套用日期等篩選），預設為全部
+        chunk_size: 每批讀取的 Group 數量
+        after_id: 只讀取 id 大於此值的 Group，用於中斷後續跑
+
+    Yields:
+        (group_ids, raw, vd_ids)
+        group_ids: 形狀 (g,) 的 Group.id
+        raw: 形狀 (g * 4, len(RAW_FEATURE_NAMES)) 的原始特徵矩陣
+        vd_ids: 形狀 (g * 4,) 的模型 VD_ID（Intersection.model_vd_id，依寫入時的路口設定）
+    """
+    if groups is None:
+        groups = Group.objects.all()
+
+    last_id = after_id
+    while True:
+        chunk_ids = list(
+            groups.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not chunk_ids:
+            return
+        last_id = chunk_ids[-1]
+
+        # 以 id 範圍取代大量 IN 參數，再於 numpy 中篩掉範圍內不符合條件的 Group
+        rows = list(
+            Intersection.objects.filter(group_id__gte=chunk_ids[0], group_id__lte=last_id)
+            .order_by('group_id', 'id')
+            .values_list('group_id', 'model_vd_id', *RAW_FEATURE_NAMES)
+        )
+        if not rows:
+            continue
+
+        row_group_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        vd_ids = np.array([row[1] for row in rows], dtype=object)
+        raw = np.array([row[2:] for row in rows], dtype=float)
+
+        unique_ids, counts = np.unique(row_group_ids, return_counts=True)
+        complete_ids = unique_ids[(counts == ROWS_PER_GROUP) & np.isin(unique_ids, chunk_ids)]
+        mask = np.isin(row_group_ids, complete_ids)
+
+        if complete_ids.size:
+            yield complete_ids, raw[mask], vd_ids[mask]
@@ -0,0 +1,75 @@
+"""
+讀寫分離 - 唯讀的查詢 / 分析 API 讀取副本資料庫，其他讀取與所有寫入都使用 default
+
+只有 view 類別設定 read_replica = True 且為 GET/HEAD 的請求才會讀副本；
+寫入後的一小段時間內（settings.TRAFFIC_READ_YOUR_WRITES_SECONDS），同一個客戶端以 cookie 標記改讀主資料庫，
+確保剛寫入的資料立即查得到（read-your-writes）。同一個請求中寫入後的讀取也一律回到主資料庫。
+"""
+import contextvars
+
+from django.conf import settings
+
+PIN_COOKIE = 'traffic_read_primary'
+
+_use_replica = contextvars.ContextVar('traffic_use_replica', default=False)
+
+
+def replica_alias():
+    alias = getattr(settings, 'TRAFFIC_READ_REPLICA_ALIAS', None)
+    return alias if alias in settings.DATABASES else None
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # 寫入後同一個請求內的讀取改回主資料庫
+        _use_replica.set(False)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 副本與主資料庫內容相同
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 副本的資料表結構來自複寫（或 sync_replica 複製），不直接 migrate
+        return db != replica_alias()
+
+
+class ReadReplicaMiddleware:
+    """標記可讀副本的請求，並在寫入成功後設定讀主資料庫的 cookie"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _use_replica.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+
+        if replica_alias() and request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            response.set_cookie(
+                PIN_COOKIE,
+                '1',
+                max_age=getattr(settings, 'TRAFFIC_READ_YOUR_WRITES_SECONDS', 5),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        read_replica = getattr(view_class or view_func, 'read_replica', False)
+        if (
+            read_replica
+            and request.method in ('GET', 'HEAD')
+            and replica_alias()
+            and PIN_COOKIE not in request.COOKIES
+        ):
+            _use_replica.set(True)
+        return None
@@ -0,0 +1,115 @@
+"""
+SHAP 模型解釋的背景計算
+
+解釋一組資料需要數秒，因此一律排入背景工作佇列（explain_group 工作，由 run_jobs 指令的 worker 執行）
+計算並存入 Explanation；API 只負責排入計算與讀取結果，不佔用 web worker，服務重啟也不會遺失排入的計算。
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .feature_store import iter_feature_chunks
+from .jobs import submit_job
+from .ml.explain import build_background, explain_rows, get_background
+from .ml.predictor import RAW_FEATURE_NAMES
+from .ml.registry import get_registry
+from .models import Explanation, Group, Job
+
+
+def load_background(predictor, rebuild=False):
+    """
+    取得指定模型版本的背景摘要，沒有快取（或 rebuild=True）時以最近的歷史資料計算 k-means 摘要並寫入快取
+    """
+    cache_dir = getattr(settings, 'TRAFFIC_SHAP_CACHE_DIR', None)
+    if not rebuild:
+        background = get_background(predictor, cache_dir)
+        if background is not None:
+            return background
+
+    limit = getattr(settings, 'TRAFFIC_SHAP_BACKGROUND_GROUPS', 1000)
+    recent_ids = list(Group.objects.order_by('-id').values_list('id', flat=True)[:limit])
+    if not recent_ids:
+        raise ValueError("資料庫中沒有可用於背景摘要的歷史資料")
+
+    matrices = [
+        predictor.scale_features(features)
+        for _, features in iter_feature_chunks(Group.objects.filter(id__gte=min(recent_ids)))
+    ]
+    if not matrices:
+        raise ValueError("資料庫中沒有完整四筆路口的歷史資料")
+
+    return build_background(
+        predictor,
+        np.concatenate(matrices),
+        k=getattr(settings, 'TRAFFIC_SHAP_BACKGROUND_K', 20),
+        cache_dir=cache_dir,
+    )
+
+
+def compute_explanation(explanation_id):
+    """計算單一 Explanation（在背景工作 worker 執行），失敗時標記為 failed 並拋出例外"""
+    try:
+        explanation = Explanation.objects.select_related('group').get(pk=explanation_id)
+        explanation.status = Explanation.STATUS_RUNNING
+        explanation.save(update_fields=['status', 'updated_at'])
+
+        predictor = get_registry().load(explanation.model_version)
+        rows = list(
+            explanation.group.intersections.order_by('id').values_list('model_vd_id', *RAW_FEATURE_NAMES)
+        )
+        raw = np.array([row[1:] for row in rows], dtype=float)
+        X = predictor.preprocess_arrays(raw, [row[0] for row in rows])
+
+        base_value, shap_values = explain_rows(
+            predictor,
+            X,
+            load_background(predictor),
+            nsamples=getattr(settings, 'TRAFFIC_SHAP_NSAMPLES', 'auto'),
+        )
+
+        explanation.base_value = base_value
+        explanation.feature_names = list(predictor.feature_names)
+        explanation.predictions = predictor.forward(X).reshape(-1).tolist()
+        explanation.values = shap_values.tolist()
+        explanation.status = Explanation.STATUS_READY
+        explanation.error = ''
+        explanation.save()
+
+    except Exception as e:
+        Explanation.objects.filter(pk=explanation_id).update(
+            status=Explanation.STATUS_FAILED, error=str(e), updated_at=timezone.now()
+        )
+        raise
+
+
+def request_explanation(group, model_version):
+    """
+    取得 Group 的解釋結果，尚未計算、計算中斷逾時或失敗超過一段時間時排入背景計算
+
+    Returns:
+        Explanation，status 為 ready 時可直接讀取結果
+    """
+    explanation, created = Explanation.objects.get_or_create(group=group, model_version=model_version)
+
+    stale_after = timedelta(seconds=getattr(settings, 'TRAFFIC_SHAP_STALE_SECONDS', 300))
+    is_stale = (
+        explanation.status != Explanation.STATUS_READY
+        and explanation.updated_at < timezone.now() - stale_after
+    )
+    if created or is_stale:
+        if is_stale:
+            Explanation.objects.filter(pk=explanation.pk).update(
+                status=Explanation.STATUS_PENDING, updated_at=timezone.now()
+            )
+        # 佇列中已有同一個 Explanation 的工作（例如 worker 忙碌而逾時）時不重複排入
+        queued = Job.objects.filter(
+            kind='explain_group',
+            params__explanation_id=explanation.pk,
+            status__in=[Job.STATUS_QUEUED, Job.STATUS_RUNNING],
+        ).exists()
+        if not queued:
+            submit_job('explain_group', {"explanation_id": explanation.pk})
+
+    return explanation
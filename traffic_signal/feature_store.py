@@ -0,0 +1,169 @@
+"""
+路口特徵表 - 每筆路口資料寫入時計算一次標準化前的完整特徵（含 VD_ID one-hot 與複合特徵），
+以 float32 二進位存在 IntersectionFeatures，批次工作（重算、訓練、量化驗證、SHAP 背景）直接以 np.frombuffer 讀取
+
+特徵向量標記 FEATURE_PIPELINE_VERSION，計算方式變更後舊版本的特徵不會被使用，
+讀取時改由原始欄位重新計算，可再以 backfill_features 指令（或 backfill_features 背景工作）補寫。
+重新計算時 one-hot 使用 Intersection.model_vd_id（寫入時路口設定的模型偵測器類型），與寫入時的特徵相同。
+"""
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .data_utils import ROWS_PER_GROUP, iter_group_chunks
+from .ml.predictor import FEATURE_NAMES, FEATURE_PIPELINE_VERSION, Predictor, RAW_FEATURE_NAMES
+from .models import Group, Intersection, IntersectionFeatures
+
+FEATURE_DTYPE = np.dtype('<f4')
+
+
+def records_to_arrays(records: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """將 API 收到的路口資料轉為 (raw, vd_ids)，未提供的選填欄位（特種車）與寫入資料庫時相同以 0 計算"""
+    raw = np.array([[record.get(name, 0) for name in RAW_FEATURE_NAMES] for record in records], dtype=float)
+    vd_ids = np.array([record.get('VD_ID') for record in records], dtype=object)
+    return raw, vd_ids
+
+
+def pack_features(features) -> List[bytes]:
+    """特徵矩陣的每一列轉為 float32 二進位"""
+    features = np.ascontiguousarray(features, dtype=FEATURE_DTYPE)
+    return [row.tobytes() for row in features]
+
+
+def unpack_features(blobs) -> np.ndarray:
+    """多筆特徵二進位合併為形狀 (n, len(FEATURE_NAMES)) 的 float32 矩陣（唯讀）"""
+    if not blobs:
+        return np.zeros((0, len(FEATURE_NAMES)), dtype=FEATURE_DTYPE)
+    return np.frombuffer(b''.join(blobs), dtype=FEATURE_DTYPE).reshape(-1, len(FEATURE_NAMES))
+
+
+def save_features(intersections, features):
+    """寫入剛建立的路口資料的特徵，intersections 與 features 的順序需一致"""
+    IntersectionFeatures.objects.bulk_create([
+        IntersectionFeatures(intersection=intersection, pipeline_version=FEATURE_PIPELINE_VERSION, vector=vector)
+        for intersection, vector in zip(intersections, pack_features(features))
+    ])
+
+
+def iter_feature_chunks(
+    groups=None,
+    chunk_size: int = 5000,
+    after_id: int = 0,
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    與 iter_group_chunks 相同的分批方式與篩選規則，但回傳標準化前的完整特徵矩陣
+
+    優先讀取路口特徵表；缺少特徵或特徵版本不符的 Group 改由原始欄位計算，因此未補寫完成前也能使用。
+
+    Yields:
+        (group_ids, features)
+        group_ids: 形狀 (g,) 的 Group.id
+        features: 形狀 (g * 4, len(FEATURE_NAMES)) 的 float32 矩陣，可直接交給 Predictor.scale_features
+    """
+    if groups is None:
+        groups = Group.objects.all()
+
+    last_id = after_id
+    while True:
+        chunk_ids = np.array(
+            list(groups.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size]), dtype=np.int64
+        )
+        if not chunk_ids.size:
+            return
+        last_id = int(chunk_ids[-1])
+
+        rows = list(
+            IntersectionFeatures.objects.filter(
+                intersection__group_id__gte=int(chunk_ids[0]),
+                intersection__group_id__lte=last_id,
+                pipeline_version=FEATURE_PIPELINE_VERSION,
+            )
+            .order_by('intersection__group_id', 'intersection_id')
+            .values_list('intersection__group_id', 'vector')
+        )
+        row_group_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        stored = unpack_features([row[1] for row in rows])
+
+        unique_ids, counts = np.unique(row_group_ids, return_counts=True)
+        complete_ids = unique_ids[(counts == ROWS_PER_GROUP) & np.isin(unique_ids, chunk_ids)]
+        group_ids = [complete_ids]
+        features = [stored[np.isin(row_group_ids, complete_ids)]]
+
+        # 特徵表尚未補寫的 Group 由原始欄位計算
+        missing_ids = np.setdiff1d(chunk_ids, complete_ids)
+        if missing_ids.size:
+            for ids, raw, vd_ids in iter_group_chunks(
+                Group.objects.filter(id__in=missing_ids.tolist()), chunk_size=chunk_size, after_id=int(missing_ids[0]) - 1
+            ):
+                group_ids.append(ids)
+                features.append(Predictor.build_features(raw, vd_ids).astype(FEATURE_DTYPE))
+
+        group_ids = np.concatenate(group_ids)
+        if not group_ids.size:
+            continue
+        features = np.concatenate(features)
+        if len(group_ids) > len(complete_ids):
+            # 兩種來源合併後依 Group.id 重新排序，每組四筆的順序不變
+            order = np.argsort(group_ids, kind='stable')
+            group_ids = group_ids[order]
+            features = features.reshape(-1, ROWS_PER_GROUP, len(FEATURE_NAMES))[order].reshape(-1, len(FEATURE_NAMES))
+        yield group_ids, features
+
+
+def backfill_features(
+    groups=None,
+    chunk_size: int = 5000,
+    after_id: int = 0,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, int]:
+    """
+    補寫缺少特徵（或特徵版本不符）的路口資料
+
+    Args:
+        groups: 要補寫的 Group 查詢集，預設為全部
+        chunk_size: 每批讀取的 Group 數量
+        after_id: 只處理 id 大於此值的 Group（中斷後續跑用）
+        on_progress: 每批完成後呼叫 on_progress(last_group_id, processed_groups)
+
+    Returns:
+        {"groups": 已處理的 Group 數量, "intersections": 寫入的特徵筆數, "last_group_id": 最後處理的 Group.id}
+    """
+    if groups is None:
+        groups = Group.objects.all()
+
+    processed = 0
+    written = 0
+    last_id = after_id
+    while True:
+        chunk_ids = list(groups.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not chunk_ids:
+            break
+        last_id = chunk_ids[-1]
+
+        rows = list(
+            Intersection.objects.filter(group_id__gte=chunk_ids[0], group_id__lte=last_id)
+            .exclude(features__pipeline_version=FEATURE_PIPELINE_VERSION)
+            .values_list('id', 'group_id', 'model_vd_id', *RAW_FEATURE_NAMES)
+        )
+        chunk_set = set(chunk_ids)
+        rows = [row for row in rows if row[1] in chunk_set]
+        if rows:
+            raw = np.array([row[3:] for row in rows], dtype=float)
+            vd_ids = np.array([row[2] for row in rows], dtype=object)
+            IntersectionFeatures.objects.bulk_create(
+                [
+                    IntersectionFeatures(intersection_id=row[0], pipeline_version=FEATURE_PIPELINE_VERSION, vector=vector)
+                    for row, vector in zip(rows, pack_features(Predictor.build_features(raw, vd_ids)))
+                ],
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['intersection'],
+                update_fields=['pipeline_version', 'vector'],
+            )
+            written += len(rows)
+
+        processed += len(chunk_ids)
+        if on_progress is not None:
+            on_progress(last_id, processed)
+
+    return {"groups": processed, "intersections": written, "last_group_id": last_id}
@@ -0,0 +1,69 @@
+"""
+預測 API 的冪等處理 - 路側設備逾時重送時直接回傳已儲存的結果，不重新推論也不重複寫入
+
+識別鍵優先使用 Idempotency-Key 標頭，沒有時以四筆路口資料（含偵測器的星期、時、分、秒）的內容雜湊代替，
+存在 Group.request_key；同一識別鍵在 settings.TRAFFIC_IDEMPOTENCY_WINDOW_SECONDS 內重送視為重試。
+
+request_key 有唯一限制，並行的重試（包含不同 worker 行程）只有一個能寫入，其餘寫入失敗後改為回傳已寫入的結果；
+超過時間窗的舊識別鍵在寫入前清除。內容雜湊存在 Group.request_hash，同一個 Idempotency-Key 搭配不同內容時拒絕。
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Group
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def _window():
+    return getattr(settings, 'TRAFFIC_IDEMPOTENCY_WINDOW_SECONDS', 600)
+
+
+def request_key(request, input_data, scope=None):
+    """
+    計算請求的 (識別鍵, 內容雜湊)（sha256 十六進位字串），scope（例如路口代碼）不同的相同請求視為不同請求
+
+    停用重送判定（時間窗為 0）時回傳 (None, None)，不記錄識別鍵
+    """
+    if _window() <= 0:
+        return None, None
+    body = json.dumps(input_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    body_hash = hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+    header = request.headers.get(IDEMPOTENCY_HEADER)
+    if header:
+        source = f"key:{header}"
+    else:
+        source = f"body:{body}"
+    if scope:
+        source = f"{scope}|{source}"
+    return hashlib.sha256(source.encode('utf-8')).hexdigest(), body_hash
+
+
+def find_replay(key):
+    """查詢時間窗內相同識別鍵已儲存的 Group，沒有則回傳 None"""
+    window = _window()
+    if key is None or window <= 0:
+        return None
+    return (
+        Group.objects.filter(request_key=key, timestamp__gte=timezone.now() - timedelta(seconds=window))
+        .order_by('-id')
+        .first()
+    )
+
+
+def same_request(group, body_hash):
+    """已儲存的 Group 是否為同一個請求內容（舊資料沒有內容雜湊時視為相同）"""
+    return not group.request_hash or group.request_hash == body_hash
+
+
+def release_expired_key(key):
+    """清除超過時間窗的舊資料上的相同識別鍵，讓新的請求可以寫入（需在寫入的交易內呼叫）"""
+    if key is None:
+        return
+    cutoff = timezone.now() - timedelta(seconds=_window())
+    Group.objects.filter(request_key=key, timestamp__lt=cutoff).update(request_key=None)
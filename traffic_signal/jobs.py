@@ -0,0 +1,301 @@
+"""
+資料庫背景工作佇列
+
+不需要外部 broker：工作存在 Job 資料表，由 run_jobs 指令啟動的 worker 認領執行。
+工作處理函式以 @register 註冊，執行時透過 JobContext 回報進度並寫入檢查點，
+worker 中斷後（心跳逾時）工作會重新排隊，並從最後的檢查點續跑。
+"""
+import logging
+from datetime import timedelta
+from typing import Any, Callable, Dict, Optional
+
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_handlers: Dict[str, Callable] = {}
+_validators: Dict[str, Optional[Callable]] = {}
+
+
+def register(kind: str, validate: Optional[Callable[[Dict[str, Any]], None]] = None):
+    """
+    註冊工作類型
+
+    Args:
+        kind: 工作類型名稱
+        validate: 送出工作時檢查參數的函式，參數錯誤時拋出 ValueError
+    """
+    def decorator(handler):
+        _handlers[kind] = handler
+        _validators[kind] = validate
+        return handler
+    return decorator
+
+
+def job_kinds():
+    return sorted(_handlers)
+
+
+class JobContext:
+    """傳給工作處理函式的執行環境，提供參數、上次的檢查點與進度回報"""
+
+    def __init__(self, job: Job):
+        self.job = job
+        self.params = job.params or {}
+        self.checkpoint = job.checkpoint or {}
+
+    def report(self, done: int, total: Optional[int] = None, checkpoint: Optional[Dict[str, Any]] = None):
+        """回報進度（同時作為心跳），checkpoint 會在工作中斷重跑時傳回"""
+        fields = {"progress_done": done, "heartbeat_at": timezone.now()}
+        if total is not None:
+            fields["progress_total"] = total
+            self.job.progress_total = total
+        if checkpoint is not None:
+            fields["checkpoint"] = checkpoint
+            self.checkpoint = checkpoint
+        self.job.progress_done = done
+        Job.objects.filter(pk=self.job.pk).update(**fields)
+
+
+def submit_job(kind: str, params: Optional[Dict[str, Any]] = None) -> Job:
+    """
+    送出工作到佇列
+
+    Raises:
+        ValueError: 未知的工作類型或參數錯誤
+    """
+    if not isinstance(kind, str):
+        raise ValueError(f"kind 必須是字串，可用類型: {', '.join(job_kinds())}")
+    if kind not in _handlers:
+        raise ValueError(f"未知的工作類型: {kind}，可用類型: {', '.join(job_kinds())}")
+    params = params or {}
+    if not isinstance(params, dict):
+        raise ValueError("params 必須是物件")
+    validate = _validators.get(kind)
+    if validate is not None:
+        validate(params)
+    return Job.objects.create(kind=kind, params=params)
+
+
+def claim_next_job(worker: str) -> Optional[Job]:
+    """
+    認領下一個排隊中的工作
+
+    以「狀態仍為 queued 才更新」的條件式 UPDATE 認領，多個 worker 同時搶同一筆時只有一個會成功，
+    SQLite 與 MySQL 都適用，不需要 SELECT ... FOR UPDATE SKIP LOCKED。
+    """
+    candidates = Job.objects.filter(status=Job.STATUS_QUEUED).order_by('id').values_list('id', flat=True)[:10]
+    for job_id in list(candidates):
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=job_id, status=Job.STATUS_QUEUED).update(
+            status=Job.STATUS_RUNNING,
+            worker=worker,
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def requeue_stale_jobs(stale_after: float, max_attempts: int) -> int:
+    """
+    將心跳逾時（worker 已中斷）的工作重新排隊，超過最大執行次數的標記為失敗
+
+    Returns:
+        重新排隊的工作數量
+    """
+    deadline = timezone.now() - timedelta(seconds=stale_after)
+    stale = Job.objects.filter(status=Job.STATUS_RUNNING, heartbeat_at__lt=deadline)
+
+    stale.filter(attempts__gte=max_attempts).update(
+        status=Job.STATUS_FAILED,
+        error="worker 中斷次數超過上限",
+        finished_at=timezone.now(),
+    )
+    return stale.filter(attempts__lt=max_attempts).update(status=Job.STATUS_QUEUED, worker='')
+
+
+def run_job(job: Job):
+    """
+    執行已認領的工作並記錄結果（在 worker 執行緒中執行）
+
+    結果只在工作仍由這個 worker 執行時寫入：心跳逾時被重新排隊（並由其他 worker 認領）的工作，
+    原本的 worker 之後才完成時不會覆寫新的執行結果
+    """
+    owned = Job.objects.filter(pk=job.pk, status=Job.STATUS_RUNNING, worker=job.worker)
+    try:
+        result = _handlers[job.kind](JobContext(job))
+        updated = owned.update(
+            status=Job.STATUS_SUCCEEDED,
+            result=result,
+            error='',
+            finished_at=timezone.now(),
+            heartbeat_at=timezone.now(),
+        )
+    except Exception as e:
+        logger.exception("背景工作失敗: Job %s (%s)", job.pk, job.kind)
+        updated = owned.update(
+            status=Job.STATUS_FAILED,
+            error=str(e),
+            finished_at=timezone.now(),
+        )
+    finally:
+        # worker 執行緒不會經過 request_finished，需自行關閉資料庫連線
+        connection.close()
+    if not updated:
+        logger.warning("Job %s (%s) 已不屬於 worker %s（心跳逾時後重新排隊），捨棄本次執行結果", job.pk, job.kind, job.worker)
+
+
+def serialize_job(job: Job) -> Dict[str, Any]:
+    total = job.progress_total
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "params": job.params,
+        "status": job.status,
+        "progress": {
+            "done": job.progress_done,
+            "total": total,
+            "percent": round(job.progress_done * 100 / total, 1) if total else None,
+        },
+        "result": job.result,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "heartbeat_at": job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+    }
+
+
+# ---------------------------------------------------------------------------
+# 內建工作類型
+# ---------------------------------------------------------------------------
+
+def _validate_model_version(params):
+    from .ml.predictor import available_versions
+
+    version = params.get('version')
+    if version not in available_versions():
+        raise ValueError(f"找不到模型版本 {version}，可用版本: {', '.join(available_versions())}")
+
+
+def _validate_date_range(params):
+    from .rescoring import groups_in_date_range
+
+    try:
+        groups_in_date_range(params.get('start_date'), params.get('end_date'))
+    except ValueError:
+        raise ValueError("日期格式錯誤，請使用 YYYY-MM-DD 格式")
+
+
+def _validate_rescore(params):
+    _validate_model_version(params)
+    _validate_date_range(params)
+
+
+@register('rescore_history', validate=_validate_rescore)
+def rescore_history_job(ctx: JobContext):
+    """
+    以指定模型版本重算歷史資料
+    params: version, start_date, end_date, chunk_size, batch_size
+    """
+    from .ml.registry import get_registry
+    from .rescoring import groups_in_date_range, rescore_history
+
+    params = ctx.params
+    groups = groups_in_date_range(params.get('start_date'), params.get('end_date'))
+    processed_before = ctx.checkpoint.get('processed', 0)
+    total = ctx.job.progress_total
+    if total is None:
+        total = groups.count()
+        ctx.report(processed_before, total)
+
+    def on_progress(last_group_id, processed):
+        done = processed_before + processed
+        ctx.report(done, checkpoint={"after_id": last_group_id, "processed": done})
+
+    result = rescore_history(
+        params['version'],
+        groups=groups,
+        chunk_size=int(params.get('chunk_size', 5000)),
+        batch_size=int(params.get('batch_size', 8192)),
+        after_id=ctx.checkpoint.get('after_id', 0),
+        predictor=get_registry().load(params['version']),
+        on_progress=on_progress,
+    )
+    return {"groups": processed_before + result['groups'], "last_group_id": result['last_group_id']}
+
+
+@register('backfill_features', validate=_validate_date_range)
+def backfill_features_job(ctx: JobContext):
+    """
+    補寫歷史路口資料的特徵表
+    params: start_date, end_date, chunk_size
+    """
+    from .feature_store import backfill_features
+    from .rescoring import groups_in_date_range
+
+    params = ctx.params
+    groups = groups_in_date_range(params.get('start_date'), params.get('end_date'))
+    processed_before = ctx.checkpoint.get('processed', 0)
+    total = ctx.job.progress_total
+    if total is None:
+        total = groups.count()
+        ctx.report(processed_before, total)
+
+    def on_progress(last_group_id, processed):
+        done = processed_before + processed
+        ctx.report(done, checkpoint={"after_id": last_group_id, "processed": done})
+
+    result = backfill_features(
+        groups=groups,
+        chunk_size=int(params.get('chunk_size', 5000)),
+        after_id=ctx.checkpoint.get('after_id', 0),
+        on_progress=on_progress,
+    )
+    return {
+        "groups": processed_before + result['groups'],
+        "intersections": result['intersections'],
+        "last_group_id": result['last_group_id'],
+    }
+
+
+@register('build_shap_background', validate=_validate_model_version)
+def build_shap_background_job(ctx: JobContext):
+    """
+    重新計算指定模型版本的 SHAP 背景摘要
+    params: version
+    """
+    from .explanations import load_background
+    from .ml.registry import get_registry
+
+    background = load_background(get_registry().load(ctx.params['version']), rebuild=True)
+    ctx.report(1, 1)
+    return {"background_size": len(background.data)}
+
+
+def _validate_explanation(params):
+    from .models import Explanation
+
+    if not Explanation.objects.filter(pk=params.get('explanation_id')).exists():
+        raise ValueError(f"找不到 Explanation {params.get('explanation_id')}")
+
+
+@register('explain_group', validate=_validate_explanation)
+def explain_group_job(ctx: JobContext):
+    """
+    計算單一資料組的 SHAP 模型解釋（由 /api/traffic/explain/ 排入）
+    params: explanation_id
+    """
+    from .explanations import compute_explanation
+
+    compute_explanation(ctx.params['explanation_id'])
+    ctx.report(1, 1)
+    return {"explanation_id": ctx.params['explanation_id']}
@@ -0,0 +1,143 @@
+"""
+路口設定 - 依 Junction / JunctionDetector 決定預測 API 的資料順序、方向分組與使用的模型版本
+
+預測 API 的四筆資料依路口設定重新排列成「東西向兩筆、南北向兩筆」後再推論與儲存，
+因此 Intersection 的儲存順序、direction_seconds 與各批次工作的「第 0、1 筆為東西向，第 2、3 筆為南北向」規則不變。
+路口設定在每個行程內快取 settings.TRAFFIC_JUNCTION_CACHE_SECONDS 秒，在 admin 修改後最晚於此時間後生效。
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from .data_utils import ROWS_PER_GROUP
+from .ml.predictor import MODEL_VD_IDS
+from .models import Junction, JunctionDetector
+
+
+class JunctionNotFound(Exception):
+    pass
+
+
+class JunctionLayout:
+    """
+    單一路口的輸入資料配置
+
+    order: 依序取出的輸入位置，前兩個為東西向、後兩個為南北向
+    model_vd_ids: 輸入位置 -> (偵測器 ID, 模型使用的偵測器 ID)
+    """
+
+    def __init__(self, junction: Junction, detectors: List[JunctionDetector]):
+        self.junction_id = junction.id
+        self.code = junction.code
+        self.model_version = junction.model_version or None
+
+        by_direction = {JunctionDetector.DIRECTION_EAST_WEST: [], JunctionDetector.DIRECTION_SOUTH_NORTH: []}
+        for detector in sorted(detectors, key=lambda detector: detector.position):
+            by_direction[detector.direction].append(detector.position)
+        half = ROWS_PER_GROUP // 2
+        positions = sorted(detector.position for detector in detectors)
+        if (
+            positions != list(range(ROWS_PER_GROUP))
+            or len(by_direction[JunctionDetector.DIRECTION_EAST_WEST]) != half
+            or len(by_direction[JunctionDetector.DIRECTION_SOUTH_NORTH]) != half
+        ):
+            raise ValueError(f"路口 {junction.code} 的偵測器設定不完整：需要位置 0-3 各一個，東西向與南北向各兩個")
+        # admin 以 JunctionDetector.clean 檢查，這裡再檢查一次以免直接寫入資料庫的設定讓模型收到全為 0 的 one-hot
+        invalid = sorted({detector.model_vd_id for detector in detectors} - set(MODEL_VD_IDS))
+        if invalid:
+            raise ValueError(
+                f"路口 {junction.code} 的模型偵測器類型 {', '.join(invalid)} 不是模型訓練過的偵測器（{', '.join(MODEL_VD_IDS)}）"
+            )
+
+        self.order = by_direction[JunctionDetector.DIRECTION_EAST_WEST] + by_direction[JunctionDetector.DIRECTION_SOUTH_NORTH]
+        self.model_vd_ids = {detector.position: (detector.VD_ID, detector.model_vd_id) for detector in detectors}
+
+    @property
+    def vd_ids(self) -> List[str]:
+        """此路口可接受的偵測器 ID：路口設定的偵測器，以及模型訓練過的偵測器（不經對應直接使用，見 model_vd_id_list）"""
+        return sorted({vd_id for vd_id, _ in self.model_vd_ids.values()} | set(MODEL_VD_IDS))
+
+    def arrange(self, input_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """將輸入資料依方向重新排列（東西向兩筆在前），順序即儲存與推論的順序"""
+        return [input_data[position] for position in self.order]
+
+    def restore(self, arranged: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """arrange 的反向：將依儲存順序排列的資料還原成預測 API 的輸入順序（重播歷史資料時使用）"""
+        input_data: List[Dict[str, Any]] = [{}] * ROWS_PER_GROUP
+        for row, position in zip(arranged, self.order):
+            input_data[position] = row
+        return input_data
+
+    def model_vd_id_list(self, input_data: List[Dict[str, Any]]) -> List[Any]:
+        """
+        arrange 後各筆資料給模型使用的 VD_ID：符合路口設定的偵測器換成 model_vd_id，
+        其餘維持原本的 VD_ID（與未設定路口前的行為相同）
+        """
+        vd_ids = []
+        for position in self.order:
+            vd_id = input_data[position].get('VD_ID')
+            configured, model_vd_id = self.model_vd_ids[position]
+            vd_ids.append(model_vd_id if vd_id == configured else vd_id)
+        return vd_ids
+
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+
+
+def get_layout(code: Optional[str] = None) -> JunctionLayout:
+    """
+    取得路口配置（行程內快取）
+
+    Raises:
+        JunctionNotFound: 路口不存在或未啟用
+        ValueError: 路口的偵測器設定不完整
+    """
+    code = code or Junction.DEFAULT_CODE
+    ttl = getattr(settings, 'TRAFFIC_JUNCTION_CACHE_SECONDS', 30)
+    cached = _layouts.get(code)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    junction = Junction.objects.filter(code=code, is_active=True).prefetch_related('detectors').first()
+    if junction is None:
+        raise JunctionNotFound(code)
+    layout = JunctionLayout(junction, list(junction.detectors.all()))
+    with _layouts_lock:
+        _layouts[code] = (time.monotonic() + ttl, layout)
+    return layout
+
+
+_detector_labels = None
+_detector_labels_lock = threading.Lock()
+
+
+def detector_labels() -> Dict[str, str]:
+    """
+    所有路口設定的偵測器 ID -> 顯示名稱（路段說明，未填寫時為方向；同一偵測器有多個位置時以 / 連接），
+    用於 Intersection 的 VD_ID 選項、方向顯示與資料驗證，快取時間同 get_layout
+    """
+    global _detector_labels
+    cached = _detector_labels
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    labels: Dict[str, List[str]] = {}
+    try:
+        detectors = list(JunctionDetector.objects.order_by('junction_id', 'position'))
+    except DatabaseError:
+        # 尚未建立資料表（例如 migrate 之前）
+        return {}
+    for detector in detectors:
+        label = detector.description or detector.get_direction_display()
+        names = labels.setdefault(detector.VD_ID, [])
+        if label not in names:
+            names.append(label)
+
+    result = {vd_id: '/'.join(names) for vd_id, names in labels.items()}
+    with _detector_labels_lock:
+        _detector_labels = (time.monotonic() + getattr(settings, 'TRAFFIC_JUNCTION_CACHE_SECONDS', 30), result)
+    return result
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from traffic_signal.ml.registry import get_registry
+
+
+class Command(BaseCommand):
+    help = "切換線上模型或影子模型版本，執行中的 worker 會在數秒內自動套用"
+
+    def add_arguments(self, parser):
+        parser.add_argument('version', nargs='?', help="要切換成的線上模型版本")
+        parser.add_argument('--shadow', help="影子模型版本")
+        parser.add_argument('--no-shadow', action='store_true', help="關閉影子模型")
+
+    def handle(self, *args, **options):
+        registry = get_registry()
+        try:
+            if options['version']:
+                registry.activate(options['version'])
+            if options['shadow']:
+                registry.set_shadow(options['shadow'])
+            elif options['no_shadow']:
+                registry.set_shadow(None)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        status = registry.status()
+        self.stdout.write(self.style.SUCCESS(
+            f"線上模型: {status['active']}，影子模型: {status['shadow'] or '無'}"
+        ))
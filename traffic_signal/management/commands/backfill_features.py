@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from traffic_signal.feature_store import backfill_features
+from traffic_signal.ml.predictor import FEATURE_PIPELINE_VERSION
+from traffic_signal.rescoring import groups_in_date_range
+
+
+class Command(BaseCommand):
+    help = "補寫歷史路口資料的特徵表（缺少特徵或特徵計算版本不符的路口資料）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', help="開始日期 (YYYY-MM-DD)")
+        parser.add_argument('--end-date', help="結束日期 (YYYY-MM-DD)")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="每批讀取的 Group 數量")
+        parser.add_argument('--after-id', type=int, default=0, help="只處理 id 大於此值的 Group")
+
+    def handle(self, *args, **options):
+        try:
+            groups = groups_in_date_range(options['start_date'], options['end_date'])
+        except ValueError:
+            raise CommandError("日期格式錯誤，請使用 YYYY-MM-DD 格式")
+
+        def report(last_group_id, processed):
+            self.stdout.write(f"已處理 {processed} 組 (最後 Group id={last_group_id})")
+
+        result = backfill_features(
+            groups=groups,
+            chunk_size=options['chunk_size'],
+            after_id=options['after_id'],
+            on_progress=report,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"完成：共處理 {result['groups']} 組，寫入 {result['intersections']} 筆特徵（版本 {FEATURE_PIPELINE_VERSION}），"
+            f"最後 Group id={result['last_group_id']}"
+        ))
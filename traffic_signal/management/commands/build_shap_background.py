@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from traffic_signal.explanations import load_background
+from traffic_signal.ml.explain import background_path
+from traffic_signal.ml.predictor import CURRENT_VERSION, available_versions
+from traffic_signal.ml.registry import get_registry
+
+
+class Command(BaseCommand):
+    help = "預先計算指定模型版本的 SHAP k-means 背景摘要並寫入快取"
+
+    def add_arguments(self, parser):
+        parser.add_argument('versions', nargs='*', default=[CURRENT_VERSION], help="模型版本，預設為 current")
+        parser.add_argument('--rebuild', action='store_true', help="忽略既有快取重新計算")
+
+    def handle(self, *args, **options):
+        registry = get_registry()
+        for version in options['versions']:
+            if version not in available_versions():
+                raise CommandError(f"找不到模型版本 {version}")
+
+            predictor = registry.load(version)
+            try:
+                background = load_background(predictor, rebuild=options['rebuild'])
+            except ValueError as e:
+                raise CommandError(str(e))
+
+            self.stdout.write(self.style.SUCCESS(
+                f"模型 {version} 背景摘要 {len(background.data)} 筆，已快取於 "
+                f"{background_path(settings.TRAFFIC_SHAP_CACHE_DIR, predictor)}"
+            ))
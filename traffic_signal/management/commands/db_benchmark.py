@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+
+from traffic_signal.models import Group, Intersection
+
+# 對照組：Django 預設的 SQLite 連線設定（rollback journal、synchronous=FULL、預設快取與 5 秒 busy timeout）
+BASELINE_OPTIONS = {"init_command": "PRAGMA journal_mode=DELETE"}
+
+
+class Command(BaseCommand):
+    help = "比較 SQLite 預設設定與效能設定（settings.SQLITE_OPTIONS）在同時寫入與查詢下的吞吐量"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=10, help="每種設定執行的秒數")
+        parser.add_argument('--writers', type=int, default=2, help="模擬預測 API 寫入的執行緒數")
+        parser.add_argument('--readers', type=int, default=4, help="模擬查詢 API 讀取的執行緒數")
+        parser.add_argument('--query-groups', type=int, default=200, help="每次查詢讀取的最新資料組數")
+
+    def handle(self, *args, **options):
+        source = settings.DATABASES['default']
+        if 'sqlite3' not in source['ENGINE']:
+            raise CommandError("db_benchmark 只適用於 SQLite（MySQL 的持續連線請以 loadtest 指令量測）")
+
+        profiles = [
+            ("預設設定", BASELINE_OPTIONS),
+            ("效能設定", source.get('OPTIONS') or {}),
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for index, (name, db_options) in enumerate(profiles):
+                # 每種設定使用一份資料庫副本，互不影響
+                alias = f'benchmark_{index}'
+                path = os.path.join(tmp_dir, f"{alias}.sqlite3")
+                src = sqlite3.connect(source['NAME'])
+                dst = sqlite3.connect(path)
+                try:
+                    src.backup(dst)
+                finally:
+                    src.close()
+                    dst.close()
+
+                # 暫時加入一個指向副本的連線別名（configure_settings 補齊其餘預設值）
+                connections.settings[alias] = connections.configure_settings({
+                    'default': dict(source),
+                    alias: {**source, 'NAME': path, 'OPTIONS': db_options, 'CONN_MAX_AGE': 0},
+                })[alias]
+                try:
+                    result = self.run_profile(alias, options)
+                finally:
+                    connections[alias].close()
+                    del connections[alias]
+                    del connections.settings[alias]
+
+                self.stdout.write(
+                    f"{name}: 寫入 {result['writes'] / result['elapsed']:.1f} 組/秒，"
+                    f"查詢 {result['reads'] / result['elapsed']:.1f} 次/秒，"
+                    f"查詢延遲 p50 {result['p50']:.1f} ms / p95 {result['p95']:.1f} ms，"
+                    f"寫入延遲 p95 {result['write_p95']:.1f} ms，鎖定錯誤 {result['errors']} 次"
+                )
+
+    def run_profile(self, alias, options):
+        stop = threading.Event()
+        lock = threading.Lock()
+        stats = {"writes": 0, "reads": 0, "errors": 0, "read_latency": [], "write_latency": []}
+        template = list(Intersection.objects.using(alias).order_by('-id').values()[:4])
+        if len(template) < 4:
+            raise CommandError("資料庫中至少需要一組資料作為寫入範本")
+
+        def writer():
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    try:
+                        # 與 TrafficPrediction 相同：一組 Group 加四筆 Intersection 在同一個交易中寫入
+                        with transaction.atomic(using=alias):
+                            group = Group.objects.using(alias).create(east_west_seconds=60, south_north_seconds=60)
+                            for row in template:
+                                fields = {key: value for key, value in row.items() if key not in ('id', 'group_id', 'created_at')}
+                                Intersection.objects.using(alias).create(group=group, **fields)
+                    except OperationalError:
+                        with lock:
+                            stats["errors"] += 1
+                        continue
+                    with lock:
+                        stats["writes"] += 1
+                        stats["write_latency"].append(time.perf_counter() - started)
+            finally:
+                connections[alias].close()
+
+        def reader():
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    try:
+                        # 與查詢 API 相同：最新的資料組連同路口明細
+                        groups = Group.objects.using(alias).order_by('-id')[:options['query_groups']]
+                        list(Intersection.objects.using(alias).filter(
+                            group__in=list(groups.values_list('id', flat=True))
+                        ).values())
+                    except OperationalError:
+                        with lock:
+                            stats["errors"] += 1
+                        continue
+                    with lock:
+                        stats["reads"] += 1
+                        stats["read_latency"].append(time.perf_counter() - started)
+            finally:
+                connections[alias].close()
+
+        threads = [threading.Thread(target=writer) for _ in range(options['writers'])]
+        threads += [threading.Thread(target=reader) for _ in range(options['readers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        def percentile(values, q):
+            return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+        return {
+            "elapsed": elapsed,
+            "writes": stats["writes"],
+            "reads": stats["reads"],
+            "errors": stats["errors"],
+            "p50": percentile(stats["read_latency"], 50),
+            "p95": percentile(stats["read_latency"], 95),
+            "write_p95": percentile(stats["write_latency"], 95),
+        }
@@ -0,0 +1,310 @@
+import csv
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from traffic_signal.junctions import JunctionNotFound, get_layout
+from traffic_signal.models import Intersection, Junction, JunctionDetector
+
+# 每個路口四個偵測器的順序與車道數（default 路口的設定：往東、往西、往南、往北）
+DETECTORS = [('VLRJX20', 5), ('VLRJM60', 3), ('VLRJX00', 4), ('VLRJX00', 4)]
+
+FEED_FIELDS = [
+    'VD_ID', 'DayOfWeek', 'Hour', 'Minute', 'Second', 'IsPeakHour', 'LaneID', 'LaneType',
+    'Speed', 'Occupancy', 'Volume_M', 'Speed_M', 'Volume_S', 'Speed_S', 'Volume_L', 'Speed_L',
+    'Volume_T', 'Speed_T',
+]
+
+
+def is_peak_hour(hour):
+    return 7 <= hour < 9 or 17 <= hour < 19
+
+
+class SyntheticFeed:
+    """
+    模擬偵測器讀數：依時段決定壅塞程度（尖峰高、深夜低），每個路口有各自的偏移量，
+    車速隨壅塞下降、佔有率與各車種流量隨壅塞上升
+
+    junction_detectors: [(路口代碼, [(VD_ID, 車道數), ...]), ...]，模擬的路口依序輪流對應
+    """
+
+    def __init__(self, junctions, junction_detectors=((Junction.DEFAULT_CODE, DETECTORS),), seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.junction_bias = self.rng.normal(0, 0.08, size=junctions)
+        self.junction_detectors = list(junction_detectors)
+
+    def congestion(self, hour):
+        if is_peak_hour(hour):
+            return 0.75
+        if 0 <= hour < 6:
+            return 0.1
+        return 0.35
+
+    def payload(self, junction, when, detectors=DETECTORS):
+        rng = self.rng
+        rows = []
+        for vd_id, lanes in detectors:
+            level = float(np.clip(self.congestion(when.hour) + self.junction_bias[junction] + rng.normal(0, 0.1), 0, 1))
+            speed = max(5, 65 - 55 * level + rng.normal(0, 3))
+            rows.append({
+                'VD_ID': vd_id,
+                'DayOfWeek': when.isoweekday(),
+                'Hour': when.hour,
+                'Minute': when.minute,
+                'Second': when.second,
+                'IsPeakHour': int(is_peak_hour(when.hour)),
+                'LaneID': int(rng.integers(0, lanes)),
+                'LaneType': 1,
+                'Speed': round(speed, 1),
+                'Occupancy': round(float(np.clip(5 + 90 * level + rng.normal(0, 4), 0, 100)), 1),
+                'Volume_M': int(rng.poisson(3 + 35 * level)),
+                'Speed_M': round(max(5, speed + rng.normal(-3, 2)), 1),
+                'Volume_S': int(rng.poisson(5 + 45 * level)),
+                'Speed_S': round(max(5, speed + rng.normal(2, 2)), 1),
+                'Volume_L': int(rng.poisson(1 + 10 * level)),
+                'Speed_L': round(max(5, speed + rng.normal(-8, 2)), 1),
+                'Volume_T': int(rng.poisson(0.3)),
+                'Speed_T': 0,
+            })
+        return rows
+
+
+def load_history(start, limit):
+    """
+    讀取歷史資料，依時間排序回傳 [(timestamp, 路口代碼, 四筆路口資料), ...]
+
+    路口資料依儲存順序（路口設定排列後的東西向、南北向）回傳，送出前需以該路口的 JunctionLayout.restore 還原輸入順序
+    """
+    rows = (
+        Intersection.objects.filter(group__timestamp__gte=start)
+        .order_by('group__timestamp', 'group_id', 'id')
+        .values('group_id', 'group__timestamp', 'group__junction__code', *FEED_FIELDS)
+    )
+    history, current_id, current, timestamp, code = [], None, [], None, None
+    for row in rows.iterator(chunk_size=4000):
+        if row['group_id'] != current_id:
+            if len(current) == 4:
+                history.append((timestamp, code, current))
+                if len(history) >= limit:
+                    break
+            current_id, current, timestamp = row['group_id'], [], row['group__timestamp']
+            # 設定路口前的舊資料沒有路口，屬於 default 路口
+            code = row['group__junction__code'] or Junction.DEFAULT_CODE
+        current.append({field: (int(row[field]) if field == 'IsPeakHour' else row[field]) for field in FEED_FIELDS})
+    else:
+        if len(current) == 4:
+            history.append((timestamp, code, current))
+    return history
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else float('nan')
+
+
+class Command(BaseCommand):
+    help = "模擬 N 個路口 × 4 個偵測器的資料，同時對預測 API 與查詢 API 施加負載，回報各負載階段的吞吐量與延遲"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="測試的伺服器網址")
+        parser.add_argument('--source', choices=['synthetic', 'replay'], default='synthetic',
+                            help="synthetic：模擬讀數；replay：依時間重播資料庫中的歷史資料")
+        parser.add_argument('--junctions', type=int, default=4, help="模擬的路口數（synthetic）")
+        parser.add_argument('--junction-codes', default=Junction.DEFAULT_CODE,
+                            help="預測請求的路口代碼（?junction=），逗號分隔，模擬的路口依序輪流對應，"
+                                 "偵測器讀自資料庫的路口設定（synthetic；replay 依歷史資料所屬的路口送出）")
+        parser.add_argument('--rates', default='5,10,20,40',
+                            help="各階段每秒送出的預測請求數，逗號分隔（synthetic）")
+        parser.add_argument('--speeds', default='10,60,600', help="各階段的重播倍速，逗號分隔（replay）")
+        parser.add_argument('--replay-start', help="重播的起始日期 YYYY-MM-DD（replay，預設為最早的資料）")
+        parser.add_argument('--replay-limit', type=int, default=50000, help="最多載入的歷史資料組數（replay）")
+        parser.add_argument('--stage-seconds', type=float, default=20, help="每個階段的秒數")
+        parser.add_argument('--query-rate', type=float, default=2, help="每秒送出的查詢請求數，0 表示不查詢")
+        parser.add_argument('--query-mode', choices=['since', 'today'], default='since',
+                            help="since：模擬以游標增量同步的儀表板；today：每次查詢當天整日資料")
+        parser.add_argument('--workers', type=int, default=64, help="送出請求的執行緒數")
+        parser.add_argument('--timeout', type=float, default=30, help="單一請求逾時秒數")
+        parser.add_argument('--label', default='', help="此次測試的伺服器設定（例如 gunicorn -w 4），寫入 CSV")
+        parser.add_argument('--csv', help="將各階段結果附加到此 CSV 檔")
+
+    def handle(self, *args, **options):
+        base_url = options['url'].rstrip('/')
+        try:
+            requests.get(f"{base_url}/", timeout=5)
+        except requests.RequestException as e:
+            raise CommandError(f"無法連線到 {base_url}: {e}")
+
+        if options['source'] == 'synthetic':
+            feed = SyntheticFeed(options['junctions'], self.junction_detectors(options['junction_codes'].split(',')))
+            stages = [('rate', float(value)) for value in options['rates'].split(',')]
+            history = None
+        else:
+            start = timezone.make_aware(datetime.strptime(options['replay_start'], "%Y-%m-%d")) \
+                if options['replay_start'] else timezone.make_aware(datetime(1970, 1, 1))
+            history = self.restore_history(load_history(start, options['replay_limit']))
+            if not history:
+                raise CommandError("找不到可重播的歷史資料")
+            self.stdout.write(f"已載入 {len(history)} 組歷史資料（{history[0][0]} ~ {history[-1][0]}）")
+            stages = [('speed', float(value)) for value in options['speeds'].split(',')]
+
+        local = threading.local()
+
+        def session():
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+            return local.session
+
+        cursor = {"value": 0}
+        cursor_lock = threading.Lock()
+        # 各階段的結果分開存放：上一階段逾時未完成的請求不會算進下一階段
+        results = defaultdict(list)
+        results_lock = threading.Lock()
+
+        def send(stage, kind, payload, scheduled):
+            try:
+                if kind == 'predict':
+                    junction, rows = payload
+                    # 每個請求使用新的 Idempotency-Key，重播相同資料時仍會實際推論
+                    response = session().post(
+                        f"{base_url}/api/traffic/predict/", json=rows, timeout=options['timeout'],
+                        params={'junction': junction}, headers={'Idempotency-Key': str(uuid.uuid4())},
+                    )
+                else:
+                    if options['query_mode'] == 'since':
+                        with cursor_lock:
+                            params = {'since': cursor["value"]}
+                    else:
+                        today = timezone.localdate().isoformat()
+                        params = {'start_date': today, 'end_date': today}
+                    response = session().get(f"{base_url}/api/traffic/query/", params=params, timeout=options['timeout'])
+                    if response.status_code == 200 and options['query_mode'] == 'since':
+                        latest = response.json()["query_info"]["cursor"]
+                        with cursor_lock:
+                            cursor["value"] = max(cursor["value"], latest)
+                status_code = response.status_code
+            except requests.RequestException:
+                status_code = 0
+            # 延遲由排定送出的時間起算，伺服器變慢造成的排隊時間也計入
+            latency = time.perf_counter() - scheduled
+            with results_lock:
+                results[stage].append((kind, status_code, latency))
+
+        rows = []
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for stage, (stage_kind, value) in enumerate(stages):
+                events = self.stage_events(stage_kind, value, options, feed if history is None else None, history)
+                started = time.perf_counter()
+                for offset, kind, payload in events:
+                    delay = started + offset - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    executor.submit(send, stage, kind, payload, started + offset)
+
+                # 等待本階段的請求完成（最多等一次逾時時間）
+                deadline = time.perf_counter() + options['timeout']
+                while len(results[stage]) < len(events) and time.perf_counter() < deadline:
+                    time.sleep(0.05)
+                elapsed = max(time.perf_counter() - started, options['stage_seconds'])
+
+                with results_lock:
+                    stage_results = list(results[stage])
+                row = self.summarize(options['label'], stage_kind, value, events, stage_results, elapsed)
+                rows.append(row)
+                self.report(row)
+
+        if options['csv']:
+            exists = os.path.exists(options['csv'])
+            with open(options['csv'], 'a', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                if not exists:
+                    writer.writeheader()
+                writer.writerows(rows)
+            self.stdout.write(self.style.SUCCESS(f"結果已附加到 {options['csv']}"))
+
+    def junction_detectors(self, codes):
+        """各路口代碼的偵測器順序與車道數 [(代碼, [(VD_ID, 車道數), ...]), ...]，車道數沿用 default 路口同位置的設定"""
+        result = []
+        for code in codes:
+            vd_ids = list(
+                JunctionDetector.objects.filter(junction__code=code, junction__is_active=True)
+                .order_by('position').values_list('VD_ID', flat=True)
+            )
+            if len(vd_ids) != len(DETECTORS):
+                raise CommandError(f"路口 {code} 不存在、未啟用或偵測器設定不完整")
+            result.append((code, [(vd_id, lanes) for vd_id, (_, lanes) in zip(vd_ids, DETECTORS)]))
+        return result
+
+    def restore_history(self, history):
+        """將歷史資料還原成各自路口的預測 API 輸入順序 [(timestamp, 路口代碼, 四筆路口資料), ...]"""
+        layouts = {}
+        restored = []
+        for timestamp, code, rows in history:
+            if code not in layouts:
+                try:
+                    layouts[code] = get_layout(code)
+                except (JunctionNotFound, ValueError):
+                    raise CommandError(f"歷史資料的路口 {code} 不存在、未啟用或偵測器設定不完整，無法重播")
+            restored.append((timestamp, code, layouts[code].restore(rows)))
+        return restored
+
+    def stage_events(self, stage_kind, value, options, feed, history):
+        """產生一個階段的請求排程 [(相對秒數, 種類, 資料), ...]"""
+        duration = options['stage_seconds']
+        events = []
+        if stage_kind == 'rate':
+            now = timezone.localtime()
+            for i in range(int(duration * value)):
+                offset = i / value
+                junction = i % options['junctions']
+                code, detectors = feed.junction_detectors[junction % len(feed.junction_detectors)]
+                events.append((offset, 'predict', (code, feed.payload(junction, now + timedelta(seconds=offset), detectors))))
+        else:
+            origin = history[0][0]
+            for timestamp, code, payload in history:
+                offset = (timestamp - origin).total_seconds() / value
+                if offset >= duration:
+                    break
+                events.append((offset, 'predict', (code, payload)))
+
+        if options['query_rate'] > 0:
+            events += [(i / options['query_rate'], 'query', None) for i in range(int(duration * options['query_rate']))]
+        return sorted(events, key=lambda event: event[0])
+
+    def summarize(self, label, stage_kind, value, events, results, elapsed):
+        offered = defaultdict(int)
+        for _, kind, _ in events:
+            offered[kind] += 1
+
+        row = {'label': label, 'stage': f"{stage_kind}={value:g}"}
+        for kind in ('predict', 'query'):
+            latencies = [latency for k, code, latency in results if k == kind and code == 200]
+            codes = [code for k, code, _ in results if k == kind]
+            row.update({
+                f'{kind}_offered_per_s': round(offered[kind] / elapsed, 2),
+                f'{kind}_ok_per_s': round(len(latencies) / elapsed, 2),
+                f'{kind}_p50_ms': round(percentile(latencies, 50), 1),
+                f'{kind}_p95_ms': round(percentile(latencies, 95), 1),
+                f'{kind}_p99_ms': round(percentile(latencies, 99), 1),
+                f'{kind}_503': sum(1 for code in codes if code == 503),
+                f'{kind}_errors': sum(1 for code in codes if code != 200 and code != 503),
+                f'{kind}_unfinished': offered[kind] - len(codes),
+            })
+        return row
+
+    def report(self, row):
+        self.stdout.write(
+            f"[{row['stage']}] "
+            f"預測 {row['predict_ok_per_s']}/{row['predict_offered_per_s']} 次/秒 "
+            f"p50 {row['predict_p50_ms']} / p95 {row['predict_p95_ms']} / p99 {row['predict_p99_ms']} ms "
+            f"503×{row['predict_503']} 錯誤×{row['predict_errors']} 未完成×{row['predict_unfinished']} | "
+            f"查詢 {row['query_ok_per_s']}/{row['query_offered_per_s']} 次/秒 "
+            f"p50 {row['query_p50_ms']} / p95 {row['query_p95_ms']} ms 錯誤×{row['query_errors']}"
+        )
@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from traffic_signal.feature_store import iter_feature_chunks
+from traffic_signal.ml.predictor import CURRENT_VERSION, Predictor, available_versions, quantized_model_path
+from traffic_signal.ml.quantization import QUANTIZED_VARIANTS, compare_seconds, convert_model, run_tflite
+from traffic_signal.models import Group
+
+
+def load_model_inputs(predictor, groups):
+    """讀取 Group 的路口資料並轉成模型輸入矩陣"""
+    matrices = [predictor.scale_features(features) for _, features in iter_feature_chunks(groups)]
+    if not matrices:
+        return np.zeros((0, len(predictor.feature_names)), dtype=np.float32)
+    return np.concatenate(matrices)
+
+
+class Command(BaseCommand):
+    help = "產生 float16 / int8 量化模型，並以最近的歷史資料驗證預測秒數誤差"
+
+    def add_arguments(self, parser):
+        parser.add_argument('version', nargs='?', default=CURRENT_VERSION, help="模型版本，預設為線上版本")
+        parser.add_argument('--variants', nargs='+', choices=QUANTIZED_VARIANTS, default=QUANTIZED_VARIANTS,
+                            help="要產生的量化類型")
+        parser.add_argument('--tolerance', type=int, default=1, help="容許的綠燈秒數誤差（秒）")
+        parser.add_argument('--holdout', type=int, default=2000, help="驗證用的最近 Group 數量")
+        parser.add_argument('--calibration', type=int, default=500, help="int8 校正用的 Group 數量（取驗證資料之前的資料）")
+        parser.add_argument('--force', action='store_true', help="驗證未通過時仍寫出模型檔")
+
+    def handle(self, *args, **options):
+        version = options['version']
+        if version not in available_versions():
+            raise CommandError(f"找不到模型版本 {version}，可用版本: {', '.join(available_versions())}")
+
+        predictor = Predictor(version=version)
+        if not predictor.ready:
+            raise CommandError(f"模型版本 {version} 的模型或 scaler 載入失敗")
+
+        # 驗證資料：最近的 holdout 組；校正資料：驗證資料之前的 calibration 組，兩者不重疊
+        holdout_ids = list(Group.objects.order_by('-id').values_list('id', flat=True)[:options['holdout']])
+        if not holdout_ids:
+            raise CommandError("資料庫中沒有可用於驗證的歷史資料")
+        boundary = min(holdout_ids)
+        X_holdout = load_model_inputs(predictor, Group.objects.filter(id__gte=boundary))
+
+        calibration_ids = list(
+            Group.objects.filter(id__lt=boundary).order_by('-id').values_list('id', flat=True)[:options['calibration']]
+        )
+        if calibration_ids:
+            X_calibration = load_model_inputs(
+                predictor, Group.objects.filter(id__gte=min(calibration_ids), id__lt=boundary)
+            )
+        else:
+            self.stdout.write(self.style.WARNING("歷史資料不足，int8 校正改用驗證資料"))
+            X_calibration = X_holdout
+
+        reference = predictor.model.predict(X_holdout, batch_size=4096, verbose=0)
+        keras_size = os.path.getsize(predictor.model_path)
+        self.stdout.write(f"模型 {version}：驗證 {len(X_holdout)} 筆、校正 {len(X_calibration)} 筆，容許誤差 {options['tolerance']} 秒")
+
+        failed = []
+        for variant in options['variants']:
+            content = convert_model(predictor.model, variant, representative_data=X_calibration)
+            candidate, seconds_per_row = run_tflite(content, X_holdout)
+            result = compare_seconds(reference, candidate, options['tolerance'])
+
+            self.stdout.write(
+                f"[{variant}] 大小 {len(content) / 1024:.1f} KB (原始 {keras_size / 1024:.1f} KB)，"
+                f"最大誤差 {result['max_diff']:.0f} 秒，平均誤差 {result['mean_diff']:.3f} 秒，"
+                f"容許範圍內 {result['within_tolerance']:.2%}，每筆 {seconds_per_row * 1e6:.2f} µs"
+            )
+
+            if not result['passed'] and not options['force']:
+                failed.append(variant)
+                self.stdout.write(self.style.ERROR(f"[{variant}] 超過容許誤差，未寫出模型檔"))
+                continue
+
+            output_path = quantized_model_path(predictor.model_path, variant)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            with open(output_path, 'wb') as f:
+                f.write(content)
+            self.stdout.write(self.style.SUCCESS(f"[{variant}] 已寫出 {output_path}"))
+
+        if failed:
+            raise CommandError(f"以下量化類型未通過驗證: {', '.join(failed)}")
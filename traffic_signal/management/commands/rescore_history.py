@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from traffic_signal.ml.predictor import Predictor, available_versions
+from traffic_signal.rescoring import groups_in_date_range, rescore_history
+
+
+class Command(BaseCommand):
+    help = "以指定模型版本批次重算歷史資料，結果寫入 ModelPrediction（不修改 Group 秒數）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('version', help="模型版本，例如 20251107、2split、current")
+        parser.add_argument('--start-date', help="開始日期 (YYYY-MM-DD)")
+        parser.add_argument('--end-date', help="結束日期 (YYYY-MM-DD)")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="每批讀取的 Group 數量")
+        parser.add_argument('--batch-size', type=int, default=8192, help="模型每次前向傳播的筆數")
+        parser.add_argument('--after-id', type=int, default=0, help="只重算 id 大於此值的 Group")
+
+    def handle(self, *args, **options):
+        version = options['version']
+        versions = available_versions()
+        if version not in versions:
+            raise CommandError(f"找不到模型版本 {version}，可用版本: {', '.join(versions)}")
+
+        try:
+            groups = groups_in_date_range(options['start_date'], options['end_date'])
+        except ValueError:
+            raise CommandError("日期格式錯誤，請使用 YYYY-MM-DD 格式")
+
+        predictor = Predictor(version=version)
+        if not predictor.ready:
+            raise CommandError(f"模型版本 {version} 的模型或 scaler 載入失敗")
+
+        def report(last_group_id, processed):
+            self.stdout.write(f"已重算 {processed} 組 (最後 Group id={last_group_id})")
+
+        result = rescore_history(
+            version,
+            groups=groups,
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+            after_id=options['after_id'],
+            predictor=predictor,
+            on_progress=report,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"完成：模型 {version} 共重算 {result['groups']} 組，最後 Group id={result['last_group_id']}"
+        ))
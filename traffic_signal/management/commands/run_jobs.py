@@ -0,0 +1,68 @@
+import os
+import signal
+import socket
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from traffic_signal.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "啟動背景工作 worker，從 Job 資料表認領並執行重算等長時間工作"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'TRAFFIC_JOB_CONCURRENCY', 1),
+                            help="同時執行的工作數量")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="佇列為空時的輪詢間隔（秒）")
+        parser.add_argument('--once', action='store_true', help="執行完目前佇列中的工作後結束")
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        poll_interval = options['poll_interval']
+        stale_after = getattr(settings, 'TRAFFIC_JOB_STALE_SECONDS', 600)
+        max_attempts = getattr(settings, 'TRAFFIC_JOB_MAX_ATTEMPTS', 3)
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+
+        stopping = threading.Event()
+
+        def stop(signum, frame):
+            self.stdout.write("收到停止訊號，等待執行中的工作完成後結束")
+            stopping.set()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        self.stdout.write(self.style.SUCCESS(f"worker {worker} 啟動，同時執行 {concurrency} 個工作"))
+        running = {}
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job-worker') as executor:
+            while not stopping.is_set():
+                requeued = requeue_stale_jobs(stale_after, max_attempts)
+                if requeued:
+                    self.stdout.write(f"{requeued} 個逾時工作已重新排隊")
+
+                while len(running) < concurrency and not stopping.is_set():
+                    job = claim_next_job(worker)
+                    if job is None:
+                        break
+                    self.stdout.write(f"開始執行 Job {job.id} ({job.kind})")
+                    running[executor.submit(run_job, job)] = job
+
+                if options['once'] and not running:
+                    break
+
+                if running:
+                    done, _ = wait(list(running), timeout=poll_interval, return_when=FIRST_COMPLETED)
+                else:
+                    stopping.wait(poll_interval)
+                    done = set()
+                for future in done:
+                    job = running.pop(future)
+                    job.refresh_from_db()
+                    self.stdout.write(f"Job {job.id} ({job.kind}) 結束: {job.status}")
+
+            if running:
+                wait(list(running))
+        self.stdout.write(self.style.SUCCESS(f"worker {worker} 已結束"))
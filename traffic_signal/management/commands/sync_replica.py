@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from traffic_signal.db_router import replica_alias
+
+
+def file_signature(path):
+    """資料庫檔與 WAL 檔的 (修改時間, 大小)，用來判斷主資料庫自上次同步後是否有寫入"""
+    signature = []
+    for name in (path, f"{path}-wal"):
+        try:
+            stat = os.stat(name)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class Command(BaseCommand):
+    help = (
+        "將 SQLite 主資料庫複製到唯讀副本檔（DB_REPLICA_NAME），可搭配 --interval 持續同步。"
+        "每次同步複製整個資料庫（主資料庫沒有寫入時略過），資料庫很大時請拉長間隔或改用 MySQL 複寫"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help="每隔幾秒同步一次，0 表示只同步一次")
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if alias is None:
+            raise CommandError("尚未設定副本資料庫（DB_REPLICA_NAME）")
+
+        source = settings.DATABASES['default']
+        replica = settings.DATABASES[alias]
+        if 'sqlite3' not in source['ENGINE'] or 'sqlite3' not in replica['ENGINE']:
+            raise CommandError("sync_replica 只適用於 SQLite，MySQL 請使用資料庫本身的複寫")
+        if os.path.realpath(source['NAME']) == os.path.realpath(replica['NAME']):
+            raise CommandError("DB_REPLICA_NAME 與主資料庫是同一個檔案")
+
+        last_signature = None
+        while True:
+            signature = file_signature(source['NAME'])
+            if signature == last_signature:
+                time.sleep(options['interval'])
+                continue
+            last_signature = signature
+
+            started = time.monotonic()
+            # 以 SQLite online backup 一次複製所有頁面，讀取副本的連線只會看到完整的舊版或新版
+            src = sqlite3.connect(source['NAME'])
+            dst = sqlite3.connect(replica['NAME'], timeout=30)
+            try:
+                src.backup(dst)
+            finally:
+                src.close()
+                dst.close()
+            self.stdout.write(f"已同步副本 {replica['NAME']}（{time.monotonic() - started:.2f} 秒）")
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
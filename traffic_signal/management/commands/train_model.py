@@ -0,0 +1,183 @@
+import os
+import shutil
+import tempfile
+
+import joblib
+import numpy as np
+import tensorflow as tf
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from traffic_signal.data_utils import MAX_SECONDS, ROWS_PER_GROUP
+from traffic_signal.feature_store import iter_feature_chunks
+from traffic_signal.ml.predictor import (
+    CURRENT_VERSION, MODEL_HISTORY_DIR, Predictor, available_versions, model_artifact_paths,
+)
+from traffic_signal.ml.training import build_model, fit_scaler, make_dataset
+from traffic_signal.models import Group
+from traffic_signal.rescoring import groups_in_date_range
+
+# 與 Predictor.predict_with_clipping 相同的綠燈秒數範圍
+MIN_SECONDS = 40
+
+
+def iter_training_chunks(groups, chunk_size):
+    """
+    分批讀取路口特徵與訓練目標
+
+    訓練目標為該組已儲存的綠燈秒數：東西向兩筆路口使用 east_west_seconds，南北向兩筆使用 south_north_seconds
+
+    注意：已儲存的秒數是當時線上模型裁剪後各方向的最大輸出，不是實際觀測的結果，
+    以此訓練等於以既有模型的輸出做自我蒸餾，新模型最多只能逼近既有模型；有實際標註資料後應改用實際資料作為訓練目標
+    """
+    try:
+        for group_ids, features in iter_feature_chunks(groups, chunk_size=chunk_size):
+            seconds = {
+                group_id: (east_west, south_north)
+                for group_id, east_west, south_north in Group.objects.filter(
+                    id__gte=group_ids[0], id__lte=group_ids[-1]
+                ).values_list('id', 'east_west_seconds', 'south_north_seconds')
+            }
+            targets = np.array([seconds[group_id] for group_id in group_ids], dtype=float)
+            yield features, np.repeat(targets, ROWS_PER_GROUP // 2, axis=1).reshape(-1)
+    finally:
+        # tf.data 在自己的執行緒呼叫此產生器，結束時關閉該執行緒的資料庫連線
+        connection.close()
+
+
+def next_version():
+    """以今天日期命名，同一天重複訓練時依序加上 _02、_03"""
+    base = timezone.localdate().strftime('%Y%m%d')
+    versions = available_versions()
+    if base not in versions:
+        return base
+    index = 2
+    while f"{base}_{index:02d}" in versions:
+        index += 1
+    return f"{base}_{index:02d}"
+
+
+class Command(BaseCommand):
+    help = (
+        "以資料庫中的路口資料分批串流重新訓練模型，產生新版本的模型與 scaler（TRAFFIC_DATA_DIR/models）。"
+        "訓練目標為資料組已儲存的綠燈秒數，即先前線上模型的輸出而非實際觀測結果（自我蒸餾），"
+        "適合調整特徵或架構後重現既有模型，無法學到比既有模型更好的秒數"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', help="新模型的版本名稱，預設為今天日期（例如 20251107、20251107_02）")
+        parser.add_argument('--base-version', default=CURRENT_VERSION, help="複製架構（與 --warm-start 時的權重）的模型版本")
+        parser.add_argument('--warm-start', action='store_true', help="沿用基礎模型的權重繼續訓練")
+        parser.add_argument('--start-date', help="訓練資料開始日期 (YYYY-MM-DD)")
+        parser.add_argument('--end-date', help="訓練資料結束日期 (YYYY-MM-DD)")
+        parser.add_argument('--validation-groups', type=int, default=2000, help="最近的幾組資料作為驗證資料")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="每批讀取的 Group 數量")
+        parser.add_argument('--batch-size', type=int, default=256, help="訓練批次大小")
+        parser.add_argument('--shuffle-buffer', type=int, default=50000, help="打散訓練資料的緩衝筆數")
+        parser.add_argument('--epochs', type=int, default=20, help="最多訓練幾輪")
+        parser.add_argument('--patience', type=int, default=3, help="驗證誤差連續幾輪未改善即停止")
+        parser.add_argument('--learning-rate', type=float, default=1e-3, help="Adam 學習率")
+        parser.add_argument('--force', action='store_true', help="覆寫已存在的版本")
+
+    def handle(self, *args, **options):
+        version = options['name'] or next_version()
+        if version == CURRENT_VERSION:
+            raise CommandError("不可覆寫線上版本，請訓練新版本後以 activate_model 切換")
+        if version in available_versions() and not options['force']:
+            raise CommandError(f"模型版本 {version} 已存在，請改用其他名稱或加上 --force")
+        if os.path.dirname(model_artifact_paths(version)[0]) == MODEL_HISTORY_DIR:
+            raise CommandError(f"模型版本 {version} 為原始碼內的歷史版本，不可覆寫")
+        if options['base_version'] not in available_versions():
+            raise CommandError(f"找不到模型版本 {options['base_version']}，可用版本: {', '.join(available_versions())}")
+
+        try:
+            groups = groups_in_date_range(options['start_date'], options['end_date'])
+        except ValueError:
+            raise CommandError("日期格式錯誤，請使用 YYYY-MM-DD 格式")
+
+        # 以時間切分：最近的資料作為驗證資料，避免與訓練資料相鄰時段互相洩漏
+        validation_ids = list(groups.order_by('-id').values_list('id', flat=True)[:options['validation_groups']])
+        if validation_ids:
+            boundary = min(validation_ids)
+            train_groups, validation_groups = groups.filter(id__lt=boundary), groups.filter(id__gte=boundary)
+        else:
+            train_groups, validation_groups = groups, None
+
+        chunk_size = options['chunk_size']
+        scaler, rows = fit_scaler(iter_training_chunks(train_groups, chunk_size))
+        if rows == 0:
+            raise CommandError("沒有可用於訓練的資料")
+        self.stdout.write(f"已完成 scaler 統計：訓練資料 {rows} 筆，驗證資料 {len(validation_ids)} 組")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_scaler_path = os.path.join(tmp_dir, 'scaler.pkl')
+            joblib.dump(scaler, tmp_scaler_path)
+
+            # 以基礎模型與新 scaler 建立 Predictor，前處理與線上推論完全相同
+            predictor = Predictor(version=options['base_version'], scaler_path=tmp_scaler_path)
+            if not predictor.ready:
+                raise CommandError(f"模型版本 {options['base_version']} 載入失敗")
+            if predictor.model.input_shape[-1] != len(predictor.feature_names):
+                raise CommandError(f"模型版本 {options['base_version']} 的輸入欄位數與目前的特徵不一致，無法複製架構")
+
+            train_dataset = make_dataset(
+                lambda: iter_training_chunks(train_groups, chunk_size), predictor,
+                batch_size=options['batch_size'], shuffle_buffer=options['shuffle_buffer'], rows=rows,
+            )
+            validation_dataset = None
+            callbacks = []
+            if validation_groups is not None:
+                validation_dataset = make_dataset(
+                    lambda: iter_training_chunks(validation_groups, chunk_size), predictor,
+                    batch_size=options['batch_size'] * 16,
+                )
+                callbacks.append(tf.keras.callbacks.EarlyStopping(
+                    monitor='val_loss', patience=options['patience'], restore_best_weights=True
+                ))
+
+            model = build_model(predictor.model, options['learning_rate'], options['warm_start'])
+            model.fit(
+                train_dataset,
+                validation_data=validation_dataset,
+                epochs=options['epochs'],
+                callbacks=callbacks,
+                verbose=2 if options['verbosity'] > 1 else 0,
+            )
+
+            if validation_groups is not None:
+                self.report(model, predictor, validation_groups, chunk_size, options['base_version'])
+
+            tmp_model_path = os.path.join(tmp_dir, 'trained_model.keras')
+            model.save(tmp_model_path)
+
+            # 先放模型再放 scaler：available_versions 只列出兩者都存在的版本，不會讀到一半的版本
+            model_path, scaler_path = model_artifact_paths(version)
+            os.makedirs(os.path.dirname(model_path), exist_ok=True)
+            shutil.move(tmp_model_path, model_path)
+            shutil.move(tmp_scaler_path, scaler_path)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"已產生模型版本 {version}：{model_path}、{scaler_path}\n"
+            f"可先設為影子模型比較，再以 activate_model {version} 切換為線上模型"
+        ))
+
+    def report(self, model, predictor, validation_groups, chunk_size, base_version):
+        """
+        比較新模型與基礎模型在驗證資料上的綠燈秒數誤差
+
+        新模型以新 scaler（predictor）標準化，基礎模型以自己的 scaler 標準化，兩者都與實際推論時的輸入相同
+        """
+        base_predictor = Predictor(version=base_version)
+        new_errors, base_errors = [], []
+        for features, targets in iter_training_chunks(validation_groups, chunk_size):
+            seconds = np.round(np.clip(
+                model.predict_on_batch(predictor.scale_features(features)).reshape(-1), MIN_SECONDS, MAX_SECONDS
+            ))
+            new_errors.append(np.abs(seconds - targets))
+            base_errors.append(np.abs(base_predictor.predict_features(features) - targets))
+        new_errors, base_errors = np.concatenate(new_errors), np.concatenate(base_errors)
+        self.stdout.write(
+            f"驗證資料 {len(new_errors)} 筆：新模型平均誤差 {new_errors.mean():.2f} 秒（p95 {np.percentile(new_errors, 95):.0f} 秒），"
+            f"{base_version} 平均誤差 {base_errors.mean():.2f} 秒（p95 {np.percentile(base_errors, 95):.0f} 秒）"
+        )
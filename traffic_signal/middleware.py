@@ -0,0 +1,60 @@
+"""
+回應壓縮 - 依 Accept-Encoding 以 zstd（需安裝 zstandard）或 gzip 壓縮 API 回應
+
+與 django.middleware.gzip.GZipMiddleware 相同的規則：過短、已壓縮的回應不處理，
+另外串流回應（SSE 即時推播）一律不壓縮，避免事件被壓縮緩衝延遲送出。
+"""
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+from django.utils.text import compress_string
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - 未安裝時只提供 gzip
+    zstandard = None
+
+re_accepts_gzip = _lazy_re_compile(r"\bgzip\b")
+re_accepts_zstd = _lazy_re_compile(r"\bzstd\b")
+
+MIN_COMPRESS_BYTES = 200
+ZSTD_LEVEL = 3
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.streaming or len(response.content) < MIN_COMPRESS_BYTES:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if zstandard is not None and re_accepts_zstd.search(accept_encoding):
+            encoding = 'zstd'
+            # ZstdCompressor 不可跨執行緒共用，每次建立
+            compressed_content = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(response.content)
+        elif re_accepts_gzip.search(accept_encoding):
+            encoding = 'gzip'
+            compressed_content = compress_string(response.content)
+        else:
+            return response
+
+        # 壓縮後沒有變小就回傳原始內容
+        if len(compressed_content) >= len(response.content):
+            return response
+
+        response.content = compressed_content
+        response.headers['Content-Length'] = str(len(compressed_content))
+        response.headers['Content-Encoding'] = encoding
+
+        # 壓縮後的內容不再與原始表示法逐位元組相同，強 ETag 改為弱 ETag（條件式查詢仍可比對）
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        return response
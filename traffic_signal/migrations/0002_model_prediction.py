@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signal', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelPrediction',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='主鍵ID')),
+                ('model_version', models.CharField(help_text='對應 ml/model_histroy 內的版本名稱，current 為線上版本', max_length=50, verbose_name='模型版本')),
+                ('east_west_seconds', models.IntegerField(verbose_name='東西向最大綠燈秒數')),
+                ('south_north_seconds', models.IntegerField(verbose_name='南北向最大綠燈秒數')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='model_predictions', to='traffic_signal.group', verbose_name='關聯到資料組主表')),
+            ],
+            options={
+                'verbose_name': '模型版本預測表',
+                'verbose_name_plural': '模型版本預測表',
+                'ordering': ['group', 'model_version'],
+                'indexes': [models.Index(fields=['model_version', 'group'], name='model_version_group_idx')],
+                'constraints': [models.UniqueConstraint(fields=('group', 'model_version'), name='unique_group_model_version')],
+            },
+        ),
+    ]
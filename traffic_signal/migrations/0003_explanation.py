@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signal', '0002_model_prediction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Explanation',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='主鍵ID')),
+                ('model_version', models.CharField(max_length=50, verbose_name='模型版本')),
+                ('status', models.CharField(choices=[('pending', '等待計算'), ('running', '計算中'), ('ready', '已完成'), ('failed', '計算失敗')], default='pending', max_length=10, verbose_name='狀態')),
+                ('base_value', models.FloatField(blank=True, help_text='背景資料的模型平均輸出', null=True, verbose_name='基準值')),
+                ('feature_names', models.JSONField(default=list, verbose_name='特徵名稱')),
+                ('predictions', models.JSONField(default=list, help_text='每筆路口裁剪前的預測秒數', verbose_name='模型原始輸出')),
+                ('values', models.JSONField(default=list, help_text='每筆路口一列，順序與 feature_names 相同', verbose_name='SHAP 值')),
+                ('error', models.TextField(blank=True, default='', verbose_name='錯誤訊息')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新時間')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='explanations', to='traffic_signal.group', verbose_name='關聯到資料組主表')),
+            ],
+            options={
+                'verbose_name': 'SHAP 模型解釋表',
+                'verbose_name_plural': 'SHAP 模型解釋表',
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(fields=('group', 'model_version'), name='unique_group_explanation_version')],
+            },
+        ),
+    ]
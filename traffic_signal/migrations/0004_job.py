@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signal', '0003_explanation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='主鍵ID')),
+                ('kind', models.CharField(max_length=50, verbose_name='工作類型')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='工作參數')),
+                ('status', models.CharField(choices=[('queued', '排隊中'), ('running', '執行中'), ('succeeded', '已完成'), ('failed', '失敗')], default='queued', max_length=10, verbose_name='狀態')),
+                ('progress_done', models.BigIntegerField(default=0, verbose_name='已完成數量')),
+                ('progress_total', models.BigIntegerField(blank=True, null=True, verbose_name='總數量')),
+                ('checkpoint', models.JSONField(blank=True, help_text='每批完成後記錄的進度，中斷後從此處續跑', null=True, verbose_name='檢查點')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='執行結果')),
+                ('error', models.TextField(blank=True, default='', verbose_name='錯誤訊息')),
+                ('attempts', models.IntegerField(default=0, verbose_name='執行次數')),
+                ('worker', models.CharField(blank=True, default='', max_length=100, verbose_name='執行的 worker')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='最後回報時間')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='開始時間')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='結束時間')),
+            ],
+            options={
+                'verbose_name': '背景工作表',
+                'verbose_name_plural': '背景工作表',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='job_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 17:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signal', '0004_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='request_key',
+            field=models.CharField(blank=True, db_index=True, help_text='Idempotency-Key 標頭或路口資料內容的雜湊，用於辨識重送的請求', max_length=64, null=True, verbose_name='請求識別鍵'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-19 17:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signal', '0005_group_request_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntersectionFeatures',
+            fields=[
+                ('intersection', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='features', serialize=False, to='traffic_signal.intersection', verbose_name='關聯到路口明細表')),
+                ('pipeline_version', models.PositiveSmallIntegerField(help_text='對應 ml.predictor.FEATURE_PIPELINE_VERSION，版本不符的特徵不會被使用', verbose_name='特徵計算版本')),
+                ('vector', models.BinaryField(help_text='float32 (little-endian) 二進位，欄位順序為 ml.predictor.FEATURE_NAMES', verbose_name='特徵向量')),
+            ],
+            options={
+                'verbose_name': '路口特徵表',
+                'verbose_name_plural': '路口特徵表',
+            },
+        ),
+    ]
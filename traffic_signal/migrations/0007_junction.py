@@ -0,0 +1,54 @@
+# Generated by Django 5.2.3 on 2026-10-19 17:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signal', '0006_intersection_features'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Junction',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='主鍵ID')),
+                ('code', models.SlugField(help_text='預測 API 以 ?junction=<路口代碼> 指定，未指定時為 default', unique=True, verbose_name='路口代碼')),
+                ('name', models.CharField(max_length=100, verbose_name='路口名稱')),
+                ('model_version', models.CharField(blank=True, default='', help_text='對應 ml/model_histroy 內的版本名稱，空白表示使用線上版本（跟隨熱切換）', max_length=50, verbose_name='模型版本')),
+                ('is_active', models.BooleanField(default=True, verbose_name='啟用')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新時間')),
+            ],
+            options={
+                'verbose_name': '路口設定表',
+                'verbose_name_plural': '路口設定表',
+                'ordering': ['code'],
+            },
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='junction',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='groups', to='traffic_signal.junction', verbose_name='路口'),
+        ),
+        migrations.CreateModel(
+            name='JunctionDetector',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='主鍵ID')),
+                ('position', models.PositiveSmallIntegerField(help_text='此偵測器在預測 API 四筆資料中的位置（0-3）', verbose_name='資料順序')),
+                ('VD_ID', models.CharField(max_length=10, verbose_name='路口偵測器ID')),
+                ('model_vd_id', models.CharField(help_text='模型 VD_ID one-hot 使用的偵測器 ID，新路口的偵測器可對應到模型訓練過的偵測器', max_length=10, verbose_name='模型偵測器類型')),
+                ('direction', models.CharField(choices=[('east_west', '東西向'), ('south_north', '南北向')], max_length=11, verbose_name='方向')),
+                ('description', models.CharField(blank=True, default='', max_length=100, verbose_name='路段說明')),
+                ('junction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detectors', to='traffic_signal.junction', verbose_name='關聯到路口設定表')),
+            ],
+            options={
+                'verbose_name': '路口偵測器設定表',
+                'verbose_name_plural': '路口偵測器設定表',
+                'ordering': ['junction', 'position'],
+                'constraints': [models.UniqueConstraint(fields=('junction', 'position'), name='unique_junction_detector_position')],
+            },
+        ),
+    ]
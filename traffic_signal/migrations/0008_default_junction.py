@@ -0,0 +1,44 @@
+from django.db import migrations
+
+# 原本唯一支援的路口（南京東路 × 松江路），資料順序為往東、往西、往南、往北
+DEFAULT_DETECTORS = [
+    (0, 'VLRJX20', 'east_west', '南京東路(往東)'),
+    (1, 'VLRJM60', 'east_west', '南京東路(往西)'),
+    (2, 'VLRJX00', 'south_north', '松江路(往南)'),
+    (3, 'VLRJX00', 'south_north', '松江路(往北)'),
+]
+
+
+def create_default_junction(apps, schema_editor):
+    Junction = apps.get_model('traffic_signal', 'Junction')
+    JunctionDetector = apps.get_model('traffic_signal', 'JunctionDetector')
+    Group = apps.get_model('traffic_signal', 'Group')
+
+    junction, _ = Junction.objects.get_or_create(code='default', defaults={'name': '南京東路 × 松江路'})
+    for position, vd_id, direction, description in DEFAULT_DETECTORS:
+        JunctionDetector.objects.get_or_create(
+            junction=junction,
+            position=position,
+            defaults={'VD_ID': vd_id, 'model_vd_id': vd_id, 'direction': direction, 'description': description},
+        )
+    # 既有的資料組都屬於這個路口
+    Group.objects.filter(junction__isnull=True).update(junction=junction)
+
+
+def remove_default_junction(apps, schema_editor):
+    Junction = apps.get_model('traffic_signal', 'Junction')
+    Group = apps.get_model('traffic_signal', 'Group')
+
+    Group.objects.filter(junction__code='default').update(junction=None)
+    Junction.objects.filter(code='default').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signal', '0007_junction'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_default_junction, remove_default_junction),
+    ]
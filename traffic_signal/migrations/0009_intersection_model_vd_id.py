@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-19 17:30
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_model_vd_id(apps, schema_editor):
+    Intersection = apps.get_model('traffic_signal', 'Intersection')
+    JunctionDetector = apps.get_model('traffic_signal', 'JunctionDetector')
+
+    Intersection.objects.update(model_vd_id=F('VD_ID'))
+    # 依目前的路口設定補上對應到其他偵測器類型的資料（與預測 API 的對應規則相同）
+    for detector in JunctionDetector.objects.exclude(model_vd_id=F('VD_ID')):
+        Intersection.objects.filter(
+            group__junction_id=detector.junction_id, VD_ID=detector.VD_ID
+        ).update(model_vd_id=detector.model_vd_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signal', '0008_default_junction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='intersection',
+            name='model_vd_id',
+            field=models.CharField(default='', help_text='推論時 VD_ID one-hot 使用的偵測器 ID（依寫入時的路口設定），重算特徵時使用', max_length=10, verbose_name='模型偵測器類型'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_model_vd_id, migrations.RunPython.noop),
+    ]
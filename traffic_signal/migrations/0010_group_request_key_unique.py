@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-19 17:27
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def clear_duplicate_keys(apps, schema_editor):
+    """加上唯一限制前，重複的識別鍵只保留最新的一組"""
+    Group = apps.get_model('traffic_signal', 'Group')
+    duplicates = (
+        Group.objects.exclude(request_key__isnull=True)
+        .values('request_key')
+        .annotate(count=Count('id'), latest=Max('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates:
+        Group.objects.filter(request_key=row['request_key']).exclude(id=row['latest']).update(request_key=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signal', '0009_intersection_model_vd_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='request_hash',
+            field=models.CharField(blank=True, help_text='路口資料內容的雜湊，同一個 Idempotency-Key 搭配不同內容時拒絕', max_length=64, null=True, verbose_name='請求內容雜湊'),
+        ),
+        migrations.AlterField(
+            model_name='group',
+            name='request_key',
+            field=models.CharField(blank=True, help_text='Idempotency-Key 標頭或路口資料內容的雜湊，用於辨識重送的請求（超過重送時間窗後清除）', max_length=64, null=True, verbose_name='請求識別鍵'),
+        ),
+        migrations.RunPython(clear_duplicate_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='group',
+            constraint=models.UniqueConstraint(condition=models.Q(('request_key__isnull', False)), fields=('request_key',), name='unique_group_request_key'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-19 17:45
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_updated_at(apps, schema_editor):
+    Group = apps.get_model('traffic_signal', 'Group')
+    Group.objects.update(updated_at=F('timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signal', '0010_group_request_key_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, help_text='資料組或其路口資料最後修改的時間，查詢 API 的 ETag 以此判斷資料是否有修改', verbose_name='更新時間'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-19 21:10
+
+from django.db import migrations, models
+
+
+def create_counter(apps, schema_editor):
+    DataChangeCounter = apps.get_model('traffic_signal', 'DataChangeCounter')
+    DataChangeCounter.objects.get_or_create(name='traffic_data')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signal', '0011_group_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataChangeCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='名稱')),
+                ('value', models.BigIntegerField(default=0, verbose_name='變更次數')),
+            ],
+            options={
+                'verbose_name': '資料變更計數表',
+                'verbose_name_plural': '資料變更計數表',
+            },
+        ),
+        migrations.RunPython(create_counter, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='group',
+            name='updated_at',
+        ),
+    ]
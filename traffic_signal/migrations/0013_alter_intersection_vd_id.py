@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-19 17:48
+
+import traffic_signal.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_signal', '0012_data_change_counter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='intersection',
+            name='VD_ID',
+            field=models.CharField(choices=traffic_signal.models.intersection_vd_id_choices, max_length=10, verbose_name='路口偵測器ID'),
+        ),
+    ]
@@ -0,0 +1,118 @@
+"""
+推論的准入控制 - 限制同時推論數，超出時排隊，排隊已滿或預估無法在期限內完成時立即拒絕
+
+突發流量時若所有執行緒同時進入 TensorFlow，CPU 會被過度分配，每個請求一起變慢；
+限制同時推論數後，排得上的請求維持正常延遲，排不上的快速失敗（由呼叫端回傳 503 或改用降級結果）。
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Overloaded(Exception):
+  """推論忙碌，reason 為 queue_full 或 deadline，retry_after 為建議的重試秒數"""
+
+  def __init__(self, reason, retry_after):
+    super().__init__(reason)
+    self.reason = reason
+    self.retry_after = retry_after
+
+
+class InferenceGate:
+  """
+    同時最多 max_concurrency 個推論，最多 max_queue 個請求排隊等待
+
+    以指數移動平均估計每次推論的耗時，預估排隊加推論會超過 deadline 時不排隊直接拒絕。
+    """
+
+  def __init__(self, max_concurrency = 2, max_queue = 8, deadline = 2.0, initial_estimate = 0.05, alpha = 0.2):
+    self.max_concurrency = max_concurrency
+    self.max_queue = max_queue
+    self.deadline = deadline
+    self.alpha = alpha
+    self.service_time = initial_estimate
+
+    self.active = 0
+    self.waiting = 0
+    self.rejected = 0
+    self._cond = threading.Condition()
+
+  def _retry_after(self):
+    # 依目前排隊數估計清空佇列所需秒數，至少 1 秒
+    return max(1, math.ceil(self.service_time * (self.waiting + 1) / self.max_concurrency))
+
+  def _reject(self, reason):
+    self.rejected += 1
+    return Overloaded(reason, self._retry_after())
+
+  @contextmanager
+  def slot(self, deadline = None):
+    """
+      取得推論名額，離開 with 區塊時釋放並更新耗時估計
+
+      Raises:
+        Overloaded: 排隊已滿，或在 deadline 秒內無法開始並完成推論
+      """
+    deadline = self.deadline if deadline is None else deadline
+    expires = time.monotonic() + deadline
+
+    with self._cond:
+      if self.active >= self.max_concurrency:
+        if self.waiting >= self.max_queue:
+          raise self._reject('queue_full')
+        # 前面的請求每一輪處理 max_concurrency 個，加上自己的推論時間
+        expected = (self.waiting // self.max_concurrency + 1) * self.service_time + self.service_time
+        if expected > deadline:
+          raise self._reject('deadline')
+
+        self.waiting += 1
+        try:
+          while self.active >= self.max_concurrency:
+            remaining = expires - time.monotonic() - self.service_time
+            if remaining <= 0:
+              raise self._reject('deadline')
+            self._cond.wait(remaining)
+        finally:
+          self.waiting -= 1
+      self.active += 1
+
+    started = time.monotonic()
+    try:
+      yield
+    finally:
+      elapsed = time.monotonic() - started
+      with self._cond:
+        self.active -= 1
+        self.service_time += self.alpha * (elapsed - self.service_time)
+        self._cond.notify()
+
+  def status(self):
+    return {
+        "active": self.active,
+        "waiting": self.waiting,
+        "rejected": self.rejected,
+        "max_concurrency": self.max_concurrency,
+        "max_queue": self.max_queue,
+        "deadline": self.deadline,
+        "service_time": self.service_time,
+    }
+
+
+_gate = None
+_gate_lock = threading.Lock()
+
+
+def get_inference_gate():
+  """取得行程內唯一的推論准入控制（設定值見 settings.TRAFFIC_INFERENCE_*）"""
+  global _gate
+  if _gate is None:
+    with _gate_lock:
+      if _gate is None:
+        from django.conf import settings
+        _gate = InferenceGate(
+            max_concurrency = getattr(settings, 'TRAFFIC_INFERENCE_CONCURRENCY', 2),
+            max_queue = getattr(settings, 'TRAFFIC_INFERENCE_QUEUE_SIZE', 8),
+            deadline = getattr(settings, 'TRAFFIC_INFERENCE_DEADLINE_SECONDS', 2.0),
+        )
+  return _gate
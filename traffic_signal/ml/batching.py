@@ -0,0 +1,145 @@
+"""
+推論的微批次處理 - 同時到達、使用同一個模型的預測請求合併成一次前向傳播
+
+多個路口共用同一個模型時，每個請求只有四筆資料，逐一推論時大部分時間花在每次呼叫模型的固定成本；
+合併後一次推論數十筆的耗時與推論四筆相近。
+
+第一個到達的請求成為該批次的 leader：先取得推論准入名額（InferenceGate），再最多等待 max_wait 秒收集
+同時到達的請求（累積到 max_rows 筆即提早開始），取出整批一起推論後分送結果；
+其餘請求只等待自己的結果，不需要額外的背景執行緒。忙碌時 leader 等待名額的期間批次持續累積，負載越高批次越大。
+"""
+import threading
+from contextlib import nullcontext
+
+import numpy as np
+
+
+class _Request:
+  __slots__ = ('features', 'result', 'error', 'done')
+
+  def __init__(self, features):
+    self.features = features
+    self.result = None
+    self.error = None
+    self.done = threading.Event()
+
+
+class _Batch:
+  __slots__ = ('requests', 'rows')
+
+  def __init__(self):
+    self.requests = []
+    self.rows = 0
+
+
+class MicroBatcher:
+  """
+    predict: 特徵矩陣 -> 每列預測值的函式（例如 Predictor.predict_features）
+    max_rows: 每批最多筆數（達到後新的請求開始下一批）
+    max_wait: leader 取得推論名額後最多等待幾秒收集請求，0 表示不等待
+    gate: InferenceGate，None 表示不限制同時推論數
+    """
+
+  def __init__(self, predict, max_rows = 256, max_wait = 0.002, gate = None):
+    self.predict = predict
+    self.max_rows = max_rows
+    self.max_wait = max_wait
+    self.gate = gate
+
+    self.batches = 0
+    self.requests = 0
+    self._open = None
+    self._cond = threading.Condition()
+
+  def submit(self, features):
+    """
+      送出一個請求的特徵矩陣，等待並回傳該請求的預測值
+
+      Raises:
+        Overloaded: 推論忙碌（由 gate 拋出，同一批次的所有請求都會收到）
+      """
+    request = _Request(features)
+    with self._cond:
+      batch = self._open
+      leader = batch is None or batch.rows >= self.max_rows
+      if leader:
+        batch = self._open = _Batch()
+      batch.requests.append(request)
+      batch.rows += len(features)
+      if batch.rows >= self.max_rows:
+        self._cond.notify_all()
+
+    if leader:
+      self._run(batch)
+    else:
+      request.done.wait()
+
+    if request.error is not None:
+      raise request.error
+    return request.result
+
+  def _run(self, batch):
+    try:
+      with (self.gate.slot() if self.gate is not None else nullcontext()):
+        with self._cond:
+          if self.max_wait > 0:
+            self._cond.wait_for(lambda: batch.rows >= self.max_rows, timeout = self.max_wait)
+          # 關閉批次，之後到達的請求進入下一批
+          if self._open is batch:
+            self._open = None
+          requests = list(batch.requests)
+
+        preds = np.asarray(self.predict(np.concatenate([ request.features for request in requests ])))
+        self.batches += 1
+        self.requests += len(requests)
+        start = 0
+        for request in requests:
+          request.result = preds[start:start + len(request.features)]
+          start += len(request.features)
+
+    except Exception as e:
+      with self._cond:
+        if self._open is batch:
+          self._open = None
+        requests = list(batch.requests)
+      for request in requests:
+        request.error = e
+
+    finally:
+      for request in batch.requests:
+        request.done.set()
+
+  def status(self):
+    return {
+        "batches": self.batches,
+        "requests": self.requests,
+        "mean_batch_requests": self.requests / self.batches if self.batches else 0.0,
+        "max_rows": self.max_rows,
+        "max_wait": self.max_wait,
+    }
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(predictor):
+  """
+    取得指定 Predictor 的微批次處理器，同一個模型實例（registry 快取）的所有路口共用
+    （設定值見 settings.TRAFFIC_BATCH_*，推論准入控制見 settings.TRAFFIC_INFERENCE_*）
+    """
+  batcher = _batchers.get(predictor)
+  if batcher is None:
+    with _batchers_lock:
+      batcher = _batchers.get(predictor)
+      if batcher is None:
+        from django.conf import settings
+        from .admission import get_inference_gate
+        batcher = MicroBatcher(
+            predictor.predict_features,
+            max_rows = getattr(settings, 'TRAFFIC_BATCH_MAX_ROWS', 256),
+            max_wait = getattr(settings, 'TRAFFIC_BATCH_MAX_WAIT_MS', 2) / 1000,
+            gate = get_inference_gate(),
+        )
+        _batchers[predictor] = batcher
+  return batcher
@@ -0,0 +1,114 @@
+"""
+SHAP 模型解釋 - KernelExplainer 與各模型版本的 k-means 背景摘要快取
+
+背景樣本（最近的歷史資料經前處理後的模型輸入）以 shap.kmeans 摘要成 k 個加權樣本後，
+將摘要（樣本與權重）存成快取檔，之後同一版本的解釋都直接讀取，不必再查詢資料庫、前處理與重新分群。
+快取以版本名稱與模型、scaler 檔的修改時間與大小識別，重新訓練或覆寫同名版本後自動失效。
+"""
+import hashlib
+import logging
+import os
+import threading
+
+import joblib
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+_backgrounds = {}
+_backgrounds_lock = threading.Lock()
+
+
+def model_fingerprint(predictor):
+  """模型檔與 scaler 檔的修改時間與大小的雜湊（12 字元）"""
+  parts = []
+  for path in (predictor.model_path, predictor.scaler_path):
+    stat = os.stat(path)
+    parts.append(f"{os.path.basename(path)}:{stat.st_mtime_ns}:{stat.st_size}")
+  return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:12]
+
+
+def background_path(cache_dir, predictor):
+  return os.path.join(cache_dir, f'background_{predictor.version}_{model_fingerprint(predictor)}.joblib')
+
+
+def summarize_background(predictor, X, k):
+  """
+    以 shap.kmeans 將背景樣本摘要成 k 個加權樣本
+
+    k 不超過不重複的樣本數：重複的樣本分群後會有空的群，shap.kmeans 會因權重數與樣本數不符而失敗
+    """
+  import shap
+
+  X = np.asarray(X, dtype = np.float32)
+  k = min(int(k), len(np.unique(X, axis = 0)))
+  return shap.kmeans(pd.DataFrame(X, columns = list(predictor.feature_names)), k)
+
+
+def build_background(predictor, X, k, cache_dir = None):
+  """
+    將背景樣本摘要成 k 個加權樣本並存入快取
+
+    predictor: Predictor（取其 version、feature_names 與模型檔）
+    X: 已經過 Predictor 前處理的模型輸入矩陣
+    k: 摘要樣本數，不重複的樣本數不足時自動縮小
+    回傳：shap.kmeans 的摘要，可直接作為 KernelExplainer 的背景資料
+    """
+  summary = summarize_background(predictor, X, k)
+  if cache_dir:
+    os.makedirs(cache_dir, exist_ok = True)
+    path = background_path(cache_dir, predictor)
+    tmp_path = f"{path}.tmp"
+    joblib.dump({ "summary": summary, "feature_names": list(predictor.feature_names) }, tmp_path)
+    os.replace(tmp_path, path)
+
+  with _backgrounds_lock:
+    _backgrounds[(predictor.version, model_fingerprint(predictor))] = summary
+  return summary
+
+
+def get_background(predictor, cache_dir = None):
+  """
+    取得已快取的背景摘要，沒有快取、快取無法讀取或特徵欄位與模型不符時回傳 None
+    """
+  key = (predictor.version, model_fingerprint(predictor))
+  background = _backgrounds.get(key)
+  if background is not None:
+    return background
+
+  if not cache_dir:
+    return None
+  path = background_path(cache_dir, predictor)
+  if not os.path.exists(path):
+    return None
+
+  try:
+    cached = joblib.load(path)
+  except Exception:
+    # 例如 shap 升級後摘要物件的格式改變，重新計算即可
+    logger.warning("無法讀取 SHAP 背景摘要快取 %s，將重新計算", path, exc_info = True)
+    return None
+  if not isinstance(cached, dict) or cached.get('feature_names') != list(predictor.feature_names):
+    return None
+
+  with _backgrounds_lock:
+    _backgrounds[key] = cached['summary']
+  return cached['summary']
+
+
+def explain_rows(predictor, X, background, nsamples = 'auto'):
+  """
+    計算每筆輸入對模型原始輸出（裁剪、四捨五入前）的 SHAP 值
+
+    background: get_background / build_background 回傳的摘要
+    回傳：(base_value, shap_values)，shap_values 形狀為 (筆數, 特徵數)
+    """
+  import shap
+
+  def model_output(samples):
+    return predictor.forward(np.asarray(samples, dtype = np.float32), batch_size = 65536).reshape(-1)
+
+  explainer = shap.KernelExplainer(model_output, background)
+  shap_values = explainer.shap_values(np.asarray(X, dtype = np.float32), nsamples = nsamples, silent = True)
+  return float(np.asarray(explainer.expected_value).reshape(-1)[0]), np.asarray(shap_values).reshape(len(X), -1)
@@ -1,23 +1,209 @@
 import os
+import threading
 import joblib
 import numpy as np
 import pandas as pd
+import tensorflow as tf
 from tensorflow.keras.models import load_model  # type: ignore
 
+ML_DIR = os.path.dirname(__file__)
+MODEL_HISTORY_DIR = os.path.join(ML_DIR, 'model_histroy')
+
+# 線上使用中的模型版本名稱（對應 ml/trained_model.keras 與 ml/scaler.pkl）
+CURRENT_VERSION = 'current'
+
+# 模型變體：keras 為原始 float32 模型，float16 / int8 為 quantize_model 指令產生的 TFLite 量化模型
+KERAS_VARIANT = 'keras'
+MODEL_VARIANTS = (KERAS_VARIANT, 'float16', 'int8')
+
+# 原始輸入欄位（順序與 scaler 訓練時的前 17 欄一致）
+RAW_FEATURE_NAMES = [
+    'Speed',
+    'Occupancy',
+    'Volume_M',
+    'Volume_S',
+    'Volume_L',
+    'Volume_T',
+    'Speed_M',
+    'Speed_S',
+    'Speed_L',
+    'Speed_T',
+    'DayOfWeek',
+    'Hour',
+    'Minute',
+    'Second',
+    'LaneID',
+    'LaneType',
+    'IsPeakHour',
+]
+
+# 5 個複合特徵（A+B+D 方案）
+COMPOSITE_FEATURE_NAMES = [
+    'Flow_Speed_Index',
+    'Volume_Weighted_Speed',
+    'Congestion_Index',
+    'Throughput_Potential',
+    'Flow_Speed_Balance',
+]
+
+# 需要標準化的欄位（順序必須與 scaler 訓練時一致）
+SCALED_FEATURE_NAMES = RAW_FEATURE_NAMES + COMPOSITE_FEATURE_NAMES
+
+# 完整特徵欄位順序（與訓練時一致）
+FEATURE_NAMES = [
+    'Speed',
+    'Occupancy',
+    'Volume_M',
+    'Volume_S',
+    'Volume_L',
+    'Volume_T',
+    'Speed_M',
+    'Speed_S',
+    'Speed_L',
+    'Speed_T',
+    'LaneID',
+    'LaneType',
+    'Hour',
+    'DayOfWeek',
+    'Minute',
+    'Second',
+    'IsPeakHour',
+    'VD_ID_VLRJM60',
+    'VD_ID_VLRJX00',
+    'VD_ID_VLRJX20',
+    'Occ_x_Volume_S',
+    'Occ_x_Volume_L',
+    'Occ_x_Volume_T',
+    'SpeedS_x_VolumeS',
+    'SpeedL_x_VolumeL',
+    'SpeedT_x_VolumeT',
+    'Flow_Speed_Index',
+    'Volume_Weighted_Speed',
+    'Congestion_Index',
+    'Throughput_Potential',
+    'Flow_Speed_Balance'
+]
+FEATURE_INDEX = { name: i for i, name in enumerate(FEATURE_NAMES) }
+
+# 特徵計算版本：build_features 的計算方式或 FEATURE_NAMES 變更時遞增，
+# 路口特徵表（IntersectionFeatures）中舊版本的特徵不會再被使用
+FEATURE_PIPELINE_VERSION = 1
+
+_RAW_COLUMNS = np.array([ FEATURE_INDEX[name] for name in RAW_FEATURE_NAMES ])
+_COMPOSITE_COLUMNS = np.array([ FEATURE_INDEX[name] for name in COMPOSITE_FEATURE_NAMES ])
+_VD_COLUMNS = { name[len('VD_ID_'):]: FEATURE_INDEX[name] for name in FEATURE_NAMES if name.startswith('VD_ID_') }
+
+# 模型訓練過的偵測器 ID（VD_ID one-hot 欄位），路口設定的 model_vd_id 必須是其中之一
+MODEL_VD_IDS = tuple(sorted(_VD_COLUMNS))
+
+# ⭐️ 方案 A：特徵重縮放 - 強化 Volume 和 Speed 的權重，減弱時間特徵
+# 必須與訓練時相同，否則模型行為會不一致
+FEATURE_WEIGHTS = {
+    'Volume_S': 2.5,
+    'Volume_M': 2.5,
+    'Volume_L': 2.5,
+    'Volume_T': 2.5,
+    'Speed': 3.0,
+    'Speed_S': 2.5,
+    'Speed_M': 2.5,
+    'Speed_L': 2.5,
+    'Speed_T': 2.5,
+    'IsPeakHour': 0.1,  # 0.6 -> 0.1
+    'Occupancy': 0.1,  # 略微減弱
+    'Hour': 0.8,
+    'DayOfWeek': 0.9,
+    'Minute': 0.7,
+    'Second': 0.7,
+    'Flow_Speed_Index': 2.0,
+    'Volume_Weighted_Speed': 1.5,
+    'Congestion_Index': 2.0,
+    'Throughput_Potential': 1.5,
+    'Flow_Speed_Balance': 2.0,
+}
+
+
+def data_model_dir():
+  """
+    執行期間產生的模型檔（train_model 訓練的新版本、quantize_model 產生的量化模型）存放目錄，
+    為 settings.TRAFFIC_DATA_DIR/models，不寫入原始碼目錄
+    """
+  from django.conf import settings
+  data_dir = getattr(settings, 'TRAFFIC_DATA_DIR', None) if settings.configured else None
+  return os.path.join(data_dir or os.path.join(os.path.dirname(os.path.dirname(ML_DIR)), 'var'), 'models')
+
+
+def _version_paths(directory, version):
+  return (
+      os.path.join(directory, f'trained_model_{version}.keras'),
+      os.path.join(directory, f'scaler_{version}.pkl'),
+  )
+
+
+def model_artifact_paths(version = None):
+  """
+    取得指定版本的模型與 scaler 路徑。
+    version 為 None 或 'current' 時回傳線上使用中的檔案；
+    其餘版本優先對應原始碼內的 model_histroy/trained_model_<version>.keras 與 scaler_<version>.pkl，
+    不存在時（包含尚未建立的新版本）對應 data_model_dir() 內的同名檔案。
+    """
+  if version in (None, CURRENT_VERSION):
+    return os.path.join(ML_DIR, 'trained_model.keras'), os.path.join(ML_DIR, 'scaler.pkl')
+  paths = _version_paths(MODEL_HISTORY_DIR, version)
+  if os.path.exists(paths[0]):
+    return paths
+  return _version_paths(data_model_dir(), version)
+
+
+def quantized_model_path(model_path, variant):
+  """量化模型存放於 data_model_dir()，檔名沿用原始模型，例如 trained_model.keras -> trained_model_int8.tflite"""
+  name = os.path.splitext(os.path.basename(model_path))[0]
+  return os.path.join(data_model_dir(), f"{name}_{variant}.tflite")
+
+
+def available_versions():
+  """列出所有模型與 scaler 成對存在的版本（model_histroy 與 data_model_dir()）"""
+  versions = [CURRENT_VERSION]
+  for directory in (MODEL_HISTORY_DIR, data_model_dir()):
+    if not os.path.isdir(directory):
+      continue
+    for filename in sorted(os.listdir(directory)):
+      if filename.startswith('trained_model_') and filename.endswith('.keras'):
+        version = filename[len('trained_model_'):-len('.keras')]
+        model_path, scaler_path = model_artifact_paths(version)
+        if version not in versions and os.path.exists(scaler_path):
+          versions.append(version)
+  return versions
+
 
 class Predictor:
 
-  def __init__(self):
-    # 模型和 scaler 路徑
-    self.model_path = os.path.join(os.path.dirname(__file__), 'trained_model.keras')
-    self.scaler_path = os.path.join(os.path.dirname(__file__), 'scaler.pkl')
+  def __init__(self, version = None, model_path = None, scaler_path = None, variant = KERAS_VARIANT):
+    # 模型和 scaler 路徑（未指定時使用線上版本）
+    default_model_path, default_scaler_path = model_artifact_paths(version)
+    self.version = version or CURRENT_VERSION
+    self.model_path = model_path or default_model_path
+    self.scaler_path = scaler_path or default_scaler_path
+    self.variant = variant
+    self.model = None
+    self.tflite_path = None
+
+    # 量化模型：只載入 TFLite 檔，不載入 Keras 模型以節省記憶體
+    if variant != KERAS_VARIANT:
+      tflite_path = quantized_model_path(self.model_path, variant)
+      if os.path.exists(tflite_path):
+        self.tflite_path = tflite_path
+        # TFLite Interpreter 不可跨執行緒共用，每個執行緒各自建立
+        self._interpreters = threading.local()
+      else:
+        print(f"{variant} 量化模型不存在，改用原始模型！")
+        self.variant = KERAS_VARIANT
 
     # 載入模型與 scaler
-    if os.path.exists(self.model_path):
-      self.model = load_model(self.model_path)
-    else:
-      self.model = None
-      print("模型檔案不存在！")
+    if self.variant == KERAS_VARIANT:
+      if os.path.exists(self.model_path):
+        self.model = load_model(self.model_path)
+      else:
+        print("模型檔案不存在！")
 
     if os.path.exists(self.scaler_path):
       self.scaler = joblib.load(self.scaler_path)
@@ -25,135 +211,87 @@ class Predictor:
       self.scaler = None
       print("Scaler 檔案不存在！")
 
-    # 特徵欄位順序（與訓練時一致）
-    self.feature_names = [
-        'Speed',
-        'Occupancy',
-        'Volume_M',
-        'Volume_S',
-        'Volume_L',
-        'Volume_T',
-        'Speed_M',
-        'Speed_S',
-        'Speed_L',
-        'Speed_T',
-        'LaneID',
-        'LaneType',
-        'Hour',
-        'DayOfWeek',
-        'Minute',
-        'Second',
-        'IsPeakHour',
-        'VD_ID_VLRJM60',
-        'VD_ID_VLRJX00',
-        'VD_ID_VLRJX20',
-        'Occ_x_Volume_S',
-        'Occ_x_Volume_L',
-        'Occ_x_Volume_T',
-        'SpeedS_x_VolumeS',
-        'SpeedL_x_VolumeL',
-        'SpeedT_x_VolumeT',
-        'Flow_Speed_Index',
-        'Volume_Weighted_Speed',
-        'Congestion_Index',
-        'Throughput_Potential',
-        'Flow_Speed_Balance'
-    ]
+    # 模型輸入特徵：依 scaler 訓練時的欄位決定，
+    # 舊版本（model_histroy 內的 1101 等）沒有複合特徵，也沒有方案 A 的權重重縮放
+    scaled_names = list(getattr(self.scaler, 'feature_names_in_', SCALED_FEATURE_NAMES))
+    self.uses_composite_features = all(name in scaled_names for name in COMPOSITE_FEATURE_NAMES)
+    self.scaled_feature_names = scaled_names
+    self.feature_names = [ name for name in FEATURE_NAMES if name not in COMPOSITE_FEATURE_NAMES or self.uses_composite_features ]
+
+    # 預先計算各欄位位置，批次計算時不必再經過 pandas
+    input_index = { name: i for i, name in enumerate(self.feature_names) }
+    self._input_columns = np.array([ FEATURE_INDEX[name] for name in self.feature_names ])
+    self._scaled_columns = np.array([ input_index[name] for name in scaled_names ])
+
+    self._weights = np.ones(len(self.feature_names))
+    if self.uses_composite_features:
+      for name, weight in FEATURE_WEIGHTS.items():
+        self._weights[input_index[name]] = weight
+
+    if self.scaler is not None:
+      self._scaler_mean = self.scaler.mean_ if self.scaler.with_mean else 0.0
+      self._scaler_scale = self.scaler.scale_ if self.scaler.with_std else 1.0
+
+  @property
+  def ready(self):
+    """模型（或量化模型）與 scaler 是否都已載入"""
+    return (self.model is not None or self.tflite_path is not None) and self.scaler is not None
+
+  @staticmethod
+  def build_features(raw, vd_ids):
+    """
+      由原始欄位計算未標準化的完整特徵矩陣（含 one-hot 與複合特徵）。
+
+      raw: 形狀 (n, 17) 的數值矩陣，欄位順序為 RAW_FEATURE_NAMES
+      vd_ids: 長度 n 的 VD_ID 序列
+      回傳：形狀 (n, len(FEATURE_NAMES)) 的 float 矩陣，欄位順序為 FEATURE_NAMES
+      """
+    raw = np.asarray(raw, dtype = float)
+    features = np.zeros((raw.shape[0], len(FEATURE_NAMES)))
+    features[:, _RAW_COLUMNS] = raw
+
+    col = { name: raw[:, i] for i, name in enumerate(RAW_FEATURE_NAMES) }
+    total_volume = col['Volume_S'] + col['Volume_M'] + col['Volume_L']
+
+    features[:, _COMPOSITE_COLUMNS] = np.column_stack([
+        (total_volume + 0.1) / (col['Speed'] + 0.1),
+        (col['Volume_S'] * col['Speed_S'] + col['Volume_M'] * col['Speed_M'] + col['Volume_L'] * col['Speed_L']) / (total_volume + 0.1),
+        (col['Occupancy'] * (total_volume + 1) * np.clip(50 - col['Speed'], 0, None)) / 100,
+        col['Volume_T'] * col['Speed_T'] / (100 + 0.1),
+        (total_volume + 0.1) / (col['Speed'] + 1),
+    ])
+
+    # VD_ID one-hot，未知的 VD_ID 全部為 0
+    vd_ids = np.asarray(vd_ids)
+    for vd_id, column in _VD_COLUMNS.items():
+      features[:, column] = (vd_ids == vd_id)
+
+    return features
+
+  def scale_features(self, features):
+    """
+      對 build_features 的結果取出模型需要的欄位，做標準化與權重重縮放，回傳可直接餵給模型的矩陣。
+      """
+    X = np.asarray(features, dtype = float)[:, self._input_columns]
+    X[:, self._scaled_columns] = (X[:, self._scaled_columns] - self._scaler_mean) / self._scaler_scale
+    X *= self._weights
+    # 模型本身以 float32 運算，這裡直接轉型避免多餘的 float64 複製
+    return X.astype(np.float32)
+
+  def preprocess_arrays(self, raw, vd_ids):
+    """原始欄位矩陣 -> 模型輸入矩陣"""
+    return self.scale_features(self.build_features(raw, vd_ids))
 
   def preprocess_and_scale(self, new_data_df: pd.DataFrame):
-    one_hot_vd_cols = [ col for col in self.feature_names if col.startswith('VD_ID_') ]
-    new_data_df_processed = pd.get_dummies(new_data_df, columns = ['VD_ID'], prefix = 'VD_ID')
-
-    # 補齊缺少的 one-hot 欄位
-    for col in one_hot_vd_cols:
-      if col not in new_data_df_processed.columns:
-        new_data_df_processed[col] = 0
-
-    # ⭐️ 新增：計算 5 個複合特徵（A+B+D 方案）
-    # 這些特徵在訓練時已經計算過，預測時也要計算
-    total_volume = new_data_df_processed['Volume_S'] + new_data_df_processed['Volume_M'] + new_data_df_processed['Volume_L']
-
-    new_data_df_processed['Flow_Speed_Index'] = (total_volume + 0.1) / (new_data_df_processed['Speed'] + 0.1)
-    new_data_df_processed['Volume_Weighted_Speed'] = (
-        new_data_df_processed['Volume_S'] * new_data_df_processed['Speed_S'] + new_data_df_processed['Volume_M'] * new_data_df_processed['Speed_M'] +
-        new_data_df_processed['Volume_L'] * new_data_df_processed['Speed_L']
-    ) / (total_volume + 0.1)
-    new_data_df_processed['Congestion_Index'] = (new_data_df_processed['Occupancy'] * (total_volume + 1) * (50 - new_data_df_processed['Speed']).clip(lower = 0)) / 100
-    new_data_df_processed['Throughput_Potential'] = new_data_df_processed['Volume_T'] * new_data_df_processed['Speed_T'] / (100 + 0.1)
-    new_data_df_processed['Flow_Speed_Balance'] = (total_volume + 0.1) / (new_data_df_processed['Speed'] + 1)
-
-    numerical_features_to_scale = [
-        'Speed',
-        'Occupancy',
-        'Volume_M',
-        'Volume_S',
-        'Volume_L',
-        'Volume_T',
-        'Speed_M',
-        'Speed_S',
-        'Speed_L',
-        'Speed_T',
-        'DayOfWeek',
-        'Hour',
-        'Minute',
-        'Second',
-        'LaneID',
-        'LaneType',
-        'IsPeakHour',  # ⭐️ 新增複合特徵到標準化列表
-        'Flow_Speed_Index',
-        'Volume_Weighted_Speed',
-        'Congestion_Index',
-        'Throughput_Potential',
-        'Flow_Speed_Balance',
-    ]
-    existing_numerical = [ f for f in numerical_features_to_scale if f in new_data_df_processed.columns ]
-    new_data_df_processed[existing_numerical] = new_data_df_processed[existing_numerical].astype(float)
-
-    # 標準化
-    scaled_values = self.scaler.transform(new_data_df_processed[existing_numerical])
-    scaled_df = pd.DataFrame(scaled_values, columns = existing_numerical, index = new_data_df_processed.index)
-    new_data_df_processed.loc[:, existing_numerical] = scaled_df
-
-    # ⭐️ 方案 A：特徵重縮放 - 強化 Volume 和 Speed 的權重，減弱時間特徵
-    # 必須與訓練時相同，否則模型行為會不一致
-    new_data_df_processed['Volume_S'] = new_data_df_processed['Volume_S'] * 2.5
-    new_data_df_processed['Volume_M'] = new_data_df_processed['Volume_M'] * 2.5
-    new_data_df_processed['Volume_L'] = new_data_df_processed['Volume_L'] * 2.5
-    new_data_df_processed['Volume_T'] = new_data_df_processed['Volume_T'] * 2.5
-
-    new_data_df_processed['Speed'] = new_data_df_processed['Speed'] * 3.0
-    new_data_df_processed['Speed_S'] = new_data_df_processed['Speed_S'] * 2.5
-    new_data_df_processed['Speed_M'] = new_data_df_processed['Speed_M'] * 2.5
-    new_data_df_processed['Speed_L'] = new_data_df_processed['Speed_L'] * 2.5
-    new_data_df_processed['Speed_T'] = new_data_df_processed['Speed_T'] * 2.5
-
-    new_data_df_processed['IsPeakHour'] = new_data_df_processed['IsPeakHour'] * 0.1  # 0.6 -> 0.1
-    new_data_df_processed['Occupancy'] = new_data_df_processed['Occupancy'] * 0.1  # 略微減弱
-
-    new_data_df_processed['Hour'] = new_data_df_processed['Hour'] * 0.8
-    new_data_df_processed['DayOfWeek'] = new_data_df_processed['DayOfWeek'] * 0.9
-    new_data_df_processed['Minute'] = new_data_df_processed['Minute'] * 0.7
-    new_data_df_processed['Second'] = new_data_df_processed['Second'] * 0.7
-
-    new_data_df_processed['Flow_Speed_Index'] = new_data_df_processed['Flow_Speed_Index'] * 2.0
-    new_data_df_processed['Volume_Weighted_Speed'] = new_data_df_processed['Volume_Weighted_Speed'] * 1.5
-    new_data_df_processed['Congestion_Index'] = new_data_df_processed['Congestion_Index'] * 2.0
-    new_data_df_processed['Throughput_Potential'] = new_data_df_processed['Throughput_Potential'] * 1.5
-    new_data_df_processed['Flow_Speed_Balance'] = new_data_df_processed['Flow_Speed_Balance'] * 2.0
-
-    # 補齊欄位順序並填 0
-    X_new_final = pd.DataFrame(0, index = new_data_df_processed.index, columns = self.feature_names)
-    for col in self.feature_names:
-      if col in new_data_df_processed.columns:
-        X_new_final[col] = new_data_df_processed[col]
-
-    return X_new_final.values.astype(float)
-
-  def predict_with_clipping(self, X_new_data, min_val = 40.0, max_val = 99.0):
+    raw = new_data_df[RAW_FEATURE_NAMES].to_numpy(dtype = float)
+    return self.preprocess_arrays(raw, new_data_df['VD_ID'].to_numpy())
+
+  def predict_with_clipping(self, X_new_data, min_val = 40.0, max_val = 99.0, batch_size = None):
     """
       使用模型進行預測，並將結果裁剪到指定範圍內。
+      batch_size: 大量資料（例如歷史重算）時每次前向傳播的筆數
       """
-    predicted_green_seconds_raw = self.model.predict(X_new_data)
+    predicted_green_seconds_raw = self.forward(X_new_data, batch_size)
 
     # 對每個預測值進行裁剪
     clipped_green_seconds = np.clip(predicted_green_seconds_raw, min_val, max_val)
@@ -163,6 +301,40 @@ class Predictor:
 
     return final_green_seconds
 
+  def forward(self, X, batch_size = None):
+    """模型前向傳播，回傳形狀 (n, 1) 的原始預測值"""
+    if self.tflite_path is None:
+      return self.model.predict(X, batch_size = batch_size, verbose = 0)
+
+    interpreter = getattr(self._interpreters, 'interpreter', None)
+    if interpreter is None:
+      interpreter = tf.lite.Interpreter(model_path = self.tflite_path)
+      interpreter.allocate_tensors()
+      self._interpreters.interpreter = interpreter
+    input_detail = interpreter.get_input_details()[0]
+    output_index = interpreter.get_output_details()[0]['index']
+
+    X = np.asarray(X, dtype = np.float32)
+    batch_size = batch_size or 4096
+    outputs = []
+    for start in range(0, len(X), batch_size):
+      batch = X[start:start + batch_size]
+      if tuple(input_detail['shape']) != batch.shape:
+        interpreter.resize_tensor_input(input_detail['index'], batch.shape)
+        interpreter.allocate_tensors()
+        input_detail = interpreter.get_input_details()[0]
+      interpreter.set_tensor(input_detail['index'], batch)
+      interpreter.invoke()
+      outputs.append(interpreter.get_tensor(output_index).copy())
+    return np.concatenate(outputs) if outputs else np.zeros((0, 1), dtype = np.float32)
+
+  def predict_features(self, features):
+    """
+      由 build_features 的結果（或路口特徵表讀出的矩陣）預測綠燈秒數
+      回傳：np.array 形狀 (n,) 的整數綠燈秒數預測結果
+      """
+    return self.predict_with_clipping(self.scale_features(features)).reshape(-1)
+
   def predict_batch(self, input_list):
     """
         input_list: list of dict, 每筆為一筆特徵資料
@@ -171,4 +343,4 @@ class Predictor:
     df = pd.DataFrame(input_list)
     X_new = self.preprocess_and_scale(df)
     preds = self.predict_with_clipping(X_new)
-    return preds
+    return preds.reshape(-1)
@@ -0,0 +1,76 @@
+"""
+模型量化 - 將 Keras 模型轉為 float16 / int8 的 TFLite 模型，並檢查預測秒數是否維持在容許誤差內
+"""
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from .predictor import MODEL_VARIANTS, KERAS_VARIANT
+
+QUANTIZED_VARIANTS = [ variant for variant in MODEL_VARIANTS if variant != KERAS_VARIANT ]
+
+
+def convert_model(model, variant, representative_data = None):
+  """
+    轉換 Keras 模型為 TFLite 量化模型
+
+    model: 已載入的 Keras 模型
+    variant: 'float16' 或 'int8'
+    representative_data: int8 校正用的模型輸入矩陣（已經過 Predictor 前處理）
+    回傳：TFLite 模型內容 (bytes)
+    """
+  converter = tf.lite.TFLiteConverter.from_keras_model(model)
+  converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+  if variant == 'float16':
+    converter.target_spec.supported_types = [tf.float16]
+  elif variant == 'int8':
+    if representative_data is None or len(representative_data) == 0:
+      raise ValueError("int8 量化需要校正資料")
+    calibration = np.asarray(representative_data, dtype = np.float32)
+
+    def representative_dataset():
+      for row in calibration:
+        yield [row[np.newaxis, :]]
+
+    # 權重與中間運算皆為 int8，輸入輸出維持 float32，Predictor 不需額外轉換
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+  else:
+    raise ValueError(f"不支援的量化類型: {variant}")
+
+  return converter.convert()
+
+
+def run_tflite(model_content, X):
+  """以 TFLite 模型預測整個矩陣，回傳 (預測值, 每筆平均耗時秒數)"""
+  interpreter = tf.lite.Interpreter(model_content = model_content)
+  input_index = interpreter.get_input_details()[0]['index']
+  output_index = interpreter.get_output_details()[0]['index']
+
+  X = np.asarray(X, dtype = np.float32)
+  interpreter.resize_tensor_input(input_index, X.shape)
+  interpreter.allocate_tensors()
+  interpreter.set_tensor(input_index, X)
+  start = time.perf_counter()
+  interpreter.invoke()
+  elapsed = time.perf_counter() - start
+  return interpreter.get_tensor(output_index).reshape(-1), elapsed / max(len(X), 1)
+
+
+def compare_seconds(reference, candidate, tolerance, min_val = 40.0, max_val = 99.0):
+  """
+    比較兩組原始預測值經過與線上相同的裁剪、四捨五入後的秒數差異
+
+    回傳：{"max_diff", "mean_diff", "within_tolerance", "passed"}
+    """
+  ref_seconds = np.round(np.clip(np.asarray(reference).reshape(-1), min_val, max_val))
+  new_seconds = np.round(np.clip(np.asarray(candidate).reshape(-1), min_val, max_val))
+  diff = np.abs(ref_seconds - new_seconds)
+  return {
+      "max_diff": float(diff.max()) if diff.size else 0.0,
+      "mean_diff": float(diff.mean()) if diff.size else 0.0,
+      "within_tolerance": float((diff <= tolerance).mean()) if diff.size else 1.0,
+      "passed": bool(diff.size == 0 or diff.max() <= tolerance),
+  }
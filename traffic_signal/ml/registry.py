@@ -0,0 +1,211 @@
+"""
+模型註冊表 - 管理多個版本的 Predictor，支援不重啟服務的熱切換與影子模型（shadow）推論
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .predictor import CURRENT_VERSION, KERAS_VARIANT, Predictor, available_versions
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+  """
+    以版本名稱快取已載入的 Predictor，並以單一參照替換的方式切換線上模型。
+
+    每次請求只讀取一次 active() 並在整個請求中使用同一個 Predictor，
+    切換時不需上鎖也不會讀到一半載入的模型。
+    多個 worker 之間透過狀態檔同步：切換時寫入狀態檔，其他 worker 定期檢查檔案修改時間後套用。
+    狀態檔存在時優先於建構參數（settings.TRAFFIC_MODEL_VERSION），重啟後維持最後一次切換的版本；
+    要改回以設定值為準，刪除狀態檔或以 activate_model 切換。
+    """
+
+  def __init__(self, version = CURRENT_VERSION, shadow_version = None, state_file = None, refresh_interval = 5.0, shadow_max_pending = 100, variant = KERAS_VARIANT):
+    # 所有版本共用同一種模型變體（keras / float16 / int8）
+    self.variant = variant
+    self.state_file = state_file
+    self.refresh_interval = refresh_interval
+    self.shadow_max_pending = shadow_max_pending
+
+    self._predictors = {}
+    self._load_lock = threading.Lock()
+    self._state_lock = threading.Lock()
+    self._state_mtime = None
+    self._next_refresh = 0.0
+
+    # 影子模型在背景執行緒執行，不佔用請求的回應時間
+    self._shadow_executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = 'shadow-model')
+    self._shadow_pending = threading.BoundedSemaphore(shadow_max_pending)
+
+    state = self._read_state() or {}
+    if state and (state.get('active'), state.get('shadow')) != (version, shadow_version):
+      logger.warning(
+          "模型狀態檔 %s 優先於設定值：線上版本 %s（設定 %s），影子版本 %s（設定 %s）",
+          self.state_file, state.get('active'), version, state.get('shadow'), shadow_version,
+      )
+    # 狀態檔指定的版本已不存在（例如模型檔被刪除）時改用設定值，不讓服務在載入 URLconf 時就失敗
+    try:
+      self._active = self.load(state.get('active', version))
+    except ValueError as e:
+      logger.warning("模型狀態檔 %s 的線上版本無法使用（%s），改用設定值 %s", self.state_file, e, version)
+      self._active = self.load(version)
+    try:
+      state_shadow = state.get('shadow', shadow_version)
+      self._shadow = self.load(state_shadow) if state_shadow else None
+    except ValueError as e:
+      logger.warning("模型狀態檔 %s 的影子版本無法使用（%s），改用設定值 %s", self.state_file, e, shadow_version)
+      self._shadow = self.load(shadow_version) if shadow_version else None
+
+  def load(self, version):
+    """載入（或取得已快取的）指定版本 Predictor"""
+    version = version or CURRENT_VERSION
+    predictor = self._predictors.get(version)
+    if predictor is not None:
+      return predictor
+
+    with self._load_lock:
+      predictor = self._predictors.get(version)
+      if predictor is None:
+        if version not in available_versions():
+          raise ValueError(f"找不到模型版本 {version}")
+        predictor = Predictor(version = version, variant = self.variant)
+        if not predictor.ready:
+          raise ValueError(f"模型版本 {version} 的模型或 scaler 載入失敗")
+        self._predictors[version] = predictor
+    return predictor
+
+  def active(self):
+    """取得目前線上的 Predictor"""
+    self._maybe_refresh()
+    return self._active
+
+  def shadow(self):
+    """取得目前的影子模型 Predictor，未設定時為 None"""
+    self._maybe_refresh()
+    return self._shadow
+
+  def activate(self, version):
+    """先載入完成再切換線上模型，載入失敗時維持原本的模型"""
+    predictor = self.load(version)
+    with self._state_lock:
+      self._active = predictor
+      self._write_state()
+    return predictor
+
+  def set_shadow(self, version):
+    """設定影子模型，version 為 None 時關閉影子推論"""
+    predictor = self.load(version) if version else None
+    with self._state_lock:
+      self._shadow = predictor
+      self._write_state()
+    return predictor
+
+  def submit_shadow(self, fn, *args):
+    """
+      將影子推論丟到背景執行緒。
+      待處理的工作超過 shadow_max_pending 時直接捨棄，避免尖峰時無限堆積。
+      """
+    shadow = self.shadow()
+    if shadow is None:
+      return False
+    if not self._shadow_pending.acquire(blocking = False):
+      logger.warning("影子模型待處理工作已滿，略過本次影子推論")
+      return False
+
+    def run():
+      try:
+        fn(shadow, *args)
+      except Exception:
+        logger.exception("影子模型 %s 推論失敗", shadow.version)
+      finally:
+        self._shadow_pending.release()
+
+    self._shadow_executor.submit(run)
+    return True
+
+  def status(self):
+    return {
+        "active": self._active.version,
+        "shadow": self._shadow.version if self._shadow else None,
+        "variant": self._active.variant,
+        "loaded": sorted(self._predictors),
+        "available": available_versions(),
+    }
+
+  def _read_state(self):
+    if not self.state_file or not os.path.exists(self.state_file):
+      return None
+    try:
+      self._state_mtime = os.path.getmtime(self.state_file)
+      with open(self.state_file, encoding = 'utf-8') as f:
+        state = json.load(f)
+    except (OSError, ValueError):
+      logger.exception("讀取模型狀態檔失敗: %s", self.state_file)
+      return None
+    if not isinstance(state, dict):
+      logger.warning("模型狀態檔格式錯誤（應為 JSON 物件），忽略: %s", self.state_file)
+      return None
+    return state
+
+  def _write_state(self):
+    if not self.state_file:
+      return
+    state = { "active": self._active.version, "shadow": self._shadow.version if self._shadow else None }
+    os.makedirs(os.path.dirname(os.path.abspath(self.state_file)), exist_ok = True)
+    tmp_path = f"{self.state_file}.tmp"
+    with open(tmp_path, 'w', encoding = 'utf-8') as f:
+      json.dump(state, f)
+    os.replace(tmp_path, self.state_file)
+    self._state_mtime = os.path.getmtime(self.state_file)
+
+  def _maybe_refresh(self):
+    """每 refresh_interval 秒最多檢查一次狀態檔，套用其他 worker 的切換"""
+    if not self.state_file:
+      return
+    now = time.monotonic()
+    if now < self._next_refresh:
+      return
+    self._next_refresh = now + self.refresh_interval
+
+    try:
+      mtime = os.path.getmtime(self.state_file)
+    except OSError:
+      return
+    if mtime == self._state_mtime:
+      return
+
+    with self._state_lock:
+      state = self._read_state()
+      if not state:
+        return
+      try:
+        self._active = self.load(state.get('active'))
+        self._shadow = self.load(state['shadow']) if state.get('shadow') else None
+      except ValueError:
+        logger.exception("套用模型狀態檔失敗，維持目前模型")
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+  """取得行程內唯一的模型註冊表（設定值見 settings.TRAFFIC_MODEL_*）"""
+  global _registry
+  if _registry is None:
+    with _registry_lock:
+      if _registry is None:
+        from django.conf import settings
+        _registry = ModelRegistry(
+            version = getattr(settings, 'TRAFFIC_MODEL_VERSION', CURRENT_VERSION),
+            shadow_version = getattr(settings, 'TRAFFIC_SHADOW_MODEL_VERSION', None),
+            state_file = getattr(settings, 'TRAFFIC_MODEL_STATE_FILE', None),
+            refresh_interval = getattr(settings, 'TRAFFIC_MODEL_REFRESH_SECONDS', 5.0),
+            shadow_max_pending = getattr(settings, 'TRAFFIC_SHADOW_MAX_PENDING', 100),
+            variant = getattr(settings, 'TRAFFIC_MODEL_VARIANT', KERAS_VARIANT),
+        )
+  return _registry
@@ -0,0 +1,87 @@
+"""
+模型重新訓練 - 以分批串流的資料訓練，記憶體用量與資料總量無關
+
+資料來源為可重複呼叫的函式，每次呼叫回傳一輪（epoch）的 (features, targets) 批次迭代器，
+features 為標準化前的完整特徵（Predictor.build_features 的結果或路口特徵表），
+標準化與權重重縮放直接使用 Predictor.scale_features，訓練與線上推論的輸入完全一致。
+"""
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from sklearn.preprocessing import StandardScaler
+
+from .predictor import FEATURE_INDEX, FEATURE_NAMES, SCALED_FEATURE_NAMES
+
+_SCALED_COLUMNS = np.array([ FEATURE_INDEX[name] for name in SCALED_FEATURE_NAMES ])
+
+
+def fit_scaler(chunks):
+  """
+    以 partial_fit 逐批累計平均值與變異數，結果與一次 fit 全部資料相同
+
+    chunks: (features, targets) 批次的迭代器
+    回傳：(scaler, 資料筆數)
+    """
+  scaler = StandardScaler()
+  rows = 0
+  for features, _ in chunks:
+    scaled = np.asarray(features, dtype = float)[:, _SCALED_COLUMNS]
+    # 以 DataFrame 傳入，讓 scaler 記錄 feature_names_in_（Predictor 依此判斷是否使用複合特徵）
+    scaler.partial_fit(pd.DataFrame(scaled, columns = SCALED_FEATURE_NAMES))
+    rows += len(scaled)
+  return scaler, rows
+
+
+def make_dataset(chunk_source, predictor, batch_size = 256, shuffle_buffer = 0, rows = None):
+  """
+    建立 tf.data 輸入管線：資料庫批次 -> 平行前處理 -> 逐筆打散 -> 訓練批次 -> 預先讀取
+
+    chunk_source: 無參數函式，每次呼叫回傳一輪的 (features, targets) 迭代器
+    predictor: 已載入新 scaler 的 Predictor，用於計算模型輸入
+    shuffle_buffer: 大於 0 時在此大小的緩衝區內打散資料（訓練用；驗證資料不打散）
+    rows: 已知的資料筆數（例如 fit_scaler 的結果），提供時 Keras 可得知每輪的步數
+    """
+  n_inputs = len(predictor.feature_names)
+
+  def generator():
+    for features, targets in chunk_source():
+      yield np.asarray(features, dtype = np.float32), targets.astype(np.float32)
+
+  def preprocess(features, targets):
+    return predictor.scale_features(features), targets.reshape(-1, 1)
+
+  def preprocess_tensors(features, targets):
+    X, y = tf.numpy_function(preprocess, [features, targets], [tf.float32, tf.float32])
+    X.set_shape([None, n_inputs])
+    y.set_shape([None, 1])
+    return X, y
+
+  dataset = tf.data.Dataset.from_generator(
+      generator,
+      output_signature = (
+          tf.TensorSpec(shape = (None, len(FEATURE_NAMES)), dtype = tf.float32),
+          tf.TensorSpec(shape = (None,), dtype = tf.float32),
+      ),
+  )
+  # 下一批資料庫讀取與前處理在背景進行，與模型訓練重疊
+  dataset = dataset.map(preprocess_tensors, num_parallel_calls = tf.data.AUTOTUNE)
+  dataset = dataset.unbatch()
+  if shuffle_buffer:
+    dataset = dataset.shuffle(shuffle_buffer)
+  dataset = dataset.batch(batch_size)
+  if rows:
+    dataset = dataset.apply(tf.data.experimental.assert_cardinality(-(-rows // batch_size)))
+  return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def build_model(base_model, learning_rate = 1e-3, warm_start = False):
+  """
+    複製線上模型的架構建立新模型
+
+    warm_start: True 時沿用線上模型的權重繼續訓練，否則重新初始化
+    """
+  model = tf.keras.models.clone_model(base_model)
+  if warm_start:
+    model.set_weights(base_model.get_weights())
+  model.compile(optimizer = tf.keras.optimizers.Adam(learning_rate = learning_rate), loss = 'mse', metrics = ['mae'])
+  return model
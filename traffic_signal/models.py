@@ -1,8 +1,170 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F
 import uuid
 from django.utils import timezone
 
-class Group(models.Model):
+
+class DataChangeCounter(models.Model):
+    """
+    資料變更計數表 - 資料組或路口資料被修改、刪除時加一，查詢 API 的 ETag 以此判斷既有資料是否有變動
+
+    新增資料由最大主鍵判斷，不需要計數；只有一列（name='traffic_data'），加一只更新該列，不掃描資料表
+    """
+    TRAFFIC_DATA = 'traffic_data'
+
+    name = models.CharField(max_length=50, primary_key=True, verbose_name='名稱')
+    value = models.BigIntegerField(default=0, verbose_name='變更次數')
+
+    class Meta:
+        verbose_name = '資料變更計數表'
+        verbose_name_plural = '資料變更計數表'
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+    @classmethod
+    def bump(cls, name=TRAFFIC_DATA):
+        """計數加一（在呼叫端的交易內執行，交易回滾時一併回滾）"""
+        if not cls.objects.filter(name=name).update(value=F('value') + 1):
+            cls.objects.get_or_create(name=name, defaults={'value': 1})
+
+    @classmethod
+    def current(cls, name=TRAFFIC_DATA):
+        return cls.objects.filter(name=name).values_list('value', flat=True).first() or 0
+
+
+class ChangeCountedQuerySet(models.QuerySet):
+    """
+    批次修改與刪除（queryset 的 update()、bulk_update()、delete()，包含 admin 的批次刪除）時更新資料變更計數
+
+    單筆的 save()/delete() 由 model 自行處理；raw SQL 與 migration 內的修改不會經過這裡，需自行呼叫 DataChangeCounter.bump()
+    """
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        if rows:
+            DataChangeCounter.bump()
+        return rows
+
+    def delete(self):
+        result = super().delete()
+        if result[0]:
+            DataChangeCounter.bump()
+        return result
+
+
+class ChangeCountedModel(models.Model):
+    """修改既有資料或刪除資料時更新資料變更計數的 model（新增資料不計數）"""
+    objects = ChangeCountedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        updating = not self._state.adding
+        super().save(*args, **kwargs)
+        if updating:
+            DataChangeCounter.bump()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        DataChangeCounter.bump()
+        return result
+
+class Junction(models.Model):
+    """
+    路口設定表 - 每個路口的偵測器、方向分組與使用的模型版本，同一個服務可同時處理多個路口
+    """
+    DEFAULT_CODE = 'default'
+
+    id = models.BigAutoField(primary_key=True, verbose_name='主鍵ID')
+    code = models.SlugField(
+        max_length=50,
+        unique=True,
+        verbose_name='路口代碼',
+        help_text='預測 API 以 ?junction=<路口代碼> 指定，未指定時為 default'
+    )
+    name = models.CharField(max_length=100, verbose_name='路口名稱')
+    model_version = models.CharField(
+        max_length=50,
+        blank=True,
+        default='',
+        verbose_name='模型版本',
+        help_text='對應 ml/model_histroy 內的版本名稱，空白表示使用線上版本（跟隨熱切換）'
+    )
+    is_active = models.BooleanField(default=True, verbose_name='啟用')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新時間')
+
+    class Meta:
+        verbose_name = '路口設定表'
+        verbose_name_plural = '路口設定表'
+        ordering = ['code']
+
+    def __str__(self):
+        return f"{self.name} ({self.code})"
+
+
+class JunctionDetector(models.Model):
+    """
+    路口偵測器設定表 - 預測 API 每筆輸入資料對應的偵測器與方向
+    """
+    DIRECTION_EAST_WEST = 'east_west'
+    DIRECTION_SOUTH_NORTH = 'south_north'
+    DIRECTION_CHOICES = [
+        (DIRECTION_EAST_WEST, '東西向'),
+        (DIRECTION_SOUTH_NORTH, '南北向'),
+    ]
+
+    id = models.BigAutoField(primary_key=True, verbose_name='主鍵ID')
+    junction = models.ForeignKey(
+        Junction,
+        on_delete=models.CASCADE,
+        related_name='detectors',
+        verbose_name='關聯到路口設定表'
+    )
+    position = models.PositiveSmallIntegerField(
+        verbose_name='資料順序',
+        help_text='此偵測器在預測 API 四筆資料中的位置（0-3）'
+    )
+    VD_ID = models.CharField(max_length=10, verbose_name='路口偵測器ID')
+    model_vd_id = models.CharField(
+        max_length=10,
+        verbose_name='模型偵測器類型',
+        help_text='模型 VD_ID one-hot 使用的偵測器 ID，新路口的偵測器可對應到模型訓練過的偵測器'
+    )
+    direction = models.CharField(max_length=11, choices=DIRECTION_CHOICES, verbose_name='方向')
+    description = models.CharField(max_length=100, blank=True, default='', verbose_name='路段說明')
+
+    class Meta:
+        verbose_name = '路口偵測器設定表'
+        verbose_name_plural = '路口偵測器設定表'
+        ordering = ['junction', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['junction', 'position'], name='unique_junction_detector_position'),
+        ]
+
+    def __str__(self):
+        return f"{self.junction.code} #{self.position} {self.VD_ID} ({self.get_direction_display()})"
+
+    def clean(self):
+        from .ml.predictor import MODEL_VD_IDS
+
+        if self.model_vd_id not in MODEL_VD_IDS:
+            raise ValidationError({
+                'model_vd_id': f"模型偵測器類型必須是模型訓練過的偵測器：{', '.join(MODEL_VD_IDS)}"
+            })
+
+
+def intersection_vd_id_choices():
+    """Intersection.VD_ID 的選項：路口設定中的偵測器（見 junctions.detector_labels）"""
+    from .junctions import detector_labels
+
+    return [(vd_id, f"{label} ({vd_id})") for vd_id, label in sorted(detector_labels().items())]
+
+
+class Group(ChangeCountedModel):
     """
     資料組主表 - 存放每次前端送來的四路口資料的整體批次資訊以及預測的東西、南北最大綠燈秒數
     """
@@ -29,26 +191,50 @@ class Group(models.Model):
         verbose_name='南北向最大綠燈秒數',
         help_text='模型預測的南北向最大綠燈秒數'
     )
+    request_key = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        verbose_name='請求識別鍵',
+        help_text='Idempotency-Key 標頭或路口資料內容的雜湊，用於辨識重送的請求（超過重送時間窗後清除）'
+    )
+    request_hash = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        verbose_name='請求內容雜湊',
+        help_text='路口資料內容的雜湊，同一個 Idempotency-Key 搭配不同內容時拒絕'
+    )
+    junction = models.ForeignKey(
+        Junction,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='groups',
+        verbose_name='路口'
+    )
 
     class Meta:
         verbose_name = '資料組主表'
         verbose_name_plural = '資料組主表'
         ordering = ['-timestamp']  # 依時間倒序排列
+        constraints = [
+            # 跨行程（多個 worker）也不會重複寫入同一個請求
+            models.UniqueConstraint(
+                fields=['request_key'],
+                condition=models.Q(request_key__isnull=False),
+                name='unique_group_request_key',
+            ),
+        ]
 
     def __str__(self):
         return f"Group {self.group_id} - {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
 
 
-class Intersection(models.Model):
+class Intersection(ChangeCountedModel):
     """
     路口明細表 - 存放每次傳送過來四個路口的詳細交通特徵資料
     """
-    VD_ID_CHOICES = [
-        ('VLRJX20', '往東 (VLRJX20)'),
-        ('VLRJM60', '往西 (VLRJM60)'),
-        ('VLRJX00', '往南/往北 (VLRJX00)'),
-    ]
-
     WEEKDAY_CHOICES = [
         (1, '星期一'),
         (2, '星期二'),
@@ -70,9 +256,14 @@ class Intersection(models.Model):
     # 基本資訊
     VD_ID = models.CharField(
         max_length=10,
-        choices=VD_ID_CHOICES,
+        choices=intersection_vd_id_choices,
         verbose_name='路口偵測器ID'
     )
+    model_vd_id = models.CharField(
+        max_length=10,
+        verbose_name='模型偵測器類型',
+        help_text='推論時 VD_ID one-hot 使用的偵測器 ID（依寫入時的路口設定），重算特徵時使用'
+    )
     DayOfWeek = models.IntegerField(
         choices=WEEKDAY_CHOICES,
         verbose_name='星期'
@@ -142,15 +333,193 @@ class Intersection(models.Model):
 
     @property
     def get_direction_display(self):
-        """取得方向的中文顯示"""
-        direction_map = {
-            'VLRJX20': '往東',
-            'VLRJM60': '往西',
-            'VLRJX00': '往南/往北'
-        }
-        return direction_map.get(self.VD_ID, self.VD_ID)
+        """取得方向的中文顯示（路口設定的路段說明），未設定的偵測器顯示 VD_ID"""
+        from .junctions import detector_labels
+
+        return detector_labels().get(self.VD_ID, self.VD_ID)
 
     @property
     def total_volume(self):
         """計算總車流量"""
         return self.Volume_M + self.Volume_S + self.Volume_L + self.Volume_T
+
+
+class IntersectionFeatures(models.Model):
+    """
+    路口特徵表 - 寫入路口資料時計算一次的模型輸入特徵（標準化前），批次重算、訓練與 SHAP 直接讀取，不必重新計算
+    """
+    intersection = models.OneToOneField(
+        Intersection,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='features',
+        verbose_name='關聯到路口明細表'
+    )
+    pipeline_version = models.PositiveSmallIntegerField(
+        verbose_name='特徵計算版本',
+        help_text='對應 ml.predictor.FEATURE_PIPELINE_VERSION，版本不符的特徵不會被使用'
+    )
+    vector = models.BinaryField(
+        verbose_name='特徵向量',
+        help_text='float32 (little-endian) 二進位，欄位順序為 ml.predictor.FEATURE_NAMES'
+    )
+
+    class Meta:
+        verbose_name = '路口特徵表'
+        verbose_name_plural = '路口特徵表'
+
+    def __str__(self):
+        return f"Features v{self.pipeline_version} - Intersection {self.intersection_id}"
+
+
+class ModelPrediction(models.Model):
+    """
+    模型版本預測表 - 存放以不同模型版本重新計算歷史資料的預測結果，不會修改 Group 原本的秒數
+    """
+    id = models.BigAutoField(primary_key=True, verbose_name='主鍵ID')
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='model_predictions',
+        verbose_name='關聯到資料組主表'
+    )
+    model_version = models.CharField(
+        max_length=50,
+        verbose_name='模型版本',
+        help_text='對應 ml/model_histroy 內的版本名稱，current 為線上版本'
+    )
+    east_west_seconds = models.IntegerField(verbose_name='東西向最大綠燈秒數')
+    south_north_seconds = models.IntegerField(verbose_name='南北向最大綠燈秒數')
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='建立時間'
+    )
+
+    class Meta:
+        verbose_name = '模型版本預測表'
+        verbose_name_plural = '模型版本預測表'
+        ordering = ['group', 'model_version']
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'model_version'], name='unique_group_model_version'),
+        ]
+        indexes = [
+            models.Index(fields=['model_version', 'group'], name='model_version_group_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model_version} - Group {self.group_id}"
+
+
+class Explanation(models.Model):
+    """
+    SHAP 模型解釋表 - 存放背景計算完成的每筆路口特徵貢獻度，重複查詢時直接讀取
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '等待計算'),
+        (STATUS_RUNNING, '計算中'),
+        (STATUS_READY, '已完成'),
+        (STATUS_FAILED, '計算失敗'),
+    ]
+
+    id = models.BigAutoField(primary_key=True, verbose_name='主鍵ID')
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='explanations',
+        verbose_name='關聯到資料組主表'
+    )
+    model_version = models.CharField(max_length=50, verbose_name='模型版本')
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name='狀態'
+    )
+    base_value = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name='基準值',
+        help_text='背景資料的模型平均輸出'
+    )
+    feature_names = models.JSONField(default=list, verbose_name='特徵名稱')
+    predictions = models.JSONField(
+        default=list,
+        verbose_name='模型原始輸出',
+        help_text='每筆路口裁剪前的預測秒數'
+    )
+    values = models.JSONField(
+        default=list,
+        verbose_name='SHAP 值',
+        help_text='每筆路口一列，順序與 feature_names 相同'
+    )
+    error = models.TextField(blank=True, default='', verbose_name='錯誤訊息')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新時間')
+
+    class Meta:
+        verbose_name = 'SHAP 模型解釋表'
+        verbose_name_plural = 'SHAP 模型解釋表'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'model_version'], name='unique_group_explanation_version'),
+        ]
+
+    def __str__(self):
+        return f"{self.model_version} - Group {self.group_id} ({self.status})"
+
+
+class Job(models.Model):
+    """
+    背景工作表 - 重算、匯出等長時間批次工作由 run_jobs 指令的 worker 執行，不佔用 web worker
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, '排隊中'),
+        (STATUS_RUNNING, '執行中'),
+        (STATUS_SUCCEEDED, '已完成'),
+        (STATUS_FAILED, '失敗'),
+    ]
+
+    id = models.BigAutoField(primary_key=True, verbose_name='主鍵ID')
+    kind = models.CharField(max_length=50, verbose_name='工作類型')
+    params = models.JSONField(default=dict, blank=True, verbose_name='工作參數')
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_QUEUED,
+        verbose_name='狀態'
+    )
+    progress_done = models.BigIntegerField(default=0, verbose_name='已完成數量')
+    progress_total = models.BigIntegerField(null=True, blank=True, verbose_name='總數量')
+    checkpoint = models.JSONField(
+        null=True,
+        blank=True,
+        verbose_name='檢查點',
+        help_text='每批完成後記錄的進度，中斷後從此處續跑'
+    )
+    result = models.JSONField(null=True, blank=True, verbose_name='執行結果')
+    error = models.TextField(blank=True, default='', verbose_name='錯誤訊息')
+    attempts = models.IntegerField(default=0, verbose_name='執行次數')
+    worker = models.CharField(max_length=100, blank=True, default='', verbose_name='執行的 worker')
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name='最後回報時間')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='開始時間')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='結束時間')
+
+    class Meta:
+        verbose_name = '背景工作表'
+        verbose_name_plural = '背景工作表'
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} {self.kind} ({self.status})"
@@ -0,0 +1,164 @@
+"""
+線上請求取樣分析 - 不需重新部署即可查看預測、查詢 API 的時間花在 pandas、TensorFlow、ORM 還是序列化
+
+被選中的請求在處理期間由另一個執行緒每隔固定時間擷取處理該請求的執行緒堆疊（統計式取樣，
+不像 cProfile 需要追蹤每次函式呼叫），結果以 collapsed stacks 格式（"a;b;c 次數"）保存在記憶體，
+可直接交給 flamegraph.pl 或 speedscope 繪製火焰圖。
+
+觸發方式（見 settings.TRAFFIC_PROFILE_*）：
+- 依 TRAFFIC_PROFILE_SAMPLE_RATE 的比例隨機取樣
+- 請求帶有 X-Traffic-Profile 標頭且值等於 TRAFFIC_PROFILE_TOKEN
+兩者皆未設定時 middleware 於啟動時自行移除，不增加任何請求負擔。
+"""
+import hmac
+import itertools
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+
+PROFILE_HEADER = 'X-Traffic-Profile'
+MAX_DEPTH = 128
+
+
+def collapse(frame):
+    """將堆疊轉為 collapsed stack 字串，由最外層到最內層以分號分隔"""
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_qualname}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """每隔 interval 秒擷取一次指定執行緒的堆疊並計數"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='traffic-profile-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+class ProfileStore:
+    """保存最近 keep 筆請求的取樣結果"""
+
+    def __init__(self, keep=50):
+        self._profiles = deque(maxlen=keep)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add(self, **profile):
+        with self._lock:
+            profile['id'] = next(self._ids)
+            self._profiles.append(profile)
+        return profile['id']
+
+    def get(self, profile_id):
+        with self._lock:
+            return next((profile for profile in self._profiles if profile['id'] == profile_id), None)
+
+    def list(self):
+        with self._lock:
+            return list(reversed(self._profiles))
+
+
+def summarize(profile):
+    return {key: value for key, value in profile.items() if key != 'stacks'}
+
+
+def render_collapsed(profiles):
+    """合併多筆取樣結果並輸出 collapsed stacks 文字"""
+    stacks = Counter()
+    for profile in profiles:
+        stacks.update(profile['stacks'])
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def profiling_enabled():
+    return getattr(settings, 'TRAFFIC_PROFILE_SAMPLE_RATE', 0) > 0 or bool(getattr(settings, 'TRAFFIC_PROFILE_TOKEN', ''))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_profile_store():
+    """取得行程內唯一的取樣結果暫存（保留筆數見 settings.TRAFFIC_PROFILE_KEEP）"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ProfileStore(keep=getattr(settings, 'TRAFFIC_PROFILE_KEEP', 50))
+    return _store
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not profiling_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'TRAFFIC_PROFILE_SAMPLE_RATE', 0)
+        self.token = getattr(settings, 'TRAFFIC_PROFILE_TOKEN', '')
+        self.interval = getattr(settings, 'TRAFFIC_PROFILE_INTERVAL_MS', 5) / 1000
+        self.prefixes = tuple(getattr(settings, 'TRAFFIC_PROFILE_PATHS', ['/api/traffic/predict/', '/api/traffic/query/']))
+
+    def trigger(self, request):
+        """回傳取樣原因（header / sampled），不取樣時回傳 None"""
+        if not request.path.startswith(self.prefixes):
+            return None
+        header = request.headers.get(PROFILE_HEADER)
+        if header and self.token and hmac.compare_digest(header.encode(), self.token.encode()):
+            return 'header'
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    def __call__(self, request):
+        reason = self.trigger(request)
+        if reason is None:
+            return self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        created_at = timezone.now()
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = sampler.stop()
+        duration = time.perf_counter() - started
+
+        profile_id = get_profile_store().add(
+            method=request.method,
+            path=request.path,
+            status=response.status_code,
+            reason=reason,
+            created_at=created_at.isoformat(),
+            duration_ms=round(duration * 1000, 1),
+            samples=sum(stacks.values()),
+            stacks=stacks,
+        )
+        response.headers['X-Traffic-Profile-Id'] = str(profile_id)
+        return response
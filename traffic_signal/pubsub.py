@@ -0,0 +1,120 @@
+"""
+預測結果即時推播 - 行程內的 pub/sub 分發
+
+TrafficPrediction 每儲存一筆 Group 就 publish 一次，SSE 與 WebSocket 連線各自訂閱，
+前端不需要再以日期範圍輪詢 TrafficQueryView。
+
+訂閱者只存在於同一個 ASGI 行程內：預測 API 與推播連線必須由同一個行程服務
+（例如單一 uvicorn worker），多個 worker 時每個 worker 只會推播自己收到的預測。
+"""
+import asyncio
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+
+class Subscription:
+    """單一連線的訂閱，事件放在所屬 event loop 的佇列中"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, vd_ids: Optional[Iterable[str]], maxsize: int):
+        self.loop = loop
+        self.vd_ids = frozenset(vd_ids) if vd_ids else None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def filter_event(self, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """依訂閱的 VD_ID 過濾路口明細，沒有符合的路口時回傳 None"""
+        if self.vd_ids is None:
+            return event
+        intersections = [item for item in event["intersections"] if item["VD_ID"] in self.vd_ids]
+        if not intersections:
+            return None
+        return {**event, "intersections": intersections}
+
+    def _put(self, event: Dict[str, Any]):
+        # 在訂閱者的 event loop 中執行；連線太慢佇列滿了就丟掉最舊的事件，不阻塞發布端
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self) -> Dict[str, Any]:
+        return await self.queue.get()
+
+
+class Broker:
+    """執行緒安全的發布/訂閱中心：publish 可在任何執行緒呼叫，事件轉交到各訂閱者的 event loop"""
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, vd_ids: Optional[Iterable[str]] = None) -> Subscription:
+        """在 async 環境中呼叫，vd_ids 為空時訂閱全部路口"""
+        subscription = Subscription(asyncio.get_running_loop(), vd_ids, self.queue_size)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+    def publish(self, event: Dict[str, Any]):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+
+        for subscription in subscriptions:
+            filtered = subscription.filter_event(event)
+            if filtered is None:
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, filtered)
+            except RuntimeError:
+                # 訂閱者的 event loop 已關閉（連線中斷但尚未取消訂閱）
+                self.unsubscribe(subscription)
+
+
+def group_event(group, intersections) -> Dict[str, Any]:
+    """將 Group 與其路口明細整理成推播事件（秒數與各路口摘要）"""
+    return {
+        "id": group.id,
+        "group_id": str(group.group_id),
+        "timestamp": group.timestamp.isoformat(),
+        "east_west_seconds": group.east_west_seconds,
+        "south_north_seconds": group.south_north_seconds,
+        "intersections": [{
+            "VD_ID": intersection.VD_ID,
+            "LaneID": intersection.LaneID,
+            "IsPeakHour": intersection.IsPeakHour,
+            "Speed": intersection.Speed,
+            "Occupancy": intersection.Occupancy,
+            "total_volume": intersection.total_volume,
+        } for intersection in intersections],
+    }
+
+
+def parse_vd_ids(value: Optional[str]):
+    """解析 ?vd_id=VLRJX20,VLRJM60 查詢參數"""
+    if not value:
+        return None
+    return [vd_id.strip() for vd_id in value.split(',') if vd_id.strip()]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker() -> Broker:
+    """取得行程內唯一的發布/訂閱中心（每個連線的佇列長度見 settings.TRAFFIC_STREAM_QUEUE_SIZE）"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                from django.conf import settings
+                _broker = Broker(queue_size=getattr(settings, 'TRAFFIC_STREAM_QUEUE_SIZE', 100))
+    return _broker
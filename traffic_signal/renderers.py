@@ -0,0 +1,57 @@
+"""
+查詢 API 的欄式 (columnar) 回傳格式
+
+預設的 JSON 格式每筆路口都重複所有欄位名稱，資料量大時大部分的位元組都是 key。
+欄式格式改為每個欄位一個陣列，以 ?format=columnar / ?format=msgpack 或 Accept 標頭選用：
+
+  Accept: application/vnd.traffic.columnar+json    欄式 JSON（有安裝 orjson 時使用 orjson 編碼）
+  Accept: application/x-msgpack                     欄式 MessagePack（需安裝 msgpack）
+"""
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 未安裝時改用標準函式庫
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+def to_columns(rows, fields):
+    """將 dict 列轉為 {欄位: 陣列}"""
+    return {field: [row[field] for row in rows] for field in fields}
+
+
+class ColumnarJSONRenderer(BaseRenderer):
+    media_type = 'application/vnd.traffic.columnar+json'
+    format = 'columnar'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is not None:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/x-msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, use_bin_type=True)
+
+
+# 列表中的格式都會回傳欄式資料（msgpack 未安裝時不提供）
+COLUMNAR_RENDERERS = [ColumnarJSONRenderer] + ([MessagePackRenderer] if msgpack is not None else [])
+COLUMNAR_FORMATS = {renderer.format for renderer in COLUMNAR_RENDERERS}
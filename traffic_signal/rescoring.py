@@ -0,0 +1,93 @@
+"""
+歷史資料重新預測（re-scoring）
+
+以指定的模型版本批次重算已儲存的 Group，結果寫入 ModelPrediction，
+不會修改 Group.east_west_seconds / south_north_seconds。
+"""
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from django.utils import timezone
+
+from .data_utils import direction_seconds
+from .feature_store import iter_feature_chunks
+from .ml.predictor import Predictor
+from .models import Group, ModelPrediction
+
+
+def groups_in_date_range(start_date: Optional[str] = None, end_date: Optional[str] = None):
+    """
+    依日期範圍 (YYYY-MM-DD，含當天) 篩選 Group，未提供的一端不限制
+
+    Raises:
+        ValueError: 日期格式錯誤
+    """
+    groups = Group.objects.all()
+    if start_date:
+        start = datetime.strptime(start_date, "%Y-%m-%d")
+        groups = groups.filter(timestamp__gte=timezone.make_aware(start))
+    if end_date:
+        end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+        groups = groups.filter(timestamp__lt=timezone.make_aware(end))
+    return groups
+
+
+def rescore_history(
+    version: str,
+    groups=None,
+    chunk_size: int = 5000,
+    batch_size: int = 8192,
+    after_id: int = 0,
+    predictor: Optional[Predictor] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, int]:
+    """
+    以指定模型版本重算歷史 Group 的綠燈秒數
+
+    Args:
+        version: 模型版本（見 ml.predictor.available_versions）
+        groups: 要重算的 Group 查詢集，預設為全部
+        chunk_size: 每批從資料庫讀取的 Group 數量
+        batch_size: 模型每次前向傳播的筆數
+        after_id: 只重算 id 大於此值的 Group（中斷後續跑用）
+        predictor: 已載入的預測器，未提供時依 version 載入
+        on_progress: 每批完成後呼叫 on_progress(last_group_id, processed_groups)
+
+    Returns:
+        {"groups": 已重算的 Group 數量, "last_group_id": 最後處理的 Group.id}
+    """
+    if predictor is None:
+        predictor = Predictor(version=version)
+    if groups is None:
+        groups = Group.objects.all()
+
+    processed = 0
+    last_group_id = after_id
+
+    for group_ids, features in iter_feature_chunks(groups, chunk_size=chunk_size, after_id=after_id):
+        X = predictor.scale_features(features)
+        preds = predictor.predict_with_clipping(X, batch_size=batch_size)
+        east_west, south_north = direction_seconds(preds)
+
+        ModelPrediction.objects.bulk_create(
+            [
+                ModelPrediction(
+                    group_id=int(group_id),
+                    model_version=version,
+                    east_west_seconds=int(ew),
+                    south_north_seconds=int(sn),
+                )
+                for group_id, ew, sn in zip(group_ids, east_west, south_north)
+            ],
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['group', 'model_version'],
+            update_fields=['east_west_seconds', 'south_north_seconds'],
+        )
+
+        processed += len(group_ids)
+        last_group_id = int(group_ids[-1])
+        if on_progress is not None:
+            on_progress(last_group_id, processed)
+
+    return {"groups": processed, "last_group_id": last_group_id}
@@ -1,3 +1,556 @@
-from django.test import TestCase
+import json
+import os
+import random
+import tempfile
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import junctions, window_store
+from .feature_store import records_to_arrays, unpack_features
+from .jobs import claim_next_job, register, requeue_stale_jobs, run_job, submit_job
+from .management.commands.loadtest import DETECTORS, Command as LoadtestCommand, SyntheticFeed, load_history
+from .management.commands.train_model import iter_training_chunks
+from .ml.admission import InferenceGate, Overloaded
+from .ml.explain import summarize_background
+from .ml.predictor import MODEL_VD_IDS, Predictor
+from .ml.quantization import compare_seconds
+from .ml.registry import ModelRegistry
+from .models import (
+    DataChangeCounter, Group, Intersection, IntersectionFeatures, Job, Junction, JunctionDetector, ModelPrediction,
+)
+from .rescoring import rescore_history
+
+PREDICT_URL = '/api/traffic/predict/'
+QUERY_URL = '/api/traffic/query/?start_date=2000-01-01&end_date=2099-12-31&fields=timestamp,east_west_seconds'
+SWEEP_URL = '/api/traffic/sweep/'
+JOBS_URL = '/api/traffic/jobs/'
+
+
+def make_payload(seed, vd_ids=('VLRJX20', 'VLRJM60', 'VLRJX00', 'VLRJX00')):
+    """產生一組四筆路口資料（相同 seed 產生相同內容）"""
+    rng = random.Random(seed)
+    rows = []
+    for lane_id, vd_id in enumerate(vd_ids):
+        rows.append({
+            'VD_ID': vd_id, 'DayOfWeek': 1, 'Hour': 8, 'Minute': 30, 'Second': rng.randint(0, 59),
+            'IsPeakHour': 1, 'LaneID': lane_id, 'LaneType': 1,
+            'Speed': round(rng.uniform(10, 60), 1), 'Occupancy': round(rng.uniform(0, 50), 1),
+            'Volume_M': rng.randint(0, 30), 'Speed_M': round(rng.uniform(10, 60), 1),
+            'Volume_S': rng.randint(0, 30), 'Speed_S': round(rng.uniform(10, 60), 1),
+            'Volume_L': rng.randint(0, 5), 'Speed_L': round(rng.uniform(10, 60), 1),
+            'Volume_T': 1, 'Speed_T': 20.0,
+        })
+    return rows
+
+
+class TrafficTestCase(TestCase):
+    """共用：API client、預測請求與行程內快取的重設（路口設定快取跨測試會指向已回滾的資料）"""
+
+    def setUp(self):
+        self.client = APIClient()
+        junctions._layouts.clear()
+        junctions._detector_labels = None
+
+    def predict(self, payload, junction=None, **headers):
+        url = f"{PREDICT_URL}?junction={junction}" if junction else PREDICT_URL
+        return self.client.post(url, payload, format='json', **headers)
+
+    def create_junction(self, code='test-junction'):
+        """位置 0、2 為南北向，1、3 為東西向的路口，偵測器 B1-B4 對應到模型的偵測器"""
+        junction = Junction.objects.create(code=code, name='測試路口')
+        for position, vd_id, model_vd_id, direction in [
+            (0, 'B1', 'VLRJX00', JunctionDetector.DIRECTION_SOUTH_NORTH),
+            (1, 'B2', 'VLRJX20', JunctionDetector.DIRECTION_EAST_WEST),
+            (2, 'B3', 'VLRJX00', JunctionDetector.DIRECTION_SOUTH_NORTH),
+            (3, 'B4', 'VLRJM60', JunctionDetector.DIRECTION_EAST_WEST),
+        ]:
+            JunctionDetector.objects.create(
+                junction=junction, position=position, VD_ID=vd_id, model_vd_id=model_vd_id, direction=direction
+            )
+        return junction
+
+
+class RescoringTests(TrafficTestCase):
+    """user-026 批次重算"""
+
+    def test_rescoring_current_model_matches_live_predictions(self):
+        for seed in range(3):
+            self.assertEqual(self.predict(make_payload(seed)).status_code, 200)
+
+        result = rescore_history(Predictor().version, chunk_size=2)
+
+        self.assertEqual(result['groups'], 3)
+        for group in Group.objects.all():
+            prediction = ModelPrediction.objects.get(group=group, model_version=Predictor().version)
+            self.assertEqual(prediction.east_west_seconds, group.east_west_seconds)
+            self.assertEqual(prediction.south_north_seconds, group.south_north_seconds)
+
+
+class ModelRegistryTests(TestCase):
+    """user-027 模型註冊表"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.state_file = os.path.join(self.tmp_dir.name, 'model_state.json')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_state(self, state):
+        with open(self.state_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+
+    def test_missing_version_in_state_file_falls_back_to_settings(self):
+        self.write_state({'active': 'no-such-version', 'shadow': 'gone'})
+
+        with self.assertLogs('traffic_signal.ml.registry', level='WARNING'):
+            registry = ModelRegistry(version='current', shadow_version=None, state_file=self.state_file)
+
+        self.assertEqual(registry.active().version, 'current')
+        self.assertIsNone(registry.shadow())
+
+    def test_non_object_state_file_is_ignored(self):
+        self.write_state(['current'])
+
+        with self.assertLogs('traffic_signal.ml.registry', level='WARNING'):
+            registry = ModelRegistry(version='current', state_file=self.state_file)
+
+        self.assertEqual(registry.active().version, 'current')
+
+    def test_activate_is_picked_up_by_other_workers(self):
+        first = ModelRegistry(state_file=self.state_file, refresh_interval=0)
+        second = ModelRegistry(state_file=self.state_file, refresh_interval=0)
+
+        first.activate('1101')
+        # 同一秒內寫入時修改時間可能不變，強制下一次檢查重新讀取
+        second._state_mtime = None
+
+        self.assertEqual(second.active().version, '1101')
+
+
+class QuantizationTests(TestCase):
+    """user-028 量化模型的誤差檢查"""
+
+    def test_compare_seconds_applies_online_clipping_and_tolerance(self):
+        # 裁剪後 30 與 35 都是 40 秒，只有第二筆相差 2 秒
+        result = compare_seconds([30.0, 60.0, 120.0], [35.0, 62.0, 150.0], tolerance=1)
+
+        self.assertEqual(result['max_diff'], 2.0)
+        self.assertAlmostEqual(result['within_tolerance'], 2 / 3)
+        self.assertFalse(result['passed'])
+        self.assertTrue(compare_seconds([30.0, 60.0], [35.0, 61.0], tolerance=1)['passed'])
+
+
+class SweepTests(TrafficTestCase):
+    """user-029 敏感度分析"""
+
+    @override_settings(TRAFFIC_SWEEP_MAX_SCENARIOS=10)
+    def test_grid_over_scenario_cap_is_rejected(self):
+        response = self.client.post(SWEEP_URL, {
+            'base': make_payload(1), 'grid': {'Speed': [10, 20, 30, 40], 'Occupancy': [1, 2, 3]},
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('上限', response.data['error'])
+
+    def test_huge_axis_is_rejected_before_allocation(self):
+        response = self.client.post(SWEEP_URL, {
+            'base': make_payload(1), 'grid': {'Speed': {'start': 0, 'stop': 1, 'num': 10 ** 30}},
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_grid_and_base_are_rejected(self):
+        cases = [
+            {'base': make_payload(1), 'grid': {'Speed': {'start': 0, 'stop': 10, 'step': 0}}},
+            {'base': make_payload(1), 'grid': {'VD_ID': [1]}},
+            {'base': make_payload(1)[:3], 'grid': {'Speed': [10]}},
+            {'base': [1, 2, 3, 4], 'grid': {'Speed': [10]}},
+        ]
+        for body in cases:
+            with self.subTest(body=body):
+                self.assertEqual(self.client.post(SWEEP_URL, body, format='json').status_code, 400)
+
+    def test_single_scenario_matches_prediction(self):
+        payload = make_payload(2)
+        predicted = self.predict(payload).data
+
+        response = self.client.post(SWEEP_URL, {
+            'base': payload, 'grid': {'Speed': [payload[0]['Speed'], 5.0]}, 'rows': [0],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['shape'], [2])
+        self.assertEqual(response.data['east_west_seconds'][0], predicted['east_west_seconds'])
+        self.assertEqual(response.data['south_north_seconds'][0], predicted['south_north_seconds'])
+
+
+class ExplainTests(TestCase):
+    """user-030 SHAP 背景摘要"""
+
+    def test_kmeans_summary_is_capped_at_unique_rows(self):
+        predictor = Predictor()
+        rows = np.random.default_rng(0).random((3, len(predictor.feature_names)), dtype=np.float32)
+
+        summary = summarize_background(predictor, np.repeat(rows, 10, axis=0), k=20)
+
+        self.assertEqual(len(summary.data), 3)
+        self.assertAlmostEqual(float(np.sum(summary.weights)), 1.0)
+
+
+class JobQueueTests(TrafficTestCase):
+    """user-031 背景工作佇列"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        @register('test_checkpointed')
+        def checkpointed_job(ctx):
+            start = ctx.checkpoint.get('next', 0)
+            for i in range(start, 3):
+                ctx.report(i + 1, total=3, checkpoint={'next': i + 1})
+            return {'resumed_from': start}
+
+    def test_job_lifecycle(self):
+        job = submit_job('test_checkpointed')
+        self.assertEqual(job.status, Job.STATUS_QUEUED)
+
+        claimed = claim_next_job('worker-1')
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertIsNone(claim_next_job('worker-2'))
+        run_job(claimed)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+        self.assertEqual((job.progress_done, job.progress_total), (3, 3))
+        self.assertEqual(job.result, {'resumed_from': 0})
+
+    def test_stale_job_is_requeued_and_resumes_from_checkpoint(self):
+        job = submit_job('test_checkpointed')
+        claim_next_job('worker-1')
+        Job.objects.filter(pk=job.pk).update(checkpoint={'next': 2})
+
+        self.assertEqual(requeue_stale_jobs(stale_after=-1, max_attempts=3), 1)
+        run_job(claim_next_job('worker-2'))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+        self.assertEqual(job.result, {'resumed_from': 2})
+
+    def test_stale_worker_does_not_overwrite_requeued_job(self):
+        job = submit_job('test_checkpointed')
+        stale = claim_next_job('worker-1')
+        requeue_stale_jobs(stale_after=-1, max_attempts=3)
+        claim_next_job('worker-2')
+
+        with self.assertLogs('traffic_signal.jobs', level='WARNING'):
+            run_job(stale)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (Job.STATUS_RUNNING, 'worker-2'))
+
+    def test_submit_rejects_invalid_kind(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_authenticate(admin)
+
+        for kind in [['rescore_history'], {'kind': 1}, None, 'no_such_kind']:
+            with self.subTest(kind=kind):
+                response = self.client.post(JOBS_URL, {'kind': kind}, format='json')
+                self.assertEqual(response.status_code, 400)
+
+
+class StreamTests(TrafficTestCase):
+    """user-032 即時推播"""
+
+    def test_sse_requires_asgi(self):
+        response = self.client.get('/api/traffic/stream/')
+
+        self.assertEqual(response.status_code, 501)
+
+
+class QueryTests(TrafficTestCase):
+    """user-033 ~ 035 查詢 API 的增量同步、條件式查詢、欄位投影與欄式格式"""
+
+    def assert_modified(self, etag):
+        response = self.client.get(QUERY_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_conditional_get_returns_304_until_data_changes(self):
+        self.predict(make_payload(10))
+        etag = self.client.get(QUERY_URL)['ETag']
+        self.assertEqual(self.client.get(QUERY_URL, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        intersection = Intersection.objects.first()
+        intersection.Speed += 1
+        intersection.save()
+        etag = self.assert_modified(etag)
+
+        Group.objects.update(east_west_seconds=60)
+        etag = self.assert_modified(etag)
+
+        self.predict(make_payload(11))
+        etag = self.assert_modified(etag)
+
+        Group.objects.filter(pk=Group.objects.order_by('id').first().pk).delete()
+        etag = self.assert_modified(etag)
+
+        self.assertEqual(self.client.get(QUERY_URL, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_queryset_changes_bump_change_counter(self):
+        self.predict(make_payload(12))
+        before = DataChangeCounter.current()
+
+        Intersection.objects.filter(LaneID=0).update(Speed=1.0)
+        Group.objects.all().delete()
+
+        self.assertEqual(DataChangeCounter.current(), before + 2)
+
+    def test_since_cursor_returns_only_new_groups(self):
+        self.predict(make_payload(13))
+        cursor = self.client.get('/api/traffic/query/?since=0').data['query_info']['cursor']
+        self.predict(make_payload(14))
+
+        response = self.client.get(f'/api/traffic/query/?since={cursor}')
+
+        self.assertEqual(response.data['query_info']['data_points'], 1)
+        self.assertGreater(response.data['query_info']['cursor'], cursor)
+
+    def test_field_projection_and_filters(self):
+        self.predict(make_payload(15))
+
+        groups_only = self.client.get(QUERY_URL).data['data'][0]
+        self.assertEqual(set(groups_only['group']), {'timestamp', 'east_west_seconds'})
+        self.assertNotIn('intersections', groups_only)
+
+        filtered = self.client.get(QUERY_URL + ',VD_ID&vd_id=VLRJX20').data['data'][0]
+        self.assertEqual([row['VD_ID'] for row in filtered['intersections']], ['VLRJX20'])
+
+        self.assertEqual(self.client.get(QUERY_URL + ',no_such_field').status_code, 400)
+
+    def test_columnar_format(self):
+        self.predict(make_payload(16))
+
+        response = self.client.get(QUERY_URL + ',Speed&format=columnar')
+        body = json.loads(response.content)
+
+        self.assertEqual(len(body['groups']['timestamp']), 1)
+        self.assertEqual(body['intersections']['group_index'], [0, 0, 0, 0])
+        self.assertEqual(len(body['intersections']['Speed']), 4)
+
+
+class WindowStoreTests(TrafficTestCase):
+    """user-036 滑動視窗狀態"""
+
+    def setUp(self):
+        super().setUp()
+        window_store._store = None
+
+    def tearDown(self):
+        window_store._store = None
+
+    def test_prediction_is_counted_once_after_rehydrate(self):
+        payload = make_payload(20)
+        self.predict(payload)
+
+        snapshot = window_store.get_window_store().snapshot(payload[0]['VD_ID'], payload[0]['LaneID'])
+        self.assertEqual([window['count'] for window in snapshot['windows'].values()], [1, 1])
+
+        fresh = window_store.WindowStore()
+        window_store.rehydrate(fresh)
+        self.assertEqual(fresh.keys(), window_store.get_window_store().keys())
+
+
+class DatabaseRoutingTests(TestCase):
+    """user-037、038 讀寫分離與連線設定"""
+
+    def test_sync_replica_requires_replica(self):
+        with self.assertRaises(CommandError):
+            call_command('sync_replica')
+
+    def test_connection_profile_applies_to_default_database(self):
+        from django.conf import settings
+
+        self.assertTrue(settings.DATABASES['default']['CONN_HEALTH_CHECKS'])
+        self.assertIn('CONN_MAX_AGE', settings.DATABASES['default'])
+
+
+class IdempotencyTests(TrafficTestCase):
+    """user-039 重送判定"""
+
+    def test_retry_replays_without_new_rows(self):
+        payload = make_payload(30)
+        first = self.predict(payload)
+        retry = self.predict(payload)
+
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['group_id'], first.data['group_id'])
+        self.assertEqual(Group.objects.count(), 1)
+
+    def test_same_key_with_different_body_is_rejected(self):
+        self.predict(make_payload(31), HTTP_IDEMPOTENCY_KEY='retry-1')
+        response = self.predict(make_payload(32), HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Group.objects.count(), 1)
+
+    def test_same_body_for_another_junction_is_not_a_retry(self):
+        self.create_junction()
+        payload = make_payload(33, vd_ids=('B1', 'B2', 'B3', 'B4'))
+
+        self.predict(payload)
+        response = self.predict(payload, junction='test-junction')
+
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Group.objects.count(), 2)
+
+
+class AdmissionTests(TestCase):
+    """user-040 准入控制"""
+
+    def test_full_queue_is_rejected(self):
+        gate = InferenceGate(max_concurrency=1, max_queue=0)
+
+        with gate.slot():
+            with self.assertRaises(Overloaded) as raised:
+                with gate.slot():
+                    pass
+
+        self.assertEqual(raised.exception.reason, 'queue_full')
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+
+
+class LoadtestTests(TrafficTestCase):
+    """user-041 負載測試的資料來源"""
+
+    def test_synthetic_feed_uses_junction_detectors(self):
+        feed = SyntheticFeed(2, seed=1)
+        from django.utils import timezone
+
+        rows = feed.payload(1, timezone.now())
+
+        self.assertEqual([row['VD_ID'] for row in rows], [vd_id for vd_id, _ in DETECTORS])
+
+    def test_replay_restores_input_order_per_junction(self):
+        self.create_junction()
+        payload = make_payload(40, vd_ids=('B1', 'B2', 'B3', 'B4'))
+        self.predict(payload, junction='test-junction')
+
+        from datetime import datetime, timezone as dt_timezone
+        history = LoadtestCommand().restore_history(load_history(datetime(2000, 1, 1, tzinfo=dt_timezone.utc), 10))
+
+        self.assertEqual(len(history), 1)
+        _, code, rows = history[0]
+        self.assertEqual(code, 'test-junction')
+        self.assertEqual([row['VD_ID'] for row in rows], ['B1', 'B2', 'B3', 'B4'])
+        self.assertEqual([row['Speed'] for row in rows], [row['Speed'] for row in payload])
+
+
+@override_settings(TRAFFIC_PROFILE_TOKEN='test-token')
+class ProfilingTests(TrafficTestCase):
+    """user-042 請求取樣分析"""
+
+    def test_profiled_request_returns_profile_id(self):
+        response = self.client.post(
+            PREDICT_URL, make_payload(50), format='json', HTTP_X_TRAFFIC_PROFILE='test-token'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Traffic-Profile-Id', response)
+
+    def test_requests_without_token_are_not_profiled(self):
+        response = self.predict(make_payload(51))
+
+        self.assertNotIn('X-Traffic-Profile-Id', response)
+
+
+class TrainingTests(TrafficTestCase):
+    """user-043 重新訓練"""
+
+    def test_training_targets_are_stored_seconds_per_direction(self):
+        predicted = self.predict(make_payload(60)).data
+
+        (features, targets), = list(iter_training_chunks(Group.objects.all(), chunk_size=10))
+
+        self.assertEqual(features.shape[0], 4)
+        east_west, south_north = predicted['east_west_seconds'], predicted['south_north_seconds']
+        self.assertEqual(targets.tolist(), [east_west, east_west, south_north, south_north])
+
+    def test_shipped_versions_cannot_be_overwritten(self):
+        with self.assertRaises(CommandError):
+            call_command('train_model', name='1101', force=True)
+
+
+class FeatureStoreTests(TrafficTestCase):
+    """user-044 路口特徵表"""
+
+    def test_stored_features_match_recomputed_features(self):
+        payload = make_payload(70)
+        self.predict(payload)
+
+        intersections = list(Intersection.objects.order_by('id'))
+        stored = unpack_features(
+            IntersectionFeatures.objects.filter(intersection__in=intersections)
+            .order_by('intersection_id').values_list('vector', flat=True)
+        )
+        raw, vd_ids = records_to_arrays(payload)
+
+        np.testing.assert_allclose(stored, Predictor.build_features(raw, vd_ids), rtol=1e-6)
+
+
+class JunctionTests(TrafficTestCase):
+    """user-045 多路口設定"""
+
+    def test_prediction_is_stored_in_direction_order_with_model_vd_ids(self):
+        self.create_junction()
+        response = self.predict(make_payload(80, vd_ids=('B1', 'B2', 'B3', 'B4')), junction='test-junction')
+
+        self.assertEqual(response.status_code, 200)
+        rows = list(Intersection.objects.order_by('id').values_list('VD_ID', 'model_vd_id'))
+        self.assertEqual(rows, [('B2', 'VLRJX20'), ('B4', 'VLRJM60'), ('B1', 'VLRJX00'), ('B3', 'VLRJX00')])
+
+    def test_unknown_junction_is_rejected(self):
+        self.assertEqual(self.predict(make_payload(81), junction='no-such-junction').status_code, 400)
+
+    def test_model_vd_id_must_be_a_model_detector(self):
+        detector = JunctionDetector(
+            junction=Junction.objects.get(code=Junction.DEFAULT_CODE), position=0, VD_ID='X1',
+            model_vd_id='UNKNOWN', direction=JunctionDetector.DIRECTION_EAST_WEST,
+        )
+        with self.assertRaises(ValidationError):
+            detector.clean()
+
+        junction = self.create_junction()
+        JunctionDetector.objects.filter(junction=junction, position=0).update(model_vd_id='UNKNOWN')
+        with self.assertRaises(ValueError):
+            junctions.get_layout(junction.code)
+
+    def test_vd_id_labels_follow_junction_config(self):
+        self.create_junction()
+
+        choices = dict(Intersection._meta.get_field('VD_ID').choices)
+
+        self.assertIn('B1', choices)
+        self.assertTrue(set(MODEL_VD_IDS) <= set(choices))
+
+    def test_sweep_uses_junction_layout(self):
+        self.create_junction()
+        payload = make_payload(82, vd_ids=('B1', 'B2', 'B3', 'B4'))
+        predicted = self.predict(payload, junction='test-junction').data
+
+        response = self.client.post(f'{SWEEP_URL}?junction=test-junction', {
+            'base': payload, 'grid': {'Speed': [payload[1]['Speed']]}, 'rows': [1],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['junction'], 'test-junction')
+        self.assertEqual(response.data['east_west_seconds'], [predicted['east_west_seconds']])
+        self.assertEqual(response.data['south_north_seconds'], [predicted['south_north_seconds']])
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views_save, views_query
+from . import views_save, views_query, views_model, views_sweep, views_explain, views_jobs, views_stream, views_rolling, views_profiles
 
 urlpatterns = [
     # 儲存資料 API
@@ -7,4 +7,27 @@ urlpatterns = [
 
     # 統一查詢資料 API - 支援日期範圍搜尋，同時取出 Group + Intersection 資料
     path('query/', views_query.TrafficQueryView.as_view(), name='traffic_query'),
+
+    # 即時推播 API (Server-Sent Events) - 每儲存一筆預測即推送，可依 VD_ID 過濾
+    path('stream/', views_stream.prediction_stream, name='traffic_stream'),
+
+    # 偵測器滑動視窗 API - 各 VD_ID 車道最近 5/15 分鐘的平均值與趨勢（記憶體內計算）
+    path('rolling/', views_rolling.RollingWindowView.as_view(), name='traffic_rolling'),
+
+    # 敏感度分析 API - 參數格網批次預測綠燈秒數
+    path('sweep/', views_sweep.TrafficSweepView.as_view(), name='traffic_sweep'),
+
+    # SHAP 模型解釋 API - 背景計算，完成後回傳各特徵貢獻度
+    path('explain/<uuid:group_id>/', views_explain.TrafficExplanationView.as_view(), name='traffic_explanation'),
+
+    # 背景工作 API - 送出重算等長時間工作並查詢進度
+    path('jobs/', views_jobs.JobListView.as_view(), name='job_list'),
+    path('jobs/<int:job_id>/', views_jobs.JobDetailView.as_view(), name='job_detail'),
+
+    # 線上請求取樣分析 API - 最近被取樣請求的 collapsed stacks（火焰圖）
+    path('profiles/', views_profiles.ProfileListView.as_view(), name='profile_list'),
+    path('profiles/<int:profile_id>/', views_profiles.ProfileDetailView.as_view(), name='profile_detail'),
+
+    # 模型版本管理 API - 熱切換線上模型與影子模型
+    path('models/', views_model.ModelRegistryView.as_view(), name='model_registry'),
 ]
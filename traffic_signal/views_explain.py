@@ -0,0 +1,84 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from .explanations import request_explanation
+from .ml.predictor import available_versions
+from .ml.registry import get_registry
+from .models import Explanation, Group
+
+
+class TrafficExplanationView(APIView):
+    """SHAP 模型解釋 API - 背景計算每筆路口的特徵貢獻度，完成後重複查詢直接讀取"""
+
+    def get(self, request, group_id):
+        """
+        GET /api/traffic/explain/<group_id>/?version=20251107
+
+        查詢參數：
+        - version: 模型版本 [選填，預設為目前線上版本]
+
+        解釋排入背景工作佇列（explain_group 工作）由 run_jobs 指令的 worker 計算，計算中回傳 202：
+        {
+          "group_id": "123e4567-e89b-12d3-a456-426614174000",
+          "model_version": "current",
+          "status": "pending"
+        }
+
+        完成回傳 200：
+        {
+          "group_id": "123e4567-e89b-12d3-a456-426614174000",
+          "model_version": "current",
+          "status": "ready",
+          "base_value": 71.3,
+          "intersections": [
+            {
+              "VD_ID": "VLRJX20",
+              "prediction": 65.2,
+              "attributions": {"Speed": -3.1, "Volume_S": 4.8, ...}
+            },
+            ...共4筆...
+          ]
+        }
+        """
+        version = request.query_params.get('version') or get_registry().active().version
+        if version not in available_versions():
+            return Response({
+                "error": f"找不到模型版本 {version}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        group = Group.objects.filter(group_id=group_id).first()
+        if group is None:
+            return Response({
+                "error": "找不到指定的資料組"
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            explanation = request_explanation(group, version)
+
+            result = {
+                "group_id": str(group.group_id),
+                "model_version": explanation.model_version,
+                "status": explanation.status,
+            }
+
+            if explanation.status == Explanation.STATUS_FAILED:
+                result["error"] = explanation.error
+                return Response(result, status=status.HTTP_200_OK)
+
+            if explanation.status != Explanation.STATUS_READY:
+                return Response(result, status=status.HTTP_202_ACCEPTED)
+
+            vd_ids = list(group.intersections.order_by('id').values_list('VD_ID', flat=True))
+            result["base_value"] = explanation.base_value
+            result["intersections"] = [{
+                "VD_ID": vd_id,
+                "prediction": prediction,
+                "attributions": dict(zip(explanation.feature_names, values)),
+            } for vd_id, prediction, values in zip(vd_ids, explanation.predictions, explanation.values)]
+
+            return Response(result, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response({
+                "error": f"查詢模型解釋失敗: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
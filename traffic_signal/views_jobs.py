@@ -0,0 +1,93 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from .jobs import job_kinds, serialize_job, submit_job
+from .models import Job
+
+
+class JobListView(APIView):
+    """背景工作 API - 送出工作與列出最近的工作（僅限管理員）"""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """
+        GET /api/traffic/jobs/?status=running
+
+        查詢參數：
+        - status: queued / running / succeeded / failed [選填]
+        - limit: 回傳筆數 [選填，預設 50]
+        """
+        jobs = Job.objects.order_by('-id')
+        status_filter = request.query_params.get('status')
+        if status_filter:
+            jobs = jobs.filter(status=status_filter)
+
+        try:
+            limit = min(int(request.query_params.get('limit', 50)), 500)
+        except ValueError:
+            return Response({
+                "error": "limit 必須是整數"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "kinds": job_kinds(),
+            "jobs": [serialize_job(job) for job in jobs[:limit]]
+        }, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        """
+        送出工作，由 run_jobs worker 在背景執行
+        POST /api/traffic/jobs/
+
+        Body (JSON):
+        {
+          "kind": "rescore_history",
+          "params": {"version": "20251107", "start_date": "2025-01-01", "end_date": "2025-12-31"}
+        }
+
+        回傳 201，內容同 GET /api/traffic/jobs/<id>/
+        """
+        data = request.data if isinstance(request.data, dict) else {}
+        try:
+            job = submit_job(data.get('kind'), data.get('params'))
+        except ValueError as e:
+            return Response({
+                "error": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(serialize_job(job), status=status.HTTP_201_CREATED)
+
+
+class JobDetailView(APIView):
+    """背景工作進度查詢 API（僅限管理員）"""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, job_id):
+        """
+        GET /api/traffic/jobs/<id>/
+
+        回傳範例：
+        {
+          "id": 12,
+          "kind": "rescore_history",
+          "params": {"version": "20251107"},
+          "status": "running",
+          "progress": {"done": 150000, "total": 525600, "percent": 28.5},
+          "result": null,
+          "error": "",
+          "attempts": 1,
+          "created_at": "2025-01-01T08:30:00+00:00",
+          "started_at": "2025-01-01T08:30:02+00:00",
+          "finished_at": null,
+          "heartbeat_at": "2025-01-01T08:31:10+00:00"
+        }
+        """
+        job = Job.objects.filter(pk=job_id).first()
+        if job is None:
+            return Response({
+                "error": "找不到指定的工作"
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response(serialize_job(job), status=status.HTTP_200_OK)
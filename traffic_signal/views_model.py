@@ -0,0 +1,58 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from .ml.registry import get_registry
+
+
+class ModelRegistryView(APIView):
+    """模型版本管理 API - 查詢與熱切換線上模型、影子模型（僅限管理員）"""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """
+        查詢目前模型狀態
+        GET /api/traffic/models/
+
+        回傳範例：
+        {
+          "active": "current",
+          "shadow": "20251107",
+          "variant": "keras",
+          "loaded": ["20251107", "current"],
+          "available": ["current", "1101", "20251107", "20251107_02", "2split"]
+        }
+        """
+        return Response(get_registry().status(), status=status.HTTP_200_OK)
+
+    def post(self, request):
+        """
+        切換線上模型或影子模型，新模型載入完成後才會替換，不需重啟服務
+        POST /api/traffic/models/
+
+        Body (JSON)，兩個欄位皆為選填：
+        {
+          "active": "20251107",   // 線上模型版本
+          "shadow": "2split"      // 影子模型版本，傳 null 表示關閉
+        }
+        """
+        registry = get_registry()
+        data = request.data if isinstance(request.data, dict) else {}
+
+        if "active" not in data and "shadow" not in data:
+            return Response({
+                "error": "請提供 active 或 shadow 參數"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            if "active" in data:
+                registry.activate(data["active"])
+            if "shadow" in data:
+                registry.set_shadow(data["shadow"])
+        except ValueError as e:
+            return Response({
+                "error": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(registry.status(), status=status.HTTP_200_OK)
@@ -0,0 +1,58 @@
+from django.http import HttpResponse
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from .profiling import get_profile_store, profiling_enabled, render_collapsed, summarize
+
+
+class ProfileListView(APIView):
+    """線上請求取樣分析結果列表（僅限管理員）"""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """
+        GET /api/traffic/profiles/?path=/api/traffic/predict/
+
+        查詢參數：
+        - path: 只列出此路徑的取樣結果 [選填]
+        - collapsed: 1 表示合併符合條件的所有取樣，直接回傳 collapsed stacks 文字 [選填]
+
+        回傳範例：
+        {
+          "enabled": true,
+          "profiles": [
+            {"id": 7, "method": "POST", "path": "/api/traffic/predict/", "status": 200, "reason": "header",
+             "created_at": "2025-11-07T08:00:00+00:00", "duration_ms": 84.2, "samples": 15}
+          ]
+        }
+        """
+        profiles = get_profile_store().list()
+        path = request.query_params.get('path')
+        if path:
+            profiles = [profile for profile in profiles if profile['path'] == path]
+
+        if request.query_params.get('collapsed') == '1':
+            return HttpResponse(render_collapsed(profiles), content_type='text/plain; charset=utf-8')
+
+        return Response({
+            "enabled": profiling_enabled(),
+            "profiles": [summarize(profile) for profile in profiles]
+        }, status=status.HTTP_200_OK)
+
+
+class ProfileDetailView(APIView):
+    """單一請求的取樣結果，以 collapsed stacks 文字回傳（可直接交給 flamegraph.pl / speedscope）（僅限管理員）"""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, profile_id):
+        """GET /api/traffic/profiles/<id>/"""
+        profile = get_profile_store().get(profile_id)
+        if profile is None:
+            return Response({
+                "error": "找不到此取樣結果（可能已被較新的結果取代）"
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        return HttpResponse(render_collapsed([profile]), content_type='text/plain; charset=utf-8')
@@ -1,30 +1,113 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.settings import api_settings
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from django.db.models import Exists, F, Max, OuterRef, Q
+from collections import defaultdict
 from datetime import datetime, timedelta
 import re
-from .models import Group, Intersection
+from .models import DataChangeCounter, Group, Intersection
+from .renderers import COLUMNAR_FORMATS, COLUMNAR_RENDERERS, to_columns
+
+# fields= 可選的欄位（與回傳的 key 相同）
+GROUP_FIELDS = ['group_id', 'timestamp', 'east_west_seconds', 'south_north_seconds']
+INTERSECTION_FIELDS = [
+    'id', 'VD_ID', 'DayOfWeek', 'Hour', 'Minute', 'Second', 'IsPeakHour', 'LaneID', 'LaneType',
+    'Speed', 'Occupancy', 'Volume_M', 'Speed_M', 'Volume_S', 'Speed_S', 'Volume_L', 'Speed_L',
+    'Volume_T', 'Speed_T', 'total_volume', 'created_at',
+]
+
+
+def parse_list(value):
+    """解析以逗號分隔的查詢參數"""
+    if not value:
+        return []
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def parse_fields(value):
+    """
+    解析 fields= 參數，回傳 (group 欄位, intersection 欄位)，未指定時回傳全部欄位
+
+    Raises:
+        ValueError: 含有未知的欄位
+    """
+    fields = parse_list(value)
+    if not fields:
+        return list(GROUP_FIELDS), list(INTERSECTION_FIELDS)
+
+    unknown = [field for field in fields if field not in GROUP_FIELDS and field not in INTERSECTION_FIELDS]
+    if unknown:
+        raise ValueError(f"未知的欄位: {', '.join(unknown)}，可用欄位: {', '.join(GROUP_FIELDS + INTERSECTION_FIELDS)}")
+    return (
+        [field for field in GROUP_FIELDS if field in fields],
+        [field for field in INTERSECTION_FIELDS if field in fields],
+    )
+
+
+def data_version():
+    """
+    取得資料版本 (資料組最大主鍵, 路口資料最大主鍵, 資料變更計數)
+
+    最大主鍵只讀主鍵索引的最後一筆，計數只讀一列，不會掃描資料表。新增資料改變最大主鍵，
+    修改與刪除（單筆、queryset 批次與 admin 批次刪除）改變 DataChangeCounter，三者都沒變代表任何查詢的結果都沒變；
+    raw SQL 直接修改資料表不會更新計數（見 ChangeCountedQuerySet）
+    """
+    latest_id = Group.objects.aggregate(latest_id=Max('id'))['latest_id'] or 0
+    latest_intersection_id = Intersection.objects.aggregate(latest_id=Max('id'))['latest_id'] or 0
+    return latest_id, latest_intersection_id, DataChangeCounter.current()
 
 
 class TrafficQueryView(APIView):
-    """統一的交通資料查詢 API - 支援日期範圍搜尋，同時取出 Group + Intersection 資料"""
+    """統一的交通資料查詢 API - 支援日期範圍搜尋，同時取出 Group + Intersection 資料，可只取需要的欄位與路口"""
+
+    read_replica = True  # 唯讀查詢，有設定副本資料庫時讀副本（見 db_router）
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, *COLUMNAR_RENDERERS]
 
     def get(self, request):
         """
-        交通資料查詢 API - 僅支援日期範圍查詢
+        交通資料查詢 API - 日期範圍查詢與增量同步
 
         查詢參數：
-        - start_date: 開始日期 (YYYY-MM-DD) [必須]
-        - end_date: 結束日期 (YYYY-MM-DD) [必須]
+        - start_date: 開始日期 (YYYY-MM-DD) [必須，有 since 時選填]
+        - end_date: 結束日期 (YYYY-MM-DD) [必須，有 since 時選填]
+        - since: 只回傳主鍵大於此游標的資料組，游標取自上次回傳的 query_info.cursor [選填]
+          游標依主鍵分頁，主鍵在寫入時配發、交易提交時才看得見：MySQL (InnoDB) 多個並行寫入的提交順序可能與主鍵順序不同，
+          較小主鍵的資料組可能在游標越過後才提交而被略過；在 MySQL 上需要不漏資料時，請以 since=cursor 減去一段重疊範圍重新讀取，
+          並以 group_id 去除重複（SQLite 寫入序列化，不會發生）
+        - fields: 只回傳指定欄位，多個以逗號分隔，例如 timestamp,east_west_seconds,south_north_seconds [選填，預設全部]
+          未指定任何路口欄位時不查詢路口明細，回傳資料也不含 intersections
+        - vd_id: 只回傳指定路口偵測器，多個以逗號分隔 [選填]
+        - peak_only: true 時只回傳尖峰時段的路口 [選填]
+        - hour: 只回傳指定小時 (0-23) 的路口，多個以逗號分隔 [選填]
+        - junction: 只回傳指定路口（Junction.code）的資料組 [選填]
+          路口篩選條件會同時套用在資料組：沒有符合路口的資料組不會回傳
 
         使用範例：
         GET /api/traffic/query/?start_date=2024-01-01&end_date=2024-01-31
+        GET /api/traffic/query/?since=1024
+        GET /api/traffic/query/?start_date=2024-01-01&end_date=2024-01-31&fields=timestamp,VD_ID,total_volume&vd_id=VLRJX20&peak_only=true
+
+        欄式格式：加上 format=columnar（或 Accept: application/vnd.traffic.columnar+json）回傳欄式 JSON，
+        format=msgpack（或 Accept: application/x-msgpack）回傳欄式 MessagePack，每個欄位一個陣列：
+        {
+          "query_info": {...},
+          "groups": {"group_id": [...], "timestamp": [...], "east_west_seconds": [...], "south_north_seconds": [...]},
+          "intersections": {"group_index": [0, 0, 0, 0, 1, ...], "VD_ID": [...], "Speed": [...], ...}
+        }
+        group_index 為該路口所屬資料組在 groups 陣列中的位置
+
+        條件式查詢：回應帶有 ETag，再次查詢時帶上 If-None-Match，資料沒有新增、修改或刪除時回傳 304 Not Modified
+        （只讀取兩張表的最大主鍵與 DataChangeCounter 一列，不會掃描資料表）。不提供 Last-Modified：同一秒內新增的資料無法以秒為單位的時間區分。
 
         回傳格式：
         {
           "query_info": {
             "period": "2024-01-01 ~ 2024-01-31",
-            "data_points": 168
+            "data_points": 168,
+            "cursor": 1192
           },
           "data": [
             {
@@ -67,86 +150,155 @@ class TrafficQueryView(APIView):
             # 取得查詢參數
             start_date_str = request.query_params.get('start_date')
             end_date_str = request.query_params.get('end_date')
+            since_str = request.query_params.get('since')
+
+            since = None
+            if since_str is not None:
+                if not since_str.isdigit():
+                    return Response({
+                        "error": "since 必須是非負整數（上次回傳的 query_info.cursor）"
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                since = int(since_str)
+
+            # 欄位投影與路口篩選條件（直接轉成 SQL 的 SELECT 欄位與 WHERE）
+            group_fields, intersection_fields = parse_fields(request.query_params.get('fields'))
+
+            intersection_filter = Q()
+            vd_ids = parse_list(request.query_params.get('vd_id'))
+            if vd_ids:
+                intersection_filter &= Q(VD_ID__in=vd_ids)
+            if request.query_params.get('peak_only', '').lower() in ('1', 'true'):
+                intersection_filter &= Q(IsPeakHour=True)
+            hours = parse_list(request.query_params.get('hour'))
+            if hours:
+                if not all(hour.isdigit() and int(hour) < 24 for hour in hours):
+                    raise ValueError("hour 必須是 0-23 的整數，多個以逗號分隔")
+                intersection_filter &= Q(Hour__in=[int(hour) for hour in hours])
 
             # 驗證必要參數
-            if not start_date_str or not end_date_str:
+            if since is None and (not start_date_str or not end_date_str):
                 return Response({
                     "error": "必須提供 start_date 和 end_date 參數 (格式: YYYY-MM-DD)"
                 }, status=status.HTTP_400_BAD_REQUEST)
-
-            # 日期格式驗證 YYYY-MM-DD
-            date_pattern = r'^\d{4}-\d{2}-\d{2}$'
-
-            if not re.match(date_pattern, start_date_str):
+            if bool(start_date_str) != bool(end_date_str):
                 return Response({
-                    "error": "start_date 格式錯誤，請使用 YYYY-MM-DD 格式"
+                    "error": "start_date 和 end_date 必須同時提供 (格式: YYYY-MM-DD)"
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            if not re.match(date_pattern, end_date_str):
-                return Response({
-                    "error": "end_date 格式錯誤，請使用 YYYY-MM-DD 格式"
-                }, status=status.HTTP_400_BAD_REQUEST)
+            groups = Group.objects.all()
 
-            # 解析日期
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
-            # end_date 設定為當天的 23:59:59
-            end_date = datetime.strptime(end_date_str, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
+            if start_date_str:
+                # 日期格式驗證 YYYY-MM-DD
+                date_pattern = r'^\d{4}-\d{2}-\d{2}$'
 
-            # 驗證日期邏輯
-            if start_date > end_date:
-                return Response({
-                    "error": "start_date 不能晚於 end_date"
-                }, status=status.HTTP_400_BAD_REQUEST)
+                if not re.match(date_pattern, start_date_str):
+                    return Response({
+                        "error": "start_date 格式錯誤，請使用 YYYY-MM-DD 格式"
+                    }, status=status.HTTP_400_BAD_REQUEST)
 
-            # 查詢資料，包含關聯的 intersections
-            groups = Group.objects.filter(
-                timestamp__gte=start_date,
-                timestamp__lte=end_date
-            ).prefetch_related('intersections').order_by('timestamp')
-
-            # 建立資料結構
-            data = []
-            for group in groups:
-                intersections = group.intersections.all()
-                data.append({
-                    "group": {
-                        "group_id": str(group.group_id),
-                        "timestamp": group.timestamp.isoformat(),
-                        "east_west_seconds": group.east_west_seconds,
-                        "south_north_seconds": group.south_north_seconds,
-                    },
-                    "intersections": [{
-                        "id": intersection.id,
-                        "VD_ID": intersection.VD_ID,
-                        "DayOfWeek": intersection.DayOfWeek,
-                        "Hour": intersection.Hour,
-                        "Minute": intersection.Minute,
-                        "Second": intersection.Second,
-                        "IsPeakHour": intersection.IsPeakHour,
-                        "LaneID": intersection.LaneID,
-                        "LaneType": intersection.LaneType,
-                        "Speed": intersection.Speed,
-                        "Occupancy": intersection.Occupancy,
-                        "Volume_M": intersection.Volume_M,
-                        "Speed_M": intersection.Speed_M,
-                        "Volume_S": intersection.Volume_S,
-                        "Speed_S": intersection.Speed_S,
-                        "Volume_L": intersection.Volume_L,
-                        "Speed_L": intersection.Speed_L,
-                        "Volume_T": intersection.Volume_T,
-                        "Speed_T": intersection.Speed_T,
-                        "total_volume": intersection.total_volume,
-                        "created_at": intersection.created_at.isoformat(),
-                    } for intersection in intersections]
-                })
+                if not re.match(date_pattern, end_date_str):
+                    return Response({
+                        "error": "end_date 格式錯誤，請使用 YYYY-MM-DD 格式"
+                    }, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response({
+                # 解析日期
+                start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
+                # end_date 設定為當天的 23:59:59
+                end_date = datetime.strptime(end_date_str, "%Y-%m-%d") + timedelta(days=1) - timedelta(seconds=1)
+
+                # 驗證日期邏輯
+                if start_date > end_date:
+                    return Response({
+                        "error": "start_date 不能晚於 end_date"
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
+                groups = groups.filter(timestamp__gte=start_date, timestamp__lte=end_date)
+
+            if since is not None:
+                groups = groups.filter(id__gt=since)
+
+            junction = request.query_params.get('junction')
+            if junction:
+                groups = groups.filter(junction__code=junction)
+
+            # 資料沒有新增時直接回傳 304，不查詢任何明細
+            latest_id, latest_intersection_id, changes = data_version()
+            # 不同回傳格式是不同的表示法，ETag 需要區分
+            etag = quote_etag(f"groups-{latest_id}-{latest_intersection_id}-{changes}-{request.accepted_renderer.format}")
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return not_modified
+
+            # 只取到目前的最大主鍵，確保游標與 ETag 一致
+            groups = groups.filter(id__lte=latest_id).order_by('timestamp')
+            if intersection_filter:
+                # 只回傳有符合條件路口的資料組
+                groups = groups.filter(Exists(
+                    Intersection.objects.filter(intersection_filter, group=OuterRef('pk'))
+                ))
+
+            # 只查詢需要的欄位（.values()），不建立 model 物件
+            group_rows = list(groups.values('id', *group_fields))
+
+            intersections_by_group = defaultdict(list)
+            if intersection_fields:
+                intersections = Intersection.objects.filter(intersection_filter, group__in=groups.values('id'))
+                if 'total_volume' in intersection_fields:
+                    # 總車流量在 SQL 中計算
+                    intersections = intersections.annotate(
+                        total_volume=F('Volume_M') + F('Volume_S') + F('Volume_L') + F('Volume_T')
+                    )
+                rows = intersections.order_by('group_id', 'VD_ID', 'LaneID').values('group_id', *intersection_fields)
+                for row in rows:
+                    if 'created_at' in row:
+                        row['created_at'] = row['created_at'].isoformat()
+                    intersections_by_group[row.pop('group_id')].append(row)
+
+            for row in group_rows:
+                if 'group_id' in row:
+                    row['group_id'] = str(row['group_id'])
+                if 'timestamp' in row:
+                    row['timestamp'] = row['timestamp'].isoformat()
+
+            if request.accepted_renderer.format in COLUMNAR_FORMATS:
+                # 欄式格式：每個欄位一個陣列，路口以 group_index 對應到 groups 陣列的位置
+                body = {"groups": to_columns(group_rows, group_fields)}
+                if intersection_fields:
+                    group_index, intersection_rows = [], []
+                    for index, row in enumerate(group_rows):
+                        rows = intersections_by_group.get(row['id'], [])
+                        group_index.extend([index] * len(rows))
+                        intersection_rows.extend(rows)
+                    body["intersections"] = {"group_index": group_index, **to_columns(intersection_rows, intersection_fields)}
+            else:
+                # 建立資料結構
+                data = []
+                for row in group_rows:
+                    group_id = row.pop('id')
+                    item = {"group": row}
+                    if intersection_fields:
+                        item["intersections"] = intersections_by_group.get(group_id, [])
+                    data.append(item)
+                body = {"data": data}
+
+            response = Response({
                 "query_info": {
-                    "period": f"{start_date_str} ~ {end_date_str}",
-                    "data_points": len(data)
+                    "period": f"{start_date_str} ~ {end_date_str}" if start_date_str else None,
+                    "data_points": len(group_rows),
+                    # 下次增量同步帶入 since=cursor；沒有新資料時游標不變
+                    "cursor": max(latest_id, since or 0),
                 },
-                "data": data
+                **body
             }, status=status.HTTP_200_OK)
+            response['ETag'] = etag
+            response['Cache-Control'] = 'no-cache'
+            patch_vary_headers(response, ['Accept'])
+            return response
+
+        except ValueError as e:
+            return Response({
+                "error": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
 
         except Exception as e:
             return Response({
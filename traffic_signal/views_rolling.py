@@ -0,0 +1,59 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from datetime import datetime, timezone
+from .window_store import get_window_store
+
+
+class RollingWindowView(APIView):
+    """偵測器滑動視窗 API - 回傳記憶體內各 VD_ID + 車道的滾動平均與趨勢，不查詢資料庫"""
+
+    def get(self, request):
+        """
+        GET /api/traffic/rolling/?vd_id=VLRJX20,VLRJM60
+
+        查詢參數：
+        - vd_id: 只回傳指定路口偵測器，多個以逗號分隔 [選填，預設全部]
+
+        回傳範例（trend 為最小平方法斜率，單位為每分鐘變化量；最後一筆讀數已超出視窗時 count 為 0）：
+        {
+          "windows": [300, 900],
+          "detectors": [
+            {
+              "VD_ID": "VLRJX20",
+              "LaneID": 1,
+              "latest": "2024-01-01T08:30:00+00:00",
+              "windows": {
+                "300": {
+                  "count": 5,
+                  "mean": {"total_volume": 205.0, "Speed": 42.5, "Occupancy": 15.3},
+                  "trend": {"total_volume": 3.2, "Speed": -0.4, "Occupancy": 0.1}
+                },
+                "900": {...}
+              }
+            }
+          ]
+        }
+        """
+        try:
+            store = get_window_store()
+            vd_ids = [vd_id.strip() for vd_id in request.query_params.get('vd_id', '').split(',') if vd_id.strip()]
+            now = datetime.now(timezone.utc)
+
+            detectors = []
+            for vd_id, lane_id in store.keys():
+                if vd_ids and vd_id not in vd_ids:
+                    continue
+                snapshot = store.snapshot(vd_id, lane_id, now=now.timestamp())
+                snapshot["latest"] = datetime.fromtimestamp(snapshot["latest"], tz=timezone.utc).isoformat()
+                detectors.append(snapshot)
+
+            return Response({
+                "windows": list(store.windows),
+                "detectors": detectors,
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response({
+                "error": f"查詢滑動視窗失敗: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
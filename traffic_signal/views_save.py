@@ -1,11 +1,51 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.db import transaction
-from .models import Group, Intersection
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+import logging
+from .data_utils import direction_seconds
+from .feature_store import records_to_arrays, save_features
+from .idempotency import find_replay, release_expired_key, request_key, same_request
+from .junctions import JunctionNotFound, get_layout
+from .models import Group, Intersection, Junction, ModelPrediction
+from .ml.admission import Overloaded, get_inference_gate
+from .ml.batching import get_batcher
 from .ml.predictor import Predictor
+from .ml.registry import get_registry
+from .pubsub import get_broker, group_event
+from .window_store import get_window_store
 
-predictor = Predictor()  # 初始化一次
+logger = logging.getLogger(__name__)
+
+registry = get_registry()  # 初始化一次，之後可熱切換模型版本
+
+
+def record_shadow_prediction(shadow, features, group_id, east_west_seconds, south_north_seconds):
+    """
+    影子模型推論（在背景執行緒執行，不影響 API 回應時間）
+    結果寫入 ModelPrediction 以便與線上模型比較
+    """
+    try:
+        preds = shadow.predict_features(features)
+        shadow_east_west, shadow_south_north = direction_seconds(preds)
+        ModelPrediction.objects.update_or_create(
+            group_id=group_id,
+            model_version=shadow.version,
+            defaults={
+                "east_west_seconds": int(shadow_east_west[0]),
+                "south_north_seconds": int(shadow_south_north[0]),
+            },
+        )
+        logger.info(
+            "影子模型 %s: Group %s 東西向 %s/%s 秒，南北向 %s/%s 秒 (影子/線上)",
+            shadow.version, group_id,
+            int(shadow_east_west[0]), east_west_seconds,
+            int(shadow_south_north[0]), south_north_seconds,
+        )
+    finally:
+        # 背景執行緒不會經過 request_finished，需自行關閉資料庫連線
+        connection.close()
 
 
 class TrafficPrediction(APIView):
@@ -17,8 +57,19 @@ class TrafficPrediction(APIView):
     def post(self, request):
         """
         範例：交通號誌預測 API
-        POST /api/traffic/predict/
+        POST /api/traffic/predict/?junction=default
         Content-Type: application/json
+        Idempotency-Key: 2024-01-01T08:30:00-junction-1   [選填]
+
+        重送相同請求（相同 Idempotency-Key，未提供時為相同的四筆資料）時，時間窗內直接回傳先前的結果，
+        不重新預測也不新增資料，回應標頭帶有 Idempotent-Replayed: true，內容多一個 "replayed": true；
+        同一個 Idempotency-Key 搭配不同的資料內容時回傳 422
+
+        junction 為路口代碼（Junction.code，預設 default），四筆資料的順序、方向分組與使用的模型版本依路口設定決定；
+        使用同一個模型的路口共用模型實例，同時到達的請求合併成一次推論（見 ml/batching.py）
+
+        推論忙碌（排隊已滿或無法在期限內完成）時回傳 503 與 Retry-After 標頭；
+        設定 TRAFFIC_OVERLOAD_DEGRADE 時改回傳最近一次的秒數，內容帶有 "degraded": true
 
         Body (JSON):
         [
@@ -51,6 +102,8 @@ class TrafficPrediction(APIView):
           "east_west_seconds": 65,
           "south_north_seconds": 58,
           "timestamp": "2024-01-01T08:30:00Z",
+          "model_version": "current",
+          "junction": "default",
           "message": "資料已成功儲存並完成預測"
         }
 
@@ -60,7 +113,7 @@ class TrafficPrediction(APIView):
         }
         """
         input_data = request.data
-        print(f"收到的輸入資料: {input_data}")
+        logger.debug("收到的輸入資料: %s", input_data)
 
         # 確認輸入是 list 且有四筆資料
         if not isinstance(input_data, list) or len(input_data) != 4:
@@ -68,52 +121,144 @@ class TrafficPrediction(APIView):
                 "error": "請傳入四筆路口特徵資料的清單"
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        junction = request.query_params.get('junction') or Junction.DEFAULT_CODE
+        try:
+            layout = get_layout(junction)
+
+            # 不同路口的相同資料不是重送
+            key, body_hash = request_key(
+                request, input_data, scope=None if junction == Junction.DEFAULT_CODE else junction
+            )
+            # 同一個請求重送時直接回傳已儲存的結果，不重新推論、不重複寫入
+            replay = find_replay(key)
+            if replay is not None:
+                return self.replay_response(replay, body_hash)
+            return self.predict_and_save(input_data, key, body_hash, layout)
+
+        except JunctionNotFound:
+            return Response({
+                "error": f"找不到路口 {junction}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        except Overloaded as e:
+            return self.overloaded_response(e, layout)
+
+        except Exception as e:
+            return Response({
+                "error": f"預測處理失敗: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def replay_response(self, group, body_hash):
+        if not same_request(group, body_hash):
+            return Response({
+                "error": "Idempotency-Key 已用於不同的請求內容，請使用新的 Idempotency-Key"
+            }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        response = Response({
+            "group_id": str(group.group_id),
+            "east_west_seconds": group.east_west_seconds,
+            "south_north_seconds": group.south_north_seconds,
+            "timestamp": group.timestamp.isoformat(),
+            "replayed": True,
+            "message": "重複的請求，回傳先前的預測結果"
+        }, status=status.HTTP_200_OK)
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    def overloaded_response(self, error, layout):
+        """
+        推論忙碌時的回應：設定 TRAFFIC_OVERLOAD_DEGRADE 時回傳最近一次的綠燈秒數（不儲存），否則回傳 503
+        """
+        logger.warning("推論忙碌 (%s)，%s", error.reason, get_inference_gate().status())
+        if getattr(settings, 'TRAFFIC_OVERLOAD_DEGRADE', False):
+            last = Group.objects.filter(junction_id=layout.junction_id).order_by('-id').first()
+            if last is not None:
+                response = Response({
+                    "group_id": None,
+                    "east_west_seconds": last.east_west_seconds,
+                    "south_north_seconds": last.south_north_seconds,
+                    "timestamp": last.timestamp.isoformat(),
+                    "degraded": True,
+                    "message": "預測服務忙碌中，回傳最近一次的預測秒數（本次資料未儲存）"
+                }, status=status.HTTP_200_OK)
+                response['Degraded'] = 'true'
+                return response
+
+        response = Response({
+            "error": "預測服務忙碌中，請稍後再試"
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response['Retry-After'] = str(error.retry_after)
+        return response
+
+    def predict_and_save(self, input_data, key, body_hash, layout):
+        """
+        推論並儲存一組新的資料，request_key 記錄在 Group 供重送時比對
+
+        並行的重試各自推論，但只有第一個寫入成功，其餘因唯一限制寫入失敗後回傳已寫入的結果
+        """
+        # 依路口設定排列成東西向兩筆、南北向兩筆，模型的 VD_ID 換成路口設定的偵測器類型
+        model_vd_ids = layout.model_vd_id_list(input_data)
+        input_data = layout.arrange(input_data)
+
+        # 標準化前的特徵只計算一次：線上推論、影子模型與路口特徵表共用
+        raw, _ = records_to_arrays(input_data)
+        features = Predictor.build_features(raw, model_vd_ids)
+
+        # 路口指定模型版本時使用該版本，否則使用目前線上版本的預測器
+        predictor = registry.load(layout.model_version) if layout.model_version else registry.active()
+        # 同一個模型的請求合併推論，並限制同時推論數，忙碌時拋出 Overloaded
+        preds = get_batcher(predictor).submit(features)
+
+        # 驗證預測結果
+        if len(preds) != 4:
+            return Response({
+                "error": "預測結果格式錯誤"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        # 東西向是第 0 與 1 筆，南北向是第 2 與 3 筆
+        east_west_max = max(preds[0], preds[1])
+        south_north_max = max(preds[2], preds[3])
+
+        # 只限制最大秒數，移除最小秒數限制
+        MAX_SECONDS = 99  # 最多99秒
+
+        east_west_seconds = min(int(east_west_max), MAX_SECONDS)
+        south_north_seconds = min(int(south_north_max), MAX_SECONDS)
+
+        # 預測結果明細（除錯用，熱路徑上不輸出到 stdout）
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "交通信號預測結果：路口 0-3 (VD_ID=%s) 秒數 %s，東西向 %d 秒，南北向 %d 秒",
+                [row.get('VD_ID') for row in input_data], [int(pred) for pred in preds],
+                east_west_seconds, south_north_seconds,
+            )
+
+        # 在寫入前取得滑動視窗狀態：重啟後第一次使用時會從資料庫重建，
+        # 若在寫入後才重建，這一組資料會被重建讀到後又再推入一次
+        window_store = get_window_store()
+
+        # 使用事務來確保資料一致性
         try:
-            # 使用預測器取得秒數
-            preds = predictor.predict_batch(input_data)
-
-            # 驗證預測結果
-            if len(preds) != 4:
-                return Response({
-                    "error": "預測結果格式錯誤"
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            # 東西向是第 0 與 1 筆，南北向是第 2 與 3 筆
-            east_west_max = max(preds[0], preds[1])
-            south_north_max = max(preds[2], preds[3])
-
-            # 只限制最大秒數，移除最小秒數限制
-            MAX_SECONDS = 99  # 最多99秒
-
-            east_west_seconds = min(int(east_west_max), MAX_SECONDS)
-            south_north_seconds = min(int(south_north_max), MAX_SECONDS)
-
-            # 詳細打印預測結果
-            print("\n" + "=" * 80)
-            print("🟢 交通信號預測結果")
-            print("=" * 80)
-            print(f"路口 0 (東方向 VD_ID={input_data[0].get('VD_ID')}): {int(preds[0])} 秒")
-            print(f"路口 1 (西方向 VD_ID={input_data[1].get('VD_ID')}): {int(preds[1])} 秒")
-            print(f"路口 2 (南方向 VD_ID={input_data[2].get('VD_ID')}): {int(preds[2])} 秒")
-            print(f"路口 3 (北方向 VD_ID={input_data[3].get('VD_ID')}): {int(preds[3])} 秒")
-            print("-" * 80)
-            print(f"📊 東西向最大綠燈秒數: {east_west_seconds} 秒 (最大({int(preds[0])}, {int(preds[1])}))")
-            print(f"📊 南北向最大綠燈秒數: {south_north_seconds} 秒 (最大({int(preds[2])}, {int(preds[3])}))")
-            print("=" * 80 + "\n")
-
-            # 使用事務來確保資料一致性
             with transaction.atomic():
+                # 超過重送時間窗的相同識別鍵不是重送，先清除以免違反唯一限制
+                release_expired_key(key)
+
                 # 1. 創建 Group 記錄
                 group = Group.objects.create(
                     east_west_seconds=east_west_seconds,
-                    south_north_seconds=south_north_seconds
+                    south_north_seconds=south_north_seconds,
+                    request_key=key,
+                    request_hash=body_hash,
+                    junction_id=layout.junction_id,
                 )
 
                 # 2. 創建 Intersection 記錄
-                for intersection_data in input_data:
-                    Intersection.objects.create(
+                intersections = []
+                for intersection_data, model_vd_id in zip(input_data, model_vd_ids):
+                    intersections.append(Intersection.objects.create(
                         group=group,
                         VD_ID=intersection_data.get('VD_ID'),
+                        model_vd_id=model_vd_id,
                         DayOfWeek=intersection_data.get('DayOfWeek'),
                         Hour=intersection_data.get('Hour'),
                         Minute=intersection_data.get('Minute'),
@@ -131,17 +276,34 @@ class TrafficPrediction(APIView):
                         Speed_L=intersection_data.get('Speed_L'),
                         Volume_T=intersection_data.get('Volume_T', 0),
                         Speed_T=intersection_data.get('Speed_T', 0.0),
-                    )
+                    ))
 
-            return Response({
-                "group_id": str(group.group_id),
-                "east_west_seconds": east_west_seconds,
-                "south_north_seconds": south_north_seconds,
-                "timestamp": group.timestamp.isoformat(),
-                "message": "資料已成功儲存並完成預測"
-            }, status=status.HTTP_200_OK)
+                # 3. 寫入路口特徵表，批次工作不必再由原始欄位計算
+                save_features(intersections, features)
+        except IntegrityError:
+            # 同一個請求已由並行的重試寫入
+            replay = find_replay(key)
+            if replay is None:
+                raise
+            return self.replay_response(replay, body_hash)
 
-        except Exception as e:
-            return Response({
-                "error": f"預測處理失敗: {str(e)}"
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        # 更新各偵測器車道的滑動視窗狀態
+        window_store.push_intersections(group.timestamp.timestamp(), intersections)
+
+        # 推播給訂閱中的前端（/api/traffic/stream/、websocket）
+        get_broker().publish(group_event(group, intersections))
+
+        # 影子模型在背景執行，不增加回應延遲
+        registry.submit_shadow(
+            record_shadow_prediction, features, group.id, east_west_seconds, south_north_seconds
+        )
+
+        return Response({
+            "group_id": str(group.group_id),
+            "east_west_seconds": east_west_seconds,
+            "south_north_seconds": south_north_seconds,
+            "timestamp": group.timestamp.isoformat(),
+            "model_version": predictor.version,
+            "junction": layout.code,
+            "message": "資料已成功儲存並完成預測"
+        }, status=status.HTTP_200_OK)
\ No newline at end of file
@@ -0,0 +1,82 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from .models import Group
+from .pubsub import get_broker, group_event, parse_vd_ids
+
+
+def recent_group_events(after_id, limit):
+    """斷線重連時補送 Last-Event-ID 之後的 Group（最多 limit 筆）"""
+    groups = Group.objects.filter(id__gt=after_id).prefetch_related('intersections').order_by('id')[:limit]
+    return [group_event(group, group.intersections.all()) for group in groups]
+
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: prediction\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def prediction_stream(request):
+    """
+    預測結果即時推播 (Server-Sent Events) - 取代以日期範圍輪詢查詢 API
+
+    GET /api/traffic/stream/?vd_id=VLRJX20,VLRJM60
+
+    查詢參數：
+    - vd_id: 只接收包含指定路口偵測器的預測，多個以逗號分隔 [選填，預設全部]
+
+    每儲存一筆預測推送一個事件（id 為 Group 主鍵，斷線重連時瀏覽器會帶 Last-Event-ID 補送漏掉的資料）：
+    id: 1024
+    event: prediction
+    data: {"id": 1024, "group_id": "...", "timestamp": "...", "east_west_seconds": 65, "south_north_seconds": 58,
+           "intersections": [{"VD_ID": "VLRJX20", "LaneID": 1, "IsPeakHour": true, "Speed": 42.5,
+                              "Occupancy": 15.3, "total_volume": 205}, ...]}
+
+    需以 ASGI 伺服器執行（例如 uvicorn traffic_main.asgi:application）。WSGI 下串流會一直佔用一個 worker，
+    因此直接回傳 501，請改用查詢 API 的 since 增量同步。
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({
+            "error": "即時推播需以 ASGI 伺服器執行（例如 uvicorn traffic_main.asgi:application），"
+                     "目前為 WSGI，請改用查詢 API 的 since 參數增量同步"
+        }, status=501)
+
+    broker = get_broker()
+    vd_ids = parse_vd_ids(request.GET.get('vd_id'))
+    heartbeat = getattr(settings, 'TRAFFIC_STREAM_HEARTBEAT_SECONDS', 15)
+    last_event_id = request.headers.get('Last-Event-ID', '')
+
+    async def events():
+        # 先訂閱再補送，避免補送期間新增的資料遺漏
+        subscription = broker.subscribe(vd_ids)
+        try:
+            last_sent = 0
+            if last_event_id.isdigit():
+                backfill = await sync_to_async(recent_group_events)(
+                    int(last_event_id), getattr(settings, 'TRAFFIC_STREAM_BACKFILL_LIMIT', 100)
+                )
+                for event in backfill:
+                    event = subscription.filter_event(event)
+                    if event is not None:
+                        last_sent = event["id"]
+                        yield format_sse(event)
+
+            yield "retry: 3000\n: connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    # 心跳註解，讓代理伺服器與瀏覽器保持連線
+                    yield ": keep-alive\n\n"
+                    continue
+                if event["id"] > last_sent:
+                    yield format_sse(event)
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # 關閉 nginx 緩衝
+    return response
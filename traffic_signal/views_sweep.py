@@ -0,0 +1,218 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from django.conf import settings
+import math
+import numpy as np
+from .data_utils import ROWS_PER_GROUP, TrafficDataValidator, direction_seconds
+from .junctions import JunctionNotFound, get_layout
+from .ml.predictor import RAW_FEATURE_NAMES
+from .ml.registry import get_registry
+from .models import Junction
+
+# 可以掃描的參數（VD_ID、LaneID、LaneType 屬於路口設定，不開放掃描）
+SWEEP_PARAMETERS = [name for name in RAW_FEATURE_NAMES if name not in ('LaneID', 'LaneType')]
+
+# 選填欄位的預設值，與 TrafficPrediction 儲存時一致
+OPTIONAL_DEFAULTS = {'Volume_T': 0, 'Speed_T': 0.0}
+
+
+def axis_length(name, spec):
+    """
+    計算單一參數的格網長度（不建立陣列），用於在配置記憶體前檢查情境數上限
+    """
+    if isinstance(spec, list):
+        length = len(spec)
+    elif isinstance(spec, dict) and 'start' in spec and 'stop' in spec:
+        if 'num' in spec:
+            length = int(spec['num'])
+        elif 'step' in spec:
+            step = float(spec['step'])
+            if step <= 0:
+                raise ValueError(f"{name} 的 step 必須大於 0")
+            # 與 parse_axis 的 np.arange(start, stop + step / 2, step) 長度相同
+            length = max(math.ceil((float(spec['stop']) + step / 2 - float(spec['start'])) / step), 0)
+        else:
+            raise ValueError(f"{name} 必須提供 num 或 step")
+    else:
+        raise ValueError(f"{name} 的格網格式錯誤，請使用數值清單或 {{start, stop, num}}")
+
+    if length <= 0:
+        raise ValueError(f"{name} 至少需要一個數值")
+    return length
+
+
+def parse_axis(name, spec):
+    """
+    解析單一參數的格網設定，可為數值清單或 {"start", "stop", "num"} / {"start", "stop", "step"}
+    （呼叫前需先以 axis_length 檢查長度）
+    """
+    if isinstance(spec, list):
+        values = np.asarray(spec, dtype=float)
+    elif isinstance(spec, dict) and 'start' in spec and 'stop' in spec:
+        if 'num' in spec:
+            values = np.linspace(float(spec['start']), float(spec['stop']), int(spec['num']))
+        elif 'step' in spec:
+            step = float(spec['step'])
+            if step <= 0:
+                raise ValueError(f"{name} 的 step 必須大於 0")
+            values = np.arange(float(spec['start']), float(spec['stop']) + step / 2, step)
+        else:
+            raise ValueError(f"{name} 必須提供 num 或 step")
+    else:
+        raise ValueError(f"{name} 的格網格式錯誤，請使用數值清單或 {{start, stop, num}}")
+
+    if values.ndim != 1 or values.size == 0:
+        raise ValueError(f"{name} 至少需要一個數值")
+    if not np.all(np.isfinite(values)):
+        raise ValueError(f"{name} 含有無效數值")
+    return values
+
+
+class TrafficSweepView(APIView):
+    """
+    綠燈秒數敏感度分析 API - 以一組四路口資料為基準，對參數格網做笛卡兒積後一次批次預測
+    """
+
+    def post(self, request):
+        """
+        POST /api/traffic/sweep/?junction=<路口代碼>
+        Content-Type: application/json
+
+        junction 與預測 API 相同（未指定時為 default）：base 依該路口的偵測器設定排列與驗證，
+        使用該路口的模型偵測器類型與模型版本，結果與該路口的預測 API 一致
+
+        Body (JSON):
+        {
+          "base": [ ...四筆路口資料，格式與 /api/traffic/predict/ 相同... ],
+          "grid": {
+            "Volume_S": [10, 20, 30, 40],
+            "Occupancy": {"start": 0, "stop": 60, "num": 13},
+            "Speed": {"start": 10, "stop": 60, "step": 5}
+          },
+          "rows": [0, 1]   // 選填，格網套用到 base 的哪幾筆路口（預設四筆全部）
+        }
+
+        回傳範例：
+        {
+          "junction": "default",
+          "model_version": "current",
+          "parameters": ["Volume_S", "Occupancy", "Speed"],
+          "axes": {"Volume_S": [10, 20, 30, 40], "Occupancy": [0, 5, ...], "Speed": [10, 15, ...]},
+          "shape": [4, 13, 11],
+          "scenarios": 572,
+          "east_west_seconds": [[[65, 66, ...], ...], ...],   // 形狀同 shape
+          "south_north_seconds": [[[58, 58, ...], ...], ...]
+        }
+        """
+        data = request.data if isinstance(request.data, dict) else {}
+        base = data.get('base')
+        grid = data.get('grid')
+
+        junction = request.query_params.get('junction') or Junction.DEFAULT_CODE
+        try:
+            layout = get_layout(junction)
+        except JunctionNotFound:
+            return Response({
+                "error": f"找不到路口 {junction}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as e:
+            # 路口的偵測器設定不完整
+            return Response({
+                "error": f"敏感度分析失敗: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        try:
+            errors = TrafficDataValidator.validate_batch_data(base, layout.vd_ids)
+        except TypeError:
+            # 欄位值不是數值時無法比較範圍
+            errors = ["欄位值的型別錯誤"]
+        if errors:
+            return Response({
+                "error": "base 必須是四筆路口特徵資料的清單",
+                "details": errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if not isinstance(grid, dict) or not grid:
+            return Response({
+                "error": "grid 必須是參數名稱對應格網的物件"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        unknown = [name for name in grid if name not in SWEEP_PARAMETERS]
+        if unknown:
+            return Response({
+                "error": f"不支援的參數: {', '.join(unknown)}，可用參數: {', '.join(SWEEP_PARAMETERS)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = data.get('rows', list(range(ROWS_PER_GROUP)))
+        if (not isinstance(rows, list) or not rows
+                or not all(isinstance(row, int) and 0 <= row < ROWS_PER_GROUP for row in rows)):
+            return Response({
+                "error": "rows 必須是 0-3 的路口索引清單"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        parameters = list(grid)
+        max_scenarios = getattr(settings, 'TRAFFIC_SWEEP_MAX_SCENARIOS', 100000)
+        try:
+            # 先以 Python 整數計算情境數（不會溢位），超過上限時不建立任何格網陣列
+            shape = []
+            for name in parameters:
+                shape.append(axis_length(name, grid[name]))
+                if math.prod(shape) > max_scenarios:
+                    raise ValueError(f"格網情境數超過上限 {max_scenarios}")
+            axes = [parse_axis(name, grid[name]) for name in parameters]
+        except (TypeError, ValueError) as e:
+            return Response({
+                "error": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except OverflowError:
+            return Response({
+                "error": f"格網情境數超過上限 {max_scenarios}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        shape = [len(axis) for axis in axes]
+        scenarios = math.prod(shape)
+
+        try:
+            # 與預測 API 相同：路口指定模型版本時使用該版本，否則使用目前線上版本
+            registry = get_registry()
+            predictor = registry.load(layout.model_version) if layout.model_version else registry.active()
+
+            # 依路口設定排列成東西向兩筆、南北向兩筆，模型的 VD_ID 換成路口設定的偵測器類型
+            vd_ids = np.array(layout.model_vd_id_list(base), dtype=object)
+            base_raw = np.array(
+                [[row.get(name, OPTIONAL_DEFAULTS.get(name)) for name in RAW_FEATURE_NAMES] for row in layout.arrange(base)],
+                dtype=float,
+            )
+
+            # 建立 (情境數, 4, 特徵數) 的張量，格網參數只覆寫指定的路口（rows 為 base 的位置，換算成排列後的位置）
+            tensor = np.repeat(base_raw[np.newaxis], scenarios, axis=0)
+            mesh = np.meshgrid(*axes, indexing='ij')
+            row_index = np.asarray([layout.order.index(row) for row in rows])
+            for name, values in zip(parameters, mesh):
+                tensor[:, row_index, RAW_FEATURE_NAMES.index(name)] = values.reshape(-1, 1)
+
+            X = predictor.preprocess_arrays(
+                tensor.reshape(-1, len(RAW_FEATURE_NAMES)),
+                np.tile(vd_ids, scenarios),
+            )
+            preds = predictor.predict_with_clipping(
+                X, batch_size=getattr(settings, 'TRAFFIC_SWEEP_BATCH_SIZE', 16384)
+            )
+            east_west, south_north = direction_seconds(preds)
+
+            return Response({
+                "junction": layout.code,
+                "model_version": predictor.version,
+                "parameters": parameters,
+                "axes": {name: axis.tolist() for name, axis in zip(parameters, axes)},
+                "shape": shape,
+                "scenarios": scenarios,
+                "east_west_seconds": east_west.reshape(shape).tolist(),
+                "south_north_seconds": south_north.reshape(shape).tolist(),
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response({
+                "error": f"敏感度分析失敗: {str(e)}"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
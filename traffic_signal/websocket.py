@@ -0,0 +1,61 @@
+"""
+預測結果即時推播 (WebSocket) - 直接實作 ASGI websocket 協定，不需要 Django Channels
+
+ws://<host>/api/traffic/ws/?vd_id=VLRJX20,VLRJM60
+
+連線後每儲存一筆預測送出一則 JSON 文字訊息（格式與 SSE 的 data 相同，見 views_stream）。
+客戶端可隨時送出 {"vd_id": ["VLRJX20"]} 變更過濾條件，送出 {"vd_id": []} 改為接收全部路口。
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from .pubsub import get_broker, parse_vd_ids
+
+WEBSOCKET_PATH = '/api/traffic/ws/'
+
+
+async def websocket_application(scope, receive, send):
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    if scope['path'] != WEBSOCKET_PATH:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    query = parse_qs(scope.get('query_string', b'').decode())
+    broker = get_broker()
+    subscription = broker.subscribe(parse_vd_ids(query.get('vd_id', [''])[0]))
+    await send({'type': 'websocket.accept'})
+
+    receive_task = asyncio.ensure_future(receive())
+    event_task = asyncio.ensure_future(subscription.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait({receive_task, event_task}, return_when=asyncio.FIRST_COMPLETED)
+
+            if event_task in done:
+                await send({'type': 'websocket.send', 'text': json.dumps(event_task.result(), ensure_ascii=False)})
+                event_task = asyncio.ensure_future(subscription.get())
+
+            if receive_task in done:
+                message = receive_task.result()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                if message.get('text'):
+                    try:
+                        vd_ids = json.loads(message['text']).get('vd_id')
+                    except (ValueError, AttributeError):
+                        vd_ids = None
+                    if isinstance(vd_ids, list):
+                        # 重新訂閱以套用新的過濾條件
+                        broker.unsubscribe(subscription)
+                        event_task.cancel()
+                        subscription = broker.subscribe(vd_ids)
+                        event_task = asyncio.ensure_future(subscription.get())
+                receive_task = asyncio.ensure_future(receive())
+    finally:
+        broker.unsubscribe(subscription)
+        receive_task.cancel()
+        event_task.cancel()
@@ -0,0 +1,247 @@
+"""
+路口偵測器的滑動視窗狀態 - 行程內以固定大小的 NumPy 環狀緩衝區保存每個 VD_ID + 車道最近的讀數
+
+TrafficPrediction 每次預測都會寫入，各時間視窗（預設 5、15 分鐘）的平均值與趨勢（每分鐘變化量）
+以累加值維護，讀取為 O(1)，不需要每次查詢 Intersection。行程重啟後從最近的 Intersection 資料重建。
+"""
+import threading
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 保存的指標（total_volume 為四種車流量總和）
+METRICS = ('total_volume', 'Speed', 'Occupancy')
+
+# 累加值的時間以相對於 origin 的分鐘數計算；最新讀數距離 origin 超過此秒數時重設 origin 並以緩衝區重新計算累加值，
+# 避免平方和過大造成精度流失，也順便消除長時間加減累積的誤差
+REBASE_SECONDS = 6 * 3600
+
+
+class _Window:
+    """單一時間視窗的累加值：筆數、Σt、Σt²、Σv、Σtv（t 為相對 origin 的分鐘數）"""
+
+    def __init__(self, seconds: int, n_metrics: int):
+        self.seconds = seconds
+        self.start = 0  # 視窗內最舊一筆的絕對序號
+        self.n = 0
+        self.st = 0.0
+        self.stt = 0.0
+        self.sv = np.zeros(n_metrics)
+        self.stv = np.zeros(n_metrics)
+
+    def add(self, t: float, values: np.ndarray):
+        self.n += 1
+        self.st += t
+        self.stt += t * t
+        self.sv += values
+        self.stv += t * values
+
+    def remove(self, t: float, values: np.ndarray):
+        self.n -= 1
+        self.st -= t
+        self.stt -= t * t
+        self.sv -= values
+        self.stv -= t * values
+
+    def reset(self):
+        self.n = 0
+        self.st = self.stt = 0.0
+        self.sv[:] = 0
+        self.stv[:] = 0
+
+    def stats(self) -> Tuple[int, np.ndarray, np.ndarray]:
+        """回傳 (筆數, 平均值, 趨勢)，趨勢為最小平方法斜率（每分鐘變化量），少於兩筆或時間相同時為 0"""
+        if self.n == 0:
+            nan = np.full(len(self.sv), np.nan)
+            return 0, nan, nan
+        mean = self.sv / self.n
+        denominator = self.n * self.stt - self.st * self.st
+        if self.n < 2 or denominator <= 1e-9:
+            return self.n, mean, np.zeros(len(self.sv))
+        return self.n, mean, (self.n * self.stv - self.st * self.sv) / denominator
+
+
+class DetectorBuffer:
+    """單一 VD_ID + 車道的環狀緩衝區"""
+
+    def __init__(self, capacity: int, windows: Sequence[int], n_metrics: int):
+        self.capacity = capacity
+        self.times = np.zeros(capacity)
+        self.values = np.zeros((capacity, n_metrics))
+        self.count = 0  # 累計寫入筆數，第 i 筆存在 i % capacity
+        self.origin = None
+        self.windows = [_Window(seconds, n_metrics) for seconds in windows]
+
+    def _t(self, index: int) -> float:
+        return (self.times[index % self.capacity] - self.origin) / 60.0
+
+    def push(self, timestamp: float, values: np.ndarray):
+        if self.origin is None:
+            self.origin = timestamp
+        if self.count:
+            # 讀數時間不可倒退（同時送達的資料以最新時間計）
+            timestamp = max(timestamp, self.times[(self.count - 1) % self.capacity])
+
+        slot = self.count % self.capacity
+        # 緩衝區已滿時，即將被覆寫的最舊一筆必須先移出所有視窗
+        if self.count >= self.capacity:
+            overwritten = self.count - self.capacity
+            for window in self.windows:
+                if window.start <= overwritten:
+                    window.remove(self._t(overwritten), self.values[slot])
+                    window.start = overwritten + 1
+
+        self.times[slot] = timestamp
+        self.values[slot] = values
+        self.count += 1
+
+        if timestamp - self.origin > REBASE_SECONDS:
+            self._rebase(timestamp)
+            return
+
+        t = self._t(self.count - 1)
+        for window in self.windows:
+            window.add(t, values)
+            self._evict(window, timestamp)
+
+    def _evict(self, window: _Window, now: float):
+        # 每筆最多移出一次，攤銷 O(1)
+        while window.start < self.count - 1 and self.times[window.start % self.capacity] <= now - window.seconds:
+            window.remove(self._t(window.start), self.values[window.start % self.capacity])
+            window.start += 1
+
+    def _rebase(self, now: float):
+        self.origin = now
+        for window in self.windows:
+            window.reset()
+            window.start = max(window.start, self.count - self.capacity)
+            while window.start < self.count - 1 and self.times[window.start % self.capacity] <= now - window.seconds:
+                window.start += 1
+            for index in range(window.start, self.count):
+                window.add(self._t(index), self.values[index % self.capacity])
+
+    def latest_timestamp(self) -> Optional[float]:
+        return self.times[(self.count - 1) % self.capacity] if self.count else None
+
+
+class WindowStore:
+    """以 (VD_ID, LaneID) 為 key 的滑動視窗狀態，執行緒安全"""
+
+    def __init__(self, windows: Sequence[int] = (300, 900), capacity: int = 256):
+        self.windows = tuple(sorted(windows))
+        self.capacity = capacity
+        self._buffers: Dict[Tuple[str, int], DetectorBuffer] = {}
+        self._lock = threading.Lock()
+
+    def push(self, vd_id: str, lane_id: int, timestamp: float, values: Sequence[float]):
+        """寫入一筆讀數，values 順序與 METRICS 相同，timestamp 為 epoch 秒數"""
+        key = (vd_id, int(lane_id))
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = self._buffers[key] = DetectorBuffer(self.capacity, self.windows, len(METRICS))
+            buffer.push(float(timestamp), np.asarray(values, dtype=np.float64))
+
+    def push_intersections(self, timestamp: float, intersections: Iterable):
+        """寫入同一時間的多筆 Intersection（或具有相同屬性的物件）"""
+        for intersection in intersections:
+            self.push(intersection.VD_ID, intersection.LaneID, timestamp, (
+                intersection.total_volume, intersection.Speed, intersection.Occupancy
+            ))
+
+    def snapshot(self, vd_id: str, lane_id: int, now: Optional[float] = None) -> Optional[Dict]:
+        """
+        取得單一偵測器車道各視窗的平均值與趨勢，沒有資料時回傳 None
+
+        視窗以最後一筆讀數時間為準；指定 now 時，最後一筆讀數已超出視窗的視窗視為沒有資料
+        """
+        with self._lock:
+            buffer = self._buffers.get((vd_id, int(lane_id)))
+            if buffer is None or buffer.count == 0:
+                return None
+
+            latest = buffer.latest_timestamp()
+            result = {"VD_ID": vd_id, "LaneID": int(lane_id), "latest": latest, "windows": {}}
+            for window in buffer.windows:
+                if now is not None and latest <= now - window.seconds:
+                    n, mean, trend = 0, [None] * len(METRICS), [None] * len(METRICS)
+                else:
+                    n, mean, trend = window.stats()
+                    mean, trend = mean.tolist(), trend.tolist()
+                result["windows"][window.seconds] = {
+                    "count": n,
+                    "mean": dict(zip(METRICS, mean)),
+                    "trend": dict(zip(METRICS, trend)),
+                }
+            return result
+
+    def features(self, keys: Sequence[Tuple[str, int]]) -> np.ndarray:
+        """
+        取得多個偵測器車道的滑動視窗特徵矩陣，形狀 (len(keys), 視窗數 × 指標數 × 2)
+
+        欄位順序：每個視窗依序為各指標平均值、各指標趨勢；沒有資料的欄位為 NaN
+        """
+        width = len(self.windows) * len(METRICS) * 2
+        matrix = np.full((len(keys), width), np.nan)
+        with self._lock:
+            for row, (vd_id, lane_id) in enumerate(keys):
+                buffer = self._buffers.get((vd_id, int(lane_id)))
+                if buffer is None:
+                    continue
+                matrix[row] = np.concatenate([np.concatenate(window.stats()[1:]) for window in buffer.windows])
+        return matrix
+
+    def keys(self):
+        with self._lock:
+            return sorted(self._buffers)
+
+
+def rehydrate(store: WindowStore, now: Optional[float] = None) -> int:
+    """
+    以最近的 Intersection 資料重建狀態（只讀取最長視窗內的資料）
+
+    Returns:
+        寫入的讀數筆數
+    """
+    from datetime import datetime, timedelta, timezone as dt_timezone
+    from django.db.models import F
+    from .models import Intersection
+
+    since = datetime.fromtimestamp(now, dt_timezone.utc) if now is not None else datetime.now(dt_timezone.utc)
+    since -= timedelta(seconds=max(store.windows))
+
+    rows = (
+        Intersection.objects.filter(group__timestamp__gte=since)
+        .annotate(total=F('Volume_M') + F('Volume_S') + F('Volume_L') + F('Volume_T'))
+        .order_by('group__timestamp', 'id')
+        .values_list('VD_ID', 'LaneID', 'group__timestamp', 'total', 'Speed', 'Occupancy')
+    )
+    count = 0
+    for vd_id, lane_id, timestamp, total, speed, occupancy in rows.iterator(chunk_size=2000):
+        store.push(vd_id, lane_id, timestamp.timestamp(), (total, speed, occupancy))
+        count += 1
+    return count
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_window_store() -> WindowStore:
+    """
+    取得行程內唯一的滑動視窗狀態，第一次使用時從資料庫重建（設定值見 settings.TRAFFIC_WINDOW_*）
+
+    寫入新資料後再 push 的呼叫端需在寫入前取得，否則重建會讀到剛寫入的資料而重複計算
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                from django.conf import settings
+                store = WindowStore(
+                    windows=getattr(settings, 'TRAFFIC_WINDOW_SECONDS', (300, 900)),
+                    capacity=getattr(settings, 'TRAFFIC_WINDOW_CAPACITY', 256),
+                )
+                rehydrate(store)
+                _store = store
+    return _store